@@ -0,0 +1,122 @@
+"""
+/run和callback的吞吐量测试,对比asyncio和uvloop
+
+    python benchmarks/run_throughput.py -n 5000 -c 200
+    python benchmarks/run_throughput.py --loop uvloop
+
+执行器,模拟的xxl-admin和压测客户端运行在同一个事件循环中,结果只用于对比不同事件循环的开销
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stderr
+from typing import Any, Dict
+
+import aiohttp
+from aiohttp import web
+
+from pyxxl import ExecutorConfig, PyxxlRunner
+
+ADMIN_PORT = 18080
+EXECUTOR_PORT = 19999
+
+
+async def _fake_admin(done: asyncio.Event, total: int, received: Dict[str, int]) -> web.AppRunner:
+    async def callback(request: web.Request) -> web.Response:
+        received["callback"] += len(await request.json())
+        if received["callback"] >= total:
+            done.set()
+        return web.json_response(dict(code=200, msg=None))
+
+    async def ok(request: web.Request) -> web.Response:
+        return web.json_response(dict(code=200, msg=None))
+
+    app = web.Application()
+    app.router.add_post("/xxl-job-admin/api/callback", callback)
+    app.router.add_post("/xxl-job-admin/api/{name}", ok)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", ADMIN_PORT).start()
+    return runner
+
+
+async def _bench(total: int, concurrency: int, log_dir: str) -> Dict[str, Any]:
+    done = asyncio.Event()
+    received = {"callback": 0}
+    admin = await _fake_admin(done, total, received)
+
+    config = ExecutorConfig(
+        xxl_admin_baseurl="http://127.0.0.1:%s/xxl-job-admin/api/" % ADMIN_PORT,
+        executor_app_name="pyxxl-benchmark",
+        executor_listen_host="127.0.0.1",
+        executor_listen_port=EXECUTOR_PORT,
+        log_local_dir=log_dir,
+        executor_log_path=os.path.join(log_dir, "pyxxl.log"),
+        dotenv_try=False,
+    )
+    config.executor_logger.setLevel(logging.WARNING)
+    pyxxl_runner = PyxxlRunner(config)
+
+    @pyxxl_runner.register(name="benchmark")
+    async def benchmark() -> str:
+        return "ok"
+
+    executor_runner = web.AppRunner(pyxxl_runner.create_server_app(), access_log=None)
+    await executor_runner.setup()
+    await web.TCPSite(executor_runner, "127.0.0.1", EXECUTOR_PORT).start()
+
+    semaphore = asyncio.Semaphore(concurrency)
+    url = "http://127.0.0.1:%s/run" % EXECUTOR_PORT
+    async with aiohttp.ClientSession() as session:
+
+        async def _run(i: int) -> None:
+            async with semaphore:
+                data = dict(jobId=i, logId=i, executorHandler="benchmark", executorBlockStrategy="SERIAL_EXECUTION")
+                async with session.post(url, json=data) as resp:
+                    await resp.read()
+
+        start = time.perf_counter()
+        await asyncio.gather(*[_run(i) for i in range(total)])
+        run_cost = time.perf_counter() - start
+        await asyncio.wait_for(done.wait(), timeout=300)
+        total_cost = time.perf_counter() - start
+
+    await executor_runner.cleanup()
+    await admin.cleanup()
+    return dict(run_qps=total / run_cost, callback_qps=received["callback"] / total_cost)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--total", type=int, default=5000)
+    parser.add_argument("-c", "--concurrency", type=int, default=200)
+    parser.add_argument("--loop", choices=["asyncio", "uvloop", "all"], default="all")
+    args = parser.parse_args()
+
+    if args.loop == "all":
+        # 每种事件循环在独立的进程中测试,避免互相影响
+        for name in ("asyncio", "uvloop"):
+            cmd = [sys.executable, __file__, "-n", str(args.total), "-c", str(args.concurrency), "--loop", name]
+            subprocess.run(cmd, check=True)
+        return
+
+    if args.loop == "uvloop":
+        import uvloop
+
+        loop = uvloop.new_event_loop()
+    else:
+        loop = asyncio.new_event_loop()
+    with tempfile.TemporaryDirectory() as log_dir, open(os.devnull, "w") as devnull, redirect_stderr(devnull):
+        result = loop.run_until_complete(_bench(args.total, args.concurrency, log_dir))
+    loop.close()
+    print("{:<8} /run {:>8.1f} req/s    run+callback {:>8.1f} job/s".format(args.loop, *result.values()))
+
+
+if __name__ == "__main__":
+    main()
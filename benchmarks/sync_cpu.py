@@ -0,0 +1,114 @@
+"""
+CPU密集型同步任务在不同线程数下的吞吐量,对比普通构建(GIL)和free-threaded构建(如3.13t)
+
+    python benchmarks/sync_cpu.py -n 64 -t 1 2 4 8
+    python3.13t benchmarks/sync_cpu.py
+
+有GIL时增加线程数吞吐量基本不变,没有GIL时应该接近线性增长(不超过CPU核数)
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+from contextlib import redirect_stderr
+from typing import Any, Dict, List, Optional
+
+from pyxxl import ExecutorConfig
+from pyxxl.enum import executorBlockStrategy
+from pyxxl.executor import Executor, JobHandler
+from pyxxl.schema import RunData
+from pyxxl.utils import gil_enabled
+from pyxxl.xxl_client import XXL
+
+
+class _CountXXL(XXL):
+    def __init__(self, total: int) -> None:
+        super().__init__("http://127.0.0.1:8080/xxl-job-admin/api/")
+        self.total = total
+        self.received = 0
+        self.done = asyncio.Event()
+
+    def _received(self, n: int) -> None:
+        self.received += n
+        if self.received >= self.total:
+            self.done.set()
+
+    async def callback(self, log_id: int, timestamp: int, code: int = 200, msg: Optional[str] = None) -> None:
+        self._received(1)
+
+    async def callback_batch(
+        self, log_ids: List[int], timestamp: int, code: int = 200, msg: Optional[str] = None
+    ) -> None:
+        self._received(len(log_ids))
+
+
+def cpu_work(loops: int) -> int:
+    acc = 0
+    for i in range(loops):
+        acc = (acc * 31 + i) % 1000003
+    return acc
+
+
+async def _bench(total: int, threads: int, loops: int, log_dir: str) -> float:
+    handler = JobHandler()
+
+    @handler.register(name="cpu")
+    def cpu() -> int:
+        return cpu_work(loops)
+
+    config = ExecutorConfig(
+        xxl_admin_baseurl="http://127.0.0.1:8080/xxl-job-admin/api/",
+        executor_app_name="pyxxl-benchmark",
+        max_workers=threads,
+        log_local_dir=log_dir,
+        executor_log_path=os.path.join(log_dir, "pyxxl.log"),
+        dotenv_try=False,
+    )
+    config.executor_logger.setLevel(logging.WARNING)
+    xxl_client = _CountXXL(total)
+    executor = Executor(xxl_client, config, handler=handler)
+
+    start = time.perf_counter()
+    for i in range(total):
+        await executor.run_job(
+            RunData(
+                jobId=i,
+                logId=i,
+                executorHandler="cpu",
+                executorBlockStrategy=executorBlockStrategy.SERIAL_EXECUTION.value,
+            )
+        )
+    await asyncio.wait_for(xxl_client.done.wait(), timeout=600)
+    cost = time.perf_counter() - start
+    await executor.shutdown()
+    await xxl_client.close()
+    return cost
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--total", type=int, default=64, help="任务数")
+    parser.add_argument("-t", "--threads", type=int, nargs="+", default=[1, 2, 4, 8], help="线程池大小")
+    parser.add_argument("-l", "--loops", type=int, default=500_000, help="每个任务的循环次数")
+    args = parser.parse_args()
+
+    print("python {} gil_enabled={} cpu_count={}".format(sys.version.split()[0], gil_enabled(), os.cpu_count()))
+    base: Dict[str, Any] = {}
+    for threads in args.threads:
+        # 任务日志默认同时输出到stderr
+        with tempfile.TemporaryDirectory() as log_dir, open(os.devnull, "w") as devnull, redirect_stderr(devnull):
+            loop = asyncio.new_event_loop()
+            cost = loop.run_until_complete(_bench(args.total, threads, args.loops, log_dir))
+            loop.close()
+        base.setdefault("cost", cost)
+        print(
+            "threads={:<4} {:>8.2f} job/s    speedup {:>5.2f}x".format(threads, args.total / cost, base["cost"] / cost)
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,9 @@
 import importlib.metadata
 
+from .cache import CachePolicy
 from .executor import JobHandler
 from .main import PyxxlRunner
+from .retry import RetryPolicy
 from .setting import ExecutorConfig
 
 
@@ -0,0 +1,175 @@
+import asyncio
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+MISS = "miss"
+MEMORY = "memory"
+DISK = "disk"
+SHARED = "shared"
+"""相同参数的任务正在执行,等待并复用它的结果"""
+
+
+@dataclass(frozen=True)
+class CachePolicy:
+    """
+    幂等任务的结果缓存,相同handler和executorParams的任务在ttl内直接返回上次成功的结果
+
+    !!! example
+
+        ```python
+        from pyxxl import CachePolicy
+
+        @app.register(cache=CachePolicy(ttl=3600, disk_dir="cache"))
+        async def report():
+            ...
+        ```
+
+    """
+
+    ttl: float = 300
+    """缓存的秒数. Default: 300"""
+    maxsize: int = 128
+    """每个handler在内存中缓存的结果数,超过后淘汰最久没有使用的. Default: 128"""
+    disk_dir: str = ""
+    """本地磁盘缓存的目录,为空时只缓存在内存中.结果需要能json序列化,过期的文件在读取时删除. Default: "" """
+    disk_maxsize: int = 1024
+    """disk_dir中最多缓存的结果数(多个handler共用目录时共享该上限),超过后删除最久没有使用的. Default: 1024"""
+
+
+class ResultCache:
+    """单个handler的结果缓存: 内存LRU + 可选的磁盘缓存,相同参数并发执行时只执行一次(single-flight)"""
+
+    def __init__(self, name: str, policy: CachePolicy, logger: Optional[logging.Logger] = None) -> None:
+        self.name = name
+        self.policy = policy
+        self.logger = logger or logging.getLogger("pyxxl.executor")
+        self._memory: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def key(self, params: str) -> str:
+        return hashlib.sha256(("%s\0%s" % (self.name, params)).encode()).hexdigest()
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.policy.disk_dir, "%s.json" % key)
+
+    def _get_memory(self, key: str) -> Tuple[Optional[str], Any]:
+        item = self._memory.get(key)
+        if item is not None:
+            if item[0] > time.time():
+                self._memory.move_to_end(key)
+                return MEMORY, item[1]
+            del self._memory[key]
+        return None, None
+
+    async def get(self, key: str) -> Tuple[Optional[str], Any]:
+        """返回(命中的缓存层, 结果),没有命中时缓存层为None,磁盘读写在线程池中执行"""
+        source, result = self._get_memory(key)
+        if source or not self.policy.disk_dir:
+            return source, result
+        expires, result = await asyncio.to_thread(self._read_disk, key)
+        if expires is None:
+            return None, None
+        self._set_memory(key, expires, result)
+        return DISK, result
+
+    async def set(self, key: str, result: Any) -> None:
+        expires = time.time() + self.policy.ttl
+        self._set_memory(key, expires, result)
+        await self._set_disk(key, expires, result)
+
+    async def _set_disk(self, key: str, expires: float, result: Any) -> None:
+        if not self.policy.disk_dir:
+            return
+        try:
+            content = json.dumps([expires, result])
+        except (TypeError, ValueError) as e:
+            self.logger.warning("Result of %s can not be cached on disk. %s", self.name, e)
+            return
+        await asyncio.to_thread(self._write_disk, key, content)
+
+    def _read_disk(self, key: str) -> Tuple[Optional[float], Any]:
+        path = self._disk_path(key)
+        try:
+            with open(path) as f:
+                expires, result = json.load(f)
+        except (OSError, ValueError):
+            return None, None
+        with contextlib.suppress(OSError):
+            if expires > time.time():
+                # 更新修改时间,淘汰时按最久没有使用的顺序
+                os.utime(path)
+                return expires, result
+            os.unlink(path)
+        return None, None
+
+    def _write_disk(self, key: str, content: str) -> None:
+        os.makedirs(self.policy.disk_dir, exist_ok=True)
+        path = self._disk_path(key)
+        with open(path + ".tmp", "w") as f:
+            f.write(content)
+        os.replace(path + ".tmp", path)
+        self._evict_disk()
+
+    def _evict_disk(self) -> None:
+        files: List[Tuple[float, str]] = []
+        with os.scandir(self.policy.disk_dir) as it:
+            for entry in it:
+                if entry.name.endswith(".json"):
+                    with contextlib.suppress(OSError):
+                        files.append((entry.stat().st_mtime, entry.path))
+        if len(files) <= self.policy.disk_maxsize:
+            return
+        files.sort()
+        for _, path in files[: len(files) - self.policy.disk_maxsize]:
+            with contextlib.suppress(OSError):
+                os.unlink(path)
+
+    def _set_memory(self, key: str, expires: float, result: Any) -> None:
+        self._memory[key] = (expires, result)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.policy.maxsize:
+            self._memory.popitem(last=False)
+
+    async def run(self, params: str, func: Callable[[], Awaitable[Any]]) -> Tuple[str, Any]:
+        """返回(结果来源, 结果),只缓存成功的结果"""
+        key = self.key(params)
+        while True:
+            source, result = await self.get(key)
+            if source:
+                return source, result
+            fut = self._inflight.get(key)
+            if fut is None:
+                # 读取磁盘期间相同参数的任务可能已经执行完成
+                source, result = self._get_memory(key)
+                if source:
+                    return source, result
+                break
+            await asyncio.wait({fut})
+            if not fut.cancelled():
+                return SHARED, fut.result()
+            # 正在执行的任务失败了,重新检查是否需要自己执行
+
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            result = await func()
+        except BaseException:
+            fut.cancel()
+            self._inflight.pop(key, None)
+            raise
+        expires = time.time() + self.policy.ttl
+        self._set_memory(key, expires, result)
+        self._inflight.pop(key, None)
+        fut.set_result(result)
+        try:
+            await self._set_disk(key, expires, result)
+        except OSError as e:
+            self.logger.error("Write result cache of %s failed. %s", self.name, e)
+        return MISS, result
@@ -0,0 +1,234 @@
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Deque, List, Optional, Tuple
+
+from pyxxl.threads import ThreadReaper, WatchedCall
+from pyxxl.utils import gil_enabled
+
+LOOP_LAG_INTERVAL = 0.5
+CGROUP_ROOT = "/sys/fs/cgroup"
+CPU_BUSY = 0.9
+"""进程CPU使用率达到该值时认为CPU已经用满,不再因为排队扩容.
+启用GIL时python线程最多同时使用一个核,相对于一个核计算,free-threaded构建时相对于可用核数计算"""
+IDLE_INTERVALS = 3
+
+
+class LoopLagMonitor:
+    """定时sleep,用实际唤醒时间和预期时间的差值衡量事件循环的延迟"""
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL) -> None:
+        self.interval = interval
+        self.lag: float = 0
+
+    async def run(self) -> None:
+        try:
+            while True:
+                start = time.perf_counter()
+                await asyncio.sleep(self.interval)
+                self.lag = max(time.perf_counter() - start - self.interval, 0)
+        except asyncio.CancelledError:
+            pass
+
+
+def _read_cgroup(root: str, name: str) -> Optional[str]:
+    try:
+        with open(os.path.join(root, name)) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def cgroup_cpu_limit(root: str = CGROUP_ROOT) -> Optional[float]:
+    """cgroup限制的CPU核数(v2的cpu.max或v1的cfs quota),没有限制时返回None"""
+    value = _read_cgroup(root, "cpu.max")
+    if value is not None:
+        quota, _, period = value.partition(" ")
+    else:
+        quota = _read_cgroup(root, "cpu/cpu.cfs_quota_us") or "max"
+        period = _read_cgroup(root, "cpu/cpu.cfs_period_us") or ""
+    try:
+        cpus = int(quota) / int(period)
+    except ValueError:
+        return None
+    return cpus if cpus > 0 else None
+
+
+def cgroup_memory_limit(root: str = CGROUP_ROOT) -> Optional[int]:
+    """cgroup限制的内存字节数(v2的memory.max或v1的memory.limit_in_bytes),没有限制时返回None"""
+    value = _read_cgroup(root, "memory.max") or _read_cgroup(root, "memory/memory.limit_in_bytes")
+    try:
+        limit = int(value or "max")
+    except ValueError:
+        return None
+    # v1没有限制时是一个接近int64最大值的数
+    return limit if 0 < limit < 2**60 else None
+
+
+def available_cpus(root: str = CGROUP_ROOT) -> float:
+    """进程可以使用的CPU核数,取cgroup限制和CPU亲和性中较小的"""
+    try:
+        cpus: float = len(os.sched_getaffinity(0))
+    except AttributeError:  # pragma: no cover
+        cpus = os.cpu_count() or 1
+    limit = cgroup_cpu_limit(root)
+    return min(cpus, limit) if limit else cpus
+
+
+class PoolAutoscaler:
+    """
+    根据同步任务的排队时间和吞吐量自动调整可以同时运行的同步任务数(线程数)
+
+    * 启动时根据cgroup的CPU限制计算初始值(和ThreadPoolExecutor默认的cpu+4一致),cgroup内存限制/worker_memory为上限
+    * 排队时间超过max_wait且CPU没有用满时扩容(IO密集型)
+    * CPU已经用满并且上次扩容后吞吐量没有提升时,撤销上次扩容(CPU密集型)
+    * 连续IDLE_INTERVALS个周期的并发峰值都远低于线程数时缩容
+
+    ThreadPoolExecutor的线程启动后不会退出,缩容通过slot限制同时运行的任务数实现;
+    线程池的_max_workers和reaper一样按差值调整,僵尸线程的扩容不受影响
+    """
+
+    def __init__(
+        self,
+        reaper: ThreadReaper,
+        *,
+        min_workers: int,
+        max_workers: int,
+        interval: float = 5,
+        max_wait: float = 0.1,
+        worker_memory: int = 0,
+        cgroup_root: str = CGROUP_ROOT,
+        callback: Optional[Callable[[int, float, str], Any]] = None,
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
+        self.reaper = reaper
+        self.cpus = available_cpus(cgroup_root)
+        memory = cgroup_memory_limit(cgroup_root)
+        if memory and worker_memory > 0:
+            max_workers = min(max_workers, memory // worker_memory)
+        self.max_workers = max(max_workers, 1)
+        self.min_workers = min(max(min_workers, 1), self.max_workers)
+        self.interval = interval
+        self.max_wait = max_wait
+        self.callback = callback or (lambda workers, wait, reason: 1)
+        self.logger = logger or logging.getLogger("pyxxl.executor")
+        self.limit = self._clamp(math.ceil(self.cpus) + 4)
+        self.running = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._peak = 0
+        self._waits: List[float] = []
+        self._idle = 0
+        self._grown = 0
+        self._last_throughput = 0.0
+        self._completed = 0
+        reaper._resize(self.limit - reaper.pool._max_workers + reaper.count)
+
+    def _clamp(self, workers: int) -> int:
+        return min(max(workers, self.min_workers), self.max_workers)
+
+    @asynccontextmanager
+    async def slot(self, call: WatchedCall) -> AsyncIterator[None]:
+        """在slot中把call提交到线程池,超时或取消时slot立即释放,线程由reaper接管"""
+        queued_at = time.monotonic()
+        try:
+            await self._acquire()
+            try:
+                yield
+            finally:
+                self.running -= 1
+                self._wake()
+        finally:
+            started_at = call.started_at or time.monotonic()
+            self._waits.append(max(started_at - queued_at, 0))
+            self._completed += call.finished
+
+    async def _acquire(self) -> None:
+        if self.running < self.limit and not self._waiters:
+            self._take()
+            return
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # 已经分配到slot后才被取消
+                self.running -= 1
+                self._wake()
+            else:
+                self._waiters.remove(fut)
+            raise
+
+    def _take(self) -> None:
+        self.running += 1
+        self._peak = max(self._peak, self.running)
+
+    def _wake(self) -> None:
+        while self._waiters and self.running < self.limit:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                self._take()
+                fut.set_result(None)
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def _decide(self, wait: float, throughput: float, cpu: float) -> Tuple[int, str]:
+        """返回新的线程数和调整的原因"""
+        step = max(self.limit // 4, 1)
+        if self._waiters or wait > self.max_wait:
+            self._idle = 0
+            if cpu < CPU_BUSY:
+                return self.limit + step, "queue_wait"
+            if self._grown and throughput < self._last_throughput * 1.05:
+                return self.limit - self._grown, "cpu_bound"
+            return self.limit, ""
+        self._idle = self._idle + 1 if self._peak + step <= self.limit else 0
+        if self._idle >= IDLE_INTERVALS:
+            self._idle = 0
+            return self.limit - step, "idle"
+        return self.limit, ""
+
+    def adjust(self, elapsed: float, cpu_time: float) -> None:
+        """根据最近elapsed秒的统计调整一次,cpu_time为这段时间内进程使用的CPU秒数"""
+        wait = sum(self._waits) / len(self._waits) if self._waits else 0
+        throughput = self._completed / elapsed if elapsed > 0 else 0
+        cores = 1 if gil_enabled() else self.cpus
+        cpu = cpu_time / (elapsed * cores) if elapsed > 0 else 0
+        workers, reason = self._decide(wait, throughput, cpu)
+        workers = self._clamp(workers)
+        self._grown = max(workers - self.limit, 0)
+        self._last_throughput = throughput
+        self._waits = []
+        self._completed = 0
+        self._peak = self.running
+        if workers != self.limit:
+            self.logger.info(
+                "Resize thread pool %s -> %s (%s): wait=%.3fs throughput=%.2f/s cpu=%.0f%%",
+                self.limit,
+                workers,
+                reason,
+                wait,
+                throughput,
+                cpu * 100,
+            )
+            self.reaper._resize(workers - self.limit)
+            self.limit = workers
+            self._wake()
+        else:
+            reason = ""
+        self.callback(self.limit, wait, reason)
+
+    async def run(self) -> None:
+        try:
+            while True:
+                start, cpu_start = time.monotonic(), time.process_time()
+                await asyncio.sleep(self.interval)
+                self.adjust(time.monotonic() - start, time.process_time() - cpu_start)
+        except asyncio.CancelledError:
+            pass
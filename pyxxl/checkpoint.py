@@ -0,0 +1,273 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Executor as PoolExecutor
+from concurrent.futures import Future
+from types import TracebackType
+from typing import TYPE_CHECKING, Any, Callable, Optional, Type, Union
+
+from pyxxl.utils import try_import
+
+if TYPE_CHECKING:
+    import redis
+else:
+    redis = try_import("redis")
+
+
+KEY_PREFIX = "pyxxl:checkpoint:{app}:{job_id}"
+
+_MISSING = object()
+
+
+class CheckpointStore:
+    """按jobId保存任务进度(json字符串)的存储"""
+
+    def load(self, job_id: int) -> Optional[str]:
+        raise NotImplementedError
+
+    def save(self, job_id: int, value: str) -> None:
+        raise NotImplementedError
+
+    def delete(self, job_id: int) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class SQLiteCheckpointStore(CheckpointStore):
+    """本地sqlite存储,使用WAL模式,同一台机器上的多个进程(如prefork)可以共用"""
+
+    def __init__(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # WAL模式下NORMAL只在checkpoint时fsync,频繁保存的开销很小,系统断电时可能丢失最后几次保存
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS checkpoint "
+            "(job_id INTEGER PRIMARY KEY, value TEXT NOT NULL, updated REAL NOT NULL)"
+        )
+
+    def load(self, job_id: int) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM checkpoint WHERE job_id = ?", (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def save(self, job_id: int, value: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoint (job_id, value, updated) VALUES (?, ?, ?)",
+                (job_id, value, time.time()),
+            )
+
+    def delete(self, job_id: int) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM checkpoint WHERE job_id = ?", (job_id,))
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class RedisCheckpointStore(CheckpointStore):
+    """redis存储,适用于任务会被调度到多台机器的执行器"""
+
+    def __init__(self, app: str, redis_client: Union[str, "redis.Redis"]) -> None:
+        if redis is None:
+            raise ImportError("Depend on redis. pip install redis or pip install pyxxl[redis].")  # pragma: no cover
+        self.app = app
+        self.rclient = redis.Redis.from_url(redis_client) if isinstance(redis_client, str) else redis_client
+
+    def key(self, job_id: int) -> str:
+        return KEY_PREFIX.format(app=self.app, job_id=job_id)
+
+    def load(self, job_id: int) -> Optional[str]:
+        value = self.rclient.get(self.key(job_id))
+        return value.decode() if isinstance(value, bytes) else value
+
+    def save(self, job_id: int, value: str) -> None:
+        self.rclient.set(self.key(job_id), value)
+
+    def delete(self, job_id: int) -> None:
+        self.rclient.delete(self.key(job_id))
+
+
+class Checkpoint:
+    """
+    任务的进度,通过g.checkpoint使用,下次执行(包括被kill,超时,执行器重启后)时可以从保存的进度继续
+
+    * save只修改内存中的值,每隔interval秒最多写入一次存储,可以很频繁的调用
+    * 设置了pool时存储的读写按顺序在pool中执行,不阻塞loop,协程中使用aload读取进度
+    * 任务结束(包括异常,取消和超时)时写入最后一次save的值
+    * 任务成功后默认删除进度,下次从头开始,需要跨执行保留进度(如增量同步的游标)时设置clear_on_success为False
+
+    !!! example
+
+        ```python
+        from pyxxl.ctx import g
+
+        @app.register(name="rebuild_index")
+        async def rebuild_index():
+            start = await g.checkpoint.aload(default=0)
+            for offset in range(start, total, 1000):
+                await rebuild(offset)
+                g.checkpoint.save(offset + 1000)
+        ```
+
+    """
+
+    def __init__(
+        self,
+        job_id: int,
+        store: Callable[[], CheckpointStore],
+        *,
+        interval: float = 1,
+        pool: Optional[PoolExecutor] = None,
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
+        """
+        Args:
+            pool: 执行存储读写的单线程池,为空时在调用save的线程中直接写入
+        """
+        self.job_id = job_id
+        self.interval = interval
+        self.clear_on_success = True
+        self.logger = logger or logging.getLogger("pyxxl.executor")
+        self._store = store
+        self._pool = pool
+        self._value: Any = _MISSING
+        self._dirty = False
+        self._saved_at = 0.0
+        self._closed = False
+        self._last: Optional[Future] = None
+        self._lock = threading.Lock()
+
+    def load(self, default: Any = None) -> Any:
+        """读取保存的进度,没有保存过时返回default"""
+        with self._lock:
+            if self._value is _MISSING:
+                value = self._store().load(self.job_id)
+                self._value = default if value is None else json.loads(value)
+            return self._value
+
+    async def aload(self, default: Any = None) -> Any:
+        """协程中使用的load,在pool中读取存储"""
+        if self._pool is None or self._value is not _MISSING:
+            return self.load(default)
+        value = await asyncio.wrap_future(self._pool.submit(self._read))
+        with self._lock:
+            if self._value is _MISSING:
+                self._value = default if value is None else json.loads(value)
+            return self._value
+
+    def save(self, value: Any) -> None:
+        """保存进度,value需要能json序列化,不会复制value"""
+        with self._lock:
+            if self._closed:
+                # 超时后仍在运行的同步任务,不能覆盖下一次执行的进度
+                self.logger.warning("Checkpoint of jobId=%s is closed, ignore save.", self.job_id)
+                return
+            self._value = value
+            self._dirty = True
+            if time.monotonic() - self._saved_at >= self.interval:
+                self._flush()
+
+    def flush(self) -> None:
+        """立即写入存储(设置了pool时提交到pool)"""
+        with self._lock:
+            self._flush()
+
+    async def aflush(self) -> None:
+        """立即写入存储,等待之前提交的写入全部完成"""
+        with self._lock:
+            self._flush()
+            last = self._last
+        if last:
+            await asyncio.wrap_future(last)
+
+    def clear(self) -> None:
+        """删除保存的进度"""
+        with self._lock:
+            self._clear()
+
+    async def aclear(self) -> None:
+        with self._lock:
+            self._clear()
+            last = self._last
+        if last:
+            await asyncio.wrap_future(last)
+
+    def _clear(self) -> None:
+        self._value = _MISSING
+        self._dirty = False
+        self._submit(self._delete)
+
+    def _flush(self) -> None:
+        if not self._dirty:
+            return
+        # 在调用者的线程中序列化,pool中写入时value可能已经被修改
+        self._submit(self._write, json.dumps(self._value, separators=(",", ":")))
+        self._dirty = False
+        self._saved_at = time.monotonic()
+
+    def _submit(self, func: Callable[..., None], *args: Any) -> None:
+        if self._pool is None:
+            func(*args)
+        else:
+            self._last = self._pool.submit(func, *args)
+
+    def _read(self) -> Optional[str]:
+        return self._store().load(self.job_id)
+
+    def _write(self, value: str) -> None:
+        try:
+            self._store().save(self.job_id, value)
+        except Exception as e:  # pylint: disable=broad-except
+            self.logger.error("Save checkpoint of jobId=%s failed. %r", self.job_id, e)
+
+    def _delete(self) -> None:
+        try:
+            self._store().delete(self.job_id)
+        except Exception as e:  # pylint: disable=broad-except
+            self.logger.error("Delete checkpoint of jobId=%s failed. %r", self.job_id, e)
+
+    def _close(self, success: bool) -> Optional[Future]:
+        """写入最后的进度(成功时删除),之后的save都被忽略,返回最后提交到pool的写入"""
+        with self._lock:
+            self._closed = True
+            if not (success and self.clear_on_success):
+                self._flush()
+            elif self._value is not _MISSING:
+                self._clear()
+            return self._last
+
+    def __enter__(self) -> "Checkpoint":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc: Optional[BaseException],
+        tb: Optional[TracebackType],
+    ) -> None:
+        self._close(exc_type is None)
+
+    async def __aenter__(self) -> "Checkpoint":
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc: Optional[BaseException],
+        tb: Optional[TracebackType],
+    ) -> None:
+        last = self._close(exc_type is None)
+        if last:
+            await asyncio.wrap_future(last)
@@ -1,15 +1,25 @@
 import logging
 import threading
 from contextvars import ContextVar, Token
-from typing import Optional
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Any, Dict, Mapping, Optional
 
 from pyxxl.schema import RunData
 
+if TYPE_CHECKING:
+    from pyxxl.checkpoint import Checkpoint
+    from pyxxl.ratelimit import TokenBucket
+    from pyxxl.shard import Shard
+
 
 class GlobalVars:
     _DATA: ContextVar = ContextVar("_DATA")
     _LOGGER: ContextVar = ContextVar("_LOGGER")
     _EVENT: ContextVar = ContextVar("_EVENT")
+    _SHARD: ContextVar = ContextVar("_SHARD")
+    _RATE_LIMITER: ContextVar = ContextVar("_RATE_LIMITER")
+    _CHECKPOINT: ContextVar = ContextVar("_CHECKPOINT")
+    _RESOURCES: ContextVar = ContextVar("_RESOURCES")
 
     @classmethod
     def set_xxl_run_data(cls, data: RunData) -> None:
@@ -39,5 +49,41 @@ class GlobalVars:
     def cancel_event(self) -> threading.Event:  # pragma: no cover
         return self._EVENT.get()
 
+    @classmethod
+    def set_shard(cls, shard: "Shard") -> None:
+        cls._SHARD.set(shard)
+
+    @property
+    def shard(self) -> "Shard":
+        """当前任务的分片(broadcastIndex/broadcastTotal)工具,见pyxxl.shard.Shard"""
+        return self._SHARD.get()
+
+    @classmethod
+    def set_rate_limiter(cls, limiter: Optional["TokenBucket"]) -> None:
+        cls._RATE_LIMITER.set(limiter)
+
+    @property
+    def rate_limiter(self) -> Optional["TokenBucket"]:
+        """当前handler的令牌桶(register时设置了rate),没有限流时为None"""
+        return self._RATE_LIMITER.get(None)
+
+    @classmethod
+    def set_checkpoint(cls, checkpoint: "Checkpoint") -> None:
+        cls._CHECKPOINT.set(checkpoint)
+
+    @property
+    def checkpoint(self) -> "Checkpoint":
+        """当前jobId的任务进度,见pyxxl.checkpoint.Checkpoint"""
+        return self._CHECKPOINT.get()
+
+    @classmethod
+    def set_resources(cls, resources: Dict[str, Any]) -> None:
+        cls._RESOURCES.set(resources)
+
+    @property
+    def resources(self) -> Mapping[str, Any]:
+        """当前执行器通过JobHandler.resource注册的共享资源,如g.resources["db"]"""
+        return MappingProxyType(self._RESOURCES.get({}))
+
 
 g = GlobalVars()
@@ -0,0 +1,84 @@
+import asyncio
+import io
+import sys
+import threading
+import traceback
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from aiohttp import web
+
+from pyxxl.executor import Executor
+from pyxxl.schema import RunData
+
+routes = web.RouteTableDef()
+
+_Handler = Callable[[web.Request], Awaitable[web.StreamResponse]]
+
+
+def protected(func: _Handler) -> _Handler:
+    """debug接口需要开启debug_api,配置了access_token时还需要校验token"""
+
+    async def wrapper(request: web.Request) -> web.StreamResponse:
+        config = request.app["pyxxl_state"].executor.config
+        if not config.debug_api:
+            raise web.HTTPNotFound()
+        if config.access_token and request.headers.get("XXL-JOB-ACCESS-TOKEN") != config.access_token:
+            raise web.HTTPForbidden(text="The access token is wrong.")
+        return await func(request)
+
+    return wrapper
+
+
+@routes.get("/debug/trace")
+@protected
+async def trace(request: web.Request) -> web.StreamResponse:
+    executor: Executor = request.app["pyxxl_state"].executor
+    if executor.tracer is None:
+        raise web.HTTPNotFound(text="trace is disabled, set trace_buffer_size to enable it.")
+    return web.json_response(executor.tracer.to_chrome_trace())
+
+
+def format_task_stacks(executor: Executor, limit: Optional[int] = None) -> str:
+    """所有asyncio task的调用栈,属于执行器任务的会标注jobId和logId"""
+    running: Dict[asyncio.Task, RunData] = {t.task: t.data for t in executor.tasks.values()}
+    tasks = sorted(asyncio.all_tasks(), key=lambda t: t.get_name())
+    buf = io.StringIO()
+    buf.write("# asyncio tasks: %s\n" % len(tasks))
+    for task in tasks:
+        data = running.get(task)
+        job = " jobId=%s logId=%s" % (data.jobId, data.logId) if data else ""
+        buf.write("\n--- Task %s%s [%s]\n" % (task.get_name(), job, "done" if task.done() else "pending"))
+        task.print_stack(limit=limit, file=buf)
+    return buf.getvalue()
+
+
+def format_thread_stacks(limit: Optional[int] = None) -> str:
+    """所有线程的调用栈,包括pyxxl_pool中的线程"""
+    names = {t.ident: t.name for t in threading.enumerate()}
+    frames = sys._current_frames()
+    lines: List[str] = ["# threads: %s\n" % len(frames)]
+    for ident, frame in sorted(frames.items(), key=lambda x: names.get(x[0], "")):
+        lines.append("\n--- Thread %s (%s)\n" % (names.get(ident, "unknown"), ident))
+        lines.extend(traceback.format_stack(frame, limit=limit))
+    return "".join(lines)
+
+
+@routes.get("/debug/stacks")
+@protected
+async def stacks(request: web.Request) -> web.StreamResponse:
+    """?limit=N 限制每个调用栈输出的帧数"""
+    executor: Executor = request.app["pyxxl_state"].executor
+    limit = None
+    if "limit" in request.query:
+        try:
+            limit = int(request.query["limit"])
+        except ValueError:
+            limit = 0
+        if limit <= 0:
+            raise web.HTTPBadRequest(text="limit must be a positive integer.")
+    text = format_task_stacks(executor, limit) + "\n\n" + format_thread_stacks(limit)
+    return web.Response(text=text)
+
+
+def mount_app(app: web.Application) -> None:
+    app.add_routes(routes)
@@ -5,3 +5,13 @@ class executorBlockStrategy(Enum):
     SERIAL_EXECUTION = "SERIAL_EXECUTION"  # 单机串行
     DISCARD_LATER = "DISCARD_LATER"  # 丢弃后续调度
     COVER_EARLY = "COVER_EARLY"  # 关闭上次执行改为这次执行，不推荐
+
+
+class glueType(Enum):
+    BEAN = "BEAN"
+    GLUE_GROOVY = "GLUE_GROOVY"
+    GLUE_SHELL = "GLUE_SHELL"
+    GLUE_PYTHON = "GLUE_PYTHON"
+    GLUE_PHP = "GLUE_PHP"
+    GLUE_NODEJS = "GLUE_NODEJS"
+    GLUE_POWERSHELL = "GLUE_POWERSHELL"
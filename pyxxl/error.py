@@ -19,6 +19,30 @@ class JobParamsError(Exception):
         super().__init__(message)
 
 
+class JobStaleError(Exception):
+    def __init__(self, message: str) -> None:
+        self.message = message
+        super().__init__(message)
+
+
+class JobScriptError(Exception):
+    def __init__(self, message: str) -> None:
+        self.message = message
+        super().__init__(message)
+
+
+class JobRateLimitedError(Exception):
+    def __init__(self, message: str) -> None:
+        self.message = message
+        super().__init__(message)
+
+
+class JobLeaseLostError(Exception):
+    def __init__(self, message: str) -> None:
+        self.message = message
+        super().__init__(message)
+
+
 class JobRegisterError(Exception):
     def __init__(self, message: str) -> None:
         self.message = message
@@ -29,3 +53,7 @@ class XXLClientError(Exception):
     def __init__(self, message: str) -> None:
         self.message = message
         super().__init__(message)
+
+
+class JobKilledError(BaseException):
+    """注入到超时后仍未退出的同步任务线程,继承BaseException避免被任务中的except Exception吞掉"""
@@ -1,26 +1,61 @@
 from __future__ import annotations
 
 import asyncio
+import functools
+import inspect
 import logging
+import multiprocessing
+import os
+import socket
 import threading
 import time
 import warnings
 from collections import defaultdict
-from concurrent.futures import ThreadPoolExecutor
-from dataclasses import dataclass
-from typing import Any, Callable, Dict, List, MutableSet, Optional
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import AsyncExitStack, asynccontextmanager, nullcontext
+from dataclasses import asdict, dataclass
+from typing import (
+    Any,
+    AsyncContextManager,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    ContextManager,
+    Dict,
+    List,
+    MutableSet,
+    Optional,
+    Union,
+)
 
 from pyxxl import error
+from pyxxl.cache import MISS, CachePolicy, ResultCache
+from pyxxl.capacity import LoopLagMonitor, PoolAutoscaler
+from pyxxl.checkpoint import Checkpoint, CheckpointStore, RedisCheckpointStore, SQLiteCheckpointStore
 from pyxxl.ctx import g
-from pyxxl.enum import executorBlockStrategy
+from pyxxl.enum import executorBlockStrategy, glueType
+from pyxxl.glue import GlueCodeCache, glue_namespace, run_in_subprocess, run_shell_script, write_script
+from pyxxl.journal import RunJournal
+from pyxxl.lease import FileLease, LeaseBackend, RedisLease
 from pyxxl.log import executor_logger
 from pyxxl.logger import DiskLog, LogBase, new_logger
+from pyxxl.memory import MemoryTracer
+from pyxxl.ratelimit import RATE_DELAY, RATE_REJECT, TokenBucket
+from pyxxl.reducer import Reducer, last
+from pyxxl.result import Serializer, serialize_result, truncate_msg
+from pyxxl.retry import RetryPolicy
 from pyxxl.schema import RunData
 from pyxxl.setting import ExecutorConfig
+from pyxxl.shard import Shard
+from pyxxl.spill import SpillQueue
+from pyxxl.threads import ThreadReaper
+from pyxxl.trace import ACCEPTED, FINISHED, QUEUED, STARTED, THREAD_END, THREAD_START, TraceRecorder
 from pyxxl.types import DecoratedCallable
+from pyxxl.utils import get_event_loop
 from pyxxl.xxl_client import XXL
 
 # https://docs.python.org/3.10/library/asyncio-task.html#asyncio.create_task
+# 只在loop线程中修改
 _BACKGROUND_TASKS: MutableSet[asyncio.Task] = set()
 
 
@@ -29,32 +64,140 @@ def _spawn_task(task: asyncio.Task) -> None:
     task.add_done_callback(_BACKGROUND_TASKS.discard)
 
 
+ProgressCallback = Callable[[int, Any], Any]
+
+PROGRESS_MAX_LENGTH = 1000
+"""任务日志中每条进度最多输出的字符数"""
+
+SHUTDOWN_CALLBACK_TIMEOUT = 5
+"""shutdown时回调被丢弃的排队调度最多等待的秒数,超时后保留在journal中下次启动再回调"""
+
+MISFIRE_SKIP = "skip"
+"""过期的调度不执行,直接回调失败"""
+MISFIRE_COALESCE = "coalesce"
+"""过期的调度合并到后面排队的调度中,没有后续调度时仍然执行"""
+
+GLUE_TYPES = (glueType.GLUE_PYTHON.value, glueType.GLUE_SHELL.value)
+"""需要开启glue_enabled才能执行的glueType"""
+
+
 @dataclass
 class HandlerInfo:
     handler: Callable
     is_async: bool = False
+    coalesce: bool = False
+    """SERIAL_EXECUTION时最多只保留一个排队的任务,新的调度替换旧的调度(参数以最新的为准)"""
+    max_lateness: Optional[float] = None
+    """调度时间(logDateTime)到接收或出队时允许的最大延迟秒数,超过后按misfire_policy处理"""
+    misfire_policy: str = MISFIRE_SKIP
+    retry: Optional[RetryPolicy] = None
+    cache: Optional[CachePolicy] = None
+    reducer: Optional[Reducer] = None
+    """生成器任务把每次yield的结果合并为最终的结果,默认使用最后一次yield的结果"""
+    serializer: Optional[Serializer] = None
+    """把返回值转换为回调的handleMsg,默认使用pyxxl.result.serialize_result"""
+    limiter: Optional[TokenBucket] = None
+    """handler的所有jobId共用的令牌桶.delay策略每次执行(包括重试)前等待一个令牌,
+    reject策略只在接收调度时消耗一个令牌,同一个logId内的重试不再消耗令牌"""
+    rate_policy: str = RATE_DELAY
 
     def __str__(self) -> str:
         return "<HandlerInfo {}>".format(self.handler.__name__)
 
     def __post_init__(self) -> None:
-        self.is_async = asyncio.iscoroutinefunction(self.handler)
+        self.is_async = asyncio.iscoroutinefunction(self.handler) or inspect.isasyncgenfunction(self.handler)
 
-    async def start(self, timeout: int) -> Any:
+    def _run_in_thread(self, tracer: Optional[TraceRecorder], progress: Optional[ProgressCallback]) -> Any:
+        if tracer is None:
+            return self._call_sync(progress)
+        tracer.record_ctx(THREAD_START, self.handler.__name__)
+        try:
+            return self._call_sync(progress)
+        finally:
+            tracer.record_ctx(THREAD_END, self.handler.__name__)
+
+    def _call_sync(self, progress: Optional[ProgressCallback]) -> Any:
+        result = self.handler()
+        if not inspect.isgenerator(result):
+            return result
+        reducer = self.reducer or last
+        acc = None
+        try:
+            for index, item in enumerate(result, 1):
+                acc = reducer(acc, item)
+                if progress:
+                    progress(index, item)
+                if g.cancel_event.is_set():
+                    break
+        finally:
+            result.close()
+        return acc
+
+    async def _call_async(self, progress: Optional[ProgressCallback]) -> Any:
+        if not inspect.isasyncgenfunction(self.handler):
+            return await self.handler()
+        reducer = self.reducer or last
+        acc = None
+        agen = self.handler()
+        try:
+            index = 0
+            async for item in agen:
+                index += 1
+                acc = reducer(acc, item)
+                if progress:
+                    progress(index, item)
+        finally:
+            await agen.aclose()
+        return acc
+
+    async def start(
+        self,
+        timeout: float,
+        tracer: Optional[TraceRecorder] = None,
+        reaper: Optional[ThreadReaper] = None,
+        progress: Optional[ProgressCallback] = None,
+        autoscaler: Optional[PoolAutoscaler] = None,
+    ) -> Any:
+        """
+        Args:
+            progress: 生成器任务每次yield后调用progress(序号, item),只保留合并的结果,不会缓存所有的item
+            autoscaler: 同步任务需要先拿到autoscaler的slot再提交到线程池,等待时间计入超时
+        """
         if self.is_async:
-            return await asyncio.wait_for(self.handler(), timeout=timeout)
+            return await asyncio.wait_for(self._call_async(progress), timeout=timeout)
         # https://stackoverflow.com/questions/71416383/python-asyncio-cancelling-a-to-thread-task-wont-stop-the-thread
         # 由于线程无法直接取消，这里发送一个event，供开发者自己接收信号来判断是否需要取消
         event = threading.Event()
         g.set_cancel_event(event)
+        func = functools.partial(self._run_in_thread, tracer, progress)
+        call = None
+        future: Awaitable[Any]
+        if reaper:
+            call = reaper.watch(func, g.try_get_run_data())
+            future = reaper.submit(call, autoscaler)
+        else:
+            future = asyncio.to_thread(func)
         try:
-            return await asyncio.wait_for(asyncio.to_thread(self.handler), timeout=timeout)
+            return await asyncio.wait_for(future, timeout=timeout)
         except (asyncio.exceptions.TimeoutError, asyncio.CancelledError) as e:
             event.set()
-            # logger.debug("Get error for sync task {}".format(self))
+            # 线程不会随着超时退出,交给reaper追踪,避免占满线程池
+            if reaper and call:
+                reaper.abandon(call)
             raise e
 
 
+def _resource_context(func: Callable) -> AsyncContextManager:
+    if inspect.isasyncgenfunction(func):
+        return asynccontextmanager(func)()
+
+    @asynccontextmanager
+    async def _context() -> AsyncIterator[Any]:
+        yield await func()
+
+    return _context()
+
+
 class XXLTask:
     def __init__(self, task: asyncio.Task, data: RunData):
         self.task = task
@@ -71,18 +214,65 @@ class XXLTask:
 class JobHandler:
     def __init__(self, logger: Optional[logging.Logger] = None) -> None:
         self._handlers: Dict[str, HandlerInfo] = {}
+        self._resources: Dict[str, Callable] = {}
         self.logger = logger or executor_logger
 
     def register(
-        self, *args: Any, name: Optional[str] = None, replace: bool = False
+        self,
+        *args: Any,
+        name: Optional[str] = None,
+        replace: bool = False,
+        coalesce: bool = False,
+        max_lateness: Optional[float] = None,
+        misfire_policy: str = MISFIRE_SKIP,
+        retry: Optional[RetryPolicy] = None,
+        cache: Optional[CachePolicy] = None,
+        reducer: Optional[Reducer] = None,
+        serializer: Optional[Serializer] = None,
+        rate: Optional[float] = None,
+        burst: int = 1,
+        rate_policy: str = RATE_DELAY,
     ) -> Callable[[DecoratedCallable], DecoratedCallable]:
-        """将函数注册到可执行的job中,如果其他地方要调用该方法,replace修改为True"""
+        """将函数注册到可执行的job中,如果其他地方要调用该方法,replace修改为True
+
+        Args:
+            coalesce (bool, optional): 单机串行时合并排队的调度,只保留最新的一个,
+                被合并的调度会在最新的调度执行完成后一起回调.
+            max_lateness (float, optional): 调度时间到接收或者出队时允许的最大延迟秒数,默认不检查.
+            misfire_policy (str, optional): 超过max_lateness的调度的处理方式,skip或者coalesce.
+            retry (RetryPolicy, optional): 任务失败后在同一个logId内重试,最后只回调一次.
+            cache (CachePolicy, optional): 缓存成功的结果,相同executorParams的任务直接返回缓存的结果.
+            reducer (Reducer, optional): 生成器任务合并yield结果的函数,见pyxxl.reducer,默认使用最后一次yield的结果.
+            serializer (Serializer, optional): 把返回值转换为回调的handleMsg,超过callback_msg_max_bytes时截断.
+            rate (float, optional): 每秒最多执行的次数(令牌桶),handler的所有jobId共用,默认不限制.
+            burst (int, optional): 令牌桶最多积累的令牌数,即允许同时开始执行的次数.
+            rate_policy (str, optional): 超过rate时的处理方式,delay(等待令牌)或者reject(拒绝调度).
+        """
+        if misfire_policy not in (MISFIRE_SKIP, MISFIRE_COALESCE):
+            raise error.JobRegisterError("unknown misfire_policy %s." % misfire_policy)
+        if rate_policy not in (RATE_DELAY, RATE_REJECT):
+            raise error.JobRegisterError("unknown rate_policy %s." % rate_policy)
+        if rate is not None and (rate <= 0 or burst < 1):
+            raise error.JobRegisterError("rate and burst must be greater than 0.")
 
         def func_wrapper(func: DecoratedCallable) -> DecoratedCallable:
             handler_name = name or func.__name__
             if handler_name in self._handlers and replace is False:
                 raise error.JobRegisterError("handler %s already registered." % handler_name)
-            handler = HandlerInfo(handler=func)
+            if reducer and not (inspect.isgeneratorfunction(func) or inspect.isasyncgenfunction(func)):
+                raise error.JobRegisterError("reducer of handler %s requires a generator function." % handler_name)
+            handler = HandlerInfo(
+                handler=func,
+                coalesce=coalesce,
+                max_lateness=max_lateness,
+                misfire_policy=misfire_policy,
+                retry=retry,
+                cache=cache,
+                reducer=reducer,
+                serializer=serializer,
+                limiter=TokenBucket(rate, burst) if rate else None,
+                rate_policy=rate_policy,
+            )
             if not handler.is_async:
                 warnings.warn(
                     "Using the sync method will unknown blocking exception, consider using async method.",
@@ -90,7 +280,7 @@ class JobHandler:
                     stacklevel=2,
                 )
             self._handlers[handler_name] = handler
-            self.logger.debug("register job %s,is async: %s" % (handler_name, asyncio.iscoroutinefunction(func)))
+            self.logger.debug("register job %s,is async: %s" % (handler_name, handler.is_async))
 
             return func
 
@@ -99,6 +289,54 @@ class JobHandler:
 
         return func_wrapper
 
+    def resource(self, name: Union[str, DecoratedCallable, None] = None) -> Any:
+        """
+        注册执行器级别的共享资源(连接池,http session,模型等),执行器启动时创建一次,任务中通过g.resources获取
+
+        支持async generator(yield之后的代码在执行器关闭时执行)或者async函数,按注册顺序创建,按相反的顺序关闭.
+        不传name时可以直接用@app.resource,资源名为函数名
+
+        !!! example
+
+            ```python
+            @app.resource("db")
+            async def db_pool():
+                pool = await create_pool()
+                yield pool
+                await pool.close()
+
+            @app.register
+            async def query():
+                async with g.resources["db"].acquire() as conn:
+                    ...
+            ```
+        """
+
+        def func_wrapper(func: DecoratedCallable) -> DecoratedCallable:
+            resource_name = name if isinstance(name, str) else func.__name__
+            if resource_name in self._resources:
+                raise error.JobRegisterError("resource %s already registered." % resource_name)
+            if not (inspect.isasyncgenfunction(func) or asyncio.iscoroutinefunction(func)):
+                raise error.JobRegisterError("resource %s must be async generator or async function." % resource_name)
+            self._resources[resource_name] = func
+            return func
+
+        if callable(name):
+            return func_wrapper(name)
+
+        return func_wrapper
+
+    @asynccontextmanager
+    async def lifespan(self) -> AsyncIterator[Dict[str, Any]]:
+        """创建所有共享资源并返回资源名到资源的字典,退出时按相反的顺序关闭并清空"""
+        resources: Dict[str, Any] = {}
+        async with AsyncExitStack() as stack:
+            stack.callback(resources.clear)
+            for name, func in self._resources.items():
+                resources[name] = await stack.enter_async_context(_resource_context(func))
+                self.logger.info("resource %s is ready.", name)
+            yield resources
+
     def get(self, name: str) -> Optional[HandlerInfo]:
         return self._handlers.get(name, None)
 
@@ -117,6 +355,15 @@ class Executor:
         logger_factory: Optional[LogBase] = None,
         successed_callback: Optional[Callable] = None,
         failed_callback: Optional[Callable] = None,
+        memory_callback: Optional[Callable] = None,
+        lateness_callback: Optional[Callable] = None,
+        retry_callback: Optional[Callable] = None,
+        cache_callback: Optional[Callable] = None,
+        glue_callback: Optional[Callable] = None,
+        progress_callback: Optional[Callable] = None,
+        result_size_callback: Optional[Callable] = None,
+        pool_resize_callback: Optional[Callable] = None,
+        zombie_killed_callback: Optional[Callable] = None,
     ) -> None:
         """执行器，真正的调度任务和策略都在这里
 
@@ -131,20 +378,102 @@ class Executor:
         self.config = config
 
         self.handler: JobHandler = handler or JobHandler()
-        self.loop = loop or asyncio.get_event_loop()
+        self.loop = loop or get_event_loop()
+        # JobHandler.lifespan创建的共享资源,每个执行器独立,任务中通过g.resources读取
+        self.resources: Dict[str, Any] = {}
+        # tasks/queue/spill等调度状态只在loop线程中读写,线程池中的同步任务不直接访问,
+        # 需要时通过call_soon_threadsafe回到loop线程,free-threaded构建下也不需要加锁
         self.tasks: Dict[int, XXLTask] = {}
         self.queue: Dict[int, asyncio.Queue[RunData]] = defaultdict(
             lambda: asyncio.Queue(maxsize=self.config.task_queue_length)
         )
+        # 内存队列满后溢出到磁盘的队列,需要配置task_queue_spill_dir
+        self.spill: Dict[int, SpillQueue] = {}
+        # coalesce合并的调度, 保留的logId -> 被合并的logId列表
+        self._coalesced: Dict[int, List[int]] = {}
         # 为每个jobId创建独立的锁，避免不同job之间的锁竞争
         self._job_locks: Dict[int, asyncio.Lock] = defaultdict(asyncio.Lock)
         self.thread_pool = ThreadPoolExecutor(
             max_workers=self.config.max_workers,
             thread_name_prefix="pyxxl_pool",
         )
+        self.reaper = ThreadReaper(
+            self.thread_pool,
+            self.loop,
+            grace_period=self.config.zombie_grace_period,
+            logger=self.executor_logger,
+            kill_callback=lambda: self.zombie_killed_callback(),
+        )
+        self.loop_lag = LoopLagMonitor()
+        self.autoscaler: Optional[PoolAutoscaler] = None
+        if self.config.adaptive_workers:
+            self.autoscaler = PoolAutoscaler(
+                self.reaper,
+                min_workers=self.config.min_workers,
+                max_workers=self.config.max_workers,
+                interval=self.config.adaptive_interval,
+                max_wait=self.config.adaptive_max_wait,
+                worker_memory=self.config.worker_memory,
+                callback=lambda workers, wait, reason: self.pool_resize_callback(workers, wait, reason),
+                logger=self.executor_logger,
+            )
         self.logger_factory = logger_factory or DiskLog(self.config.log_local_dir)
         self.successed_callback = successed_callback or (lambda: 1)
         self.failed_callback = failed_callback or (lambda x: 1)
+        self.memory_callback = memory_callback or (lambda name, stats: 1)
+        self.lateness_callback = lateness_callback or (lambda name, seconds: 1)
+        self.retry_callback = retry_callback or (lambda: 1)
+        self.cache_callback = cache_callback or (lambda name, hit: 1)
+        self.result_caches: Dict[str, ResultCache] = {}
+        self.glue_callback = glue_callback or (lambda hit, seconds: 1)
+        self.progress_callback = progress_callback or (lambda name: 1)
+        self.result_size_callback = result_size_callback or (lambda name, size: 1)
+        self.pool_resize_callback = pool_resize_callback or (lambda workers, wait, reason: 1)
+        self.zombie_killed_callback = zombie_killed_callback or (lambda: 1)
+        self.glue_codes = GlueCodeCache(
+            self.config.glue_cache_size, callback=lambda hit, seconds: self.glue_callback(hit, seconds)
+        )
+        # glue_process_workers大于0时限制同时运行的GLUE子进程数,第一次使用时创建
+        self._glue_slots: Optional[asyncio.Semaphore] = None
+        if self.config.glue_enabled and not self.config.access_token:
+            self.executor_logger.warning("glue_enabled without access_token, anyone can run scripts on this executor.")
+        self.process_pool: Optional[ProcessPoolExecutor] = None
+        self._glue_handler = HandlerInfo(handler=self._run_glue)
+        self._glue_shell_handler = HandlerInfo(handler=self._run_glue_shell)
+        self.memory_tracer: Optional[MemoryTracer] = None
+        if self.config.memory_trace:
+            self.memory_tracer = MemoryTracer(
+                snapshot_jobs=self.config.memory_snapshot_job_ids,
+                snapshot_top=self.config.memory_snapshot_top,
+                callback=lambda name, stats: self.memory_callback(name, stats),
+            )
+        self.tracer: Optional[TraceRecorder] = None
+        if self.config.trace_buffer_size > 0:
+            self.tracer = TraceRecorder(self.config.trace_buffer_size)
+            self.xxl_client.tracer = self.tracer
+        self.journal: Optional[RunJournal] = None
+        if self.config.journal_dir:
+            self.journal = RunJournal(
+                os.path.join(self.config.journal_dir, "journal.jsonl"),
+                flush_interval=self.config.journal_flush_interval,
+                logger=self.executor_logger,
+            )
+        self.checkpoint_store: Optional[CheckpointStore] = None
+        # checkpoint的存储读写在单独的线程中按提交顺序执行,不阻塞loop
+        self._checkpoint_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pyxxl_checkpoint")
+        self.lease: Optional[LeaseBackend] = None
+        # 租约读写文件或redis,使用独立的线程池,任务线程池被占满时也能按时续约
+        self._lease_pool: Optional[ThreadPoolExecutor] = None
+        if self.config.job_lease == "file":
+            self.lease = FileLease(self.config.job_lease_dir or os.path.join(self.config.log_local_dir, "lease"))
+        elif self.config.job_lease == "redis":
+            # 任务日志也存储在redis时复用它的连接
+            self.lease = RedisLease(
+                self.config.executor_app_name,
+                getattr(self.logger_factory, "rclient", None) or self.config.log_redis_uri,
+            )
+        if self.lease:
+            self._lease_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="pyxxl_lease")
         self.loop.set_default_executor(self.thread_pool)
 
     @property
@@ -155,6 +484,15 @@ class Executor:
         """获取指定jobId的锁"""
         return self._job_locks[job_id]
 
+    def _trace(self, event: str, data: RunData) -> None:
+        if self.tracer is not None:
+            self.tracer.record(event, data.jobId, data.logId)
+
+    def _trace_memory(self, data: RunData, task_logger: logging.Logger) -> ContextManager:
+        if self.memory_tracer is None:
+            return nullcontext()
+        return self.memory_tracer.trace(data, task_logger)
+
     def _create_task(self, data: RunData) -> XXLTask:
         """创建一个任务"""
         task = self.loop.create_task(self._run(data), name=f"{data.jobId}_{data.logId}")
@@ -169,13 +507,48 @@ class Executor:
         msg = "Job {} BlockStrategy is COVER_EARLY, logId {} replaced.".format(data.jobId, data.logId)
         self.executor_logger.warning(msg)
         await self.get_queue(data.jobId).put(data)
+        self._trace(QUEUED, data)
         _spawn_task(self.loop.create_task(self.cancel_job(data.jobId, include_queue=False)))
         return msg
 
+    async def _handle_coalesce(self, data: RunData) -> str:
+        """SERIAL_EXECUTION并且handler开启了coalesce: 队列中最多保留一个任务,新的替换旧的"""
+        queue = self.get_queue(data.jobId)
+        superseded: List[int] = []
+        while not queue.empty():
+            old = queue.get_nowait()
+            queue.task_done()
+            superseded.extend(self._coalesced.pop(old.logId, []))
+            superseded.append(old.logId)
+        if superseded:
+            self._coalesced[data.logId] = superseded
+        await queue.put(data)
+        self._trace(QUEUED, data)
+        msg = "job {job_id} is coalesced, logId {log_id} is pending and replaces {superseded}.".format(
+            job_id=data.jobId, log_id=data.logId, superseded=superseded
+        )
+        self.executor_logger.info(msg)
+        return msg
+
     async def _handle_serial_execution(self, data: RunData) -> str:
         """处理SERIAL_EXECUTION策略：串行执行，加入队列"""
+        handler = self.get_handler(data)
+        if handler and handler.coalesce:
+            return await self._handle_coalesce(data)
+
         queue = self.get_queue(data.jobId)
-        if queue.full():
+        spill = self.spill.get(data.jobId)
+        # 溢出队列中有数据时新任务也必须写入溢出队列,保证先进先出
+        if self.config.task_queue_spill_dir and (queue.full() or (spill and not spill.empty())):
+            spill = self.get_spill(data.jobId)
+            spill.put(data)
+            self._trace(QUEUED, data)
+            msg = "job {job_id} is in spill queue, logId {log_id} ranked {ranked}th...".format(
+                job_id=data.jobId, log_id=data.logId, ranked=queue.qsize() + spill.qsize()
+            )
+            self.executor_logger.info(msg)
+            return msg
+        elif queue.full():
             msg = "Job {job_id} is SERIAL, queue length more than {maxsize}. Job {job} discard!".format(
                 job_id=data.jobId, job=data, maxsize=queue.maxsize
             )
@@ -187,14 +560,30 @@ class Executor:
             )
             self.executor_logger.info(msg)
             await queue.put(data)
+            self._trace(QUEUED, data)
             return msg
 
     async def run_job(self, data: RunData) -> str:
-        handler_obj = self.handler.get(data.executorHandler)
+        self._trace(ACCEPTED, data)
+        if data.glueType in GLUE_TYPES and not self.config.glue_enabled:
+            msg = "glueType %s is disabled, set glue_enabled=True to run GLUE scripts." % data.glueType
+            self.executor_logger.warning(msg)
+            raise error.JobNotFoundError(msg)
+        handler_obj = self.get_handler(data)
         if not handler_obj:
             self.executor_logger.warning("handler %s not found." % data.executorHandler)
             raise error.JobNotFoundError("handler %s not found." % data.executorHandler)
+        self._check_trigger(data, handler_obj)
+        try:
+            return await self._accept(data)
+        except Exception:
+            # reject策略的令牌在_check_trigger中已经拿走,调度被拒绝(重复,队列已满等)时归还
+            if handler_obj.limiter and handler_obj.rate_policy == RATE_REJECT:
+                handler_obj.limiter.release()
+            raise
 
+    async def _accept(self, data: RunData) -> str:
+        """按照阻塞策略运行或者排队,返回调度结果的描述"""
         # 使用jobId对应的锁，避免全局锁竞争
         job_lock = self._get_job_lock(data.jobId)
         async with job_lock:
@@ -204,6 +593,7 @@ class Executor:
 
             # 如果没有运行任务且队列为空，直接创建并运行
             if not current_task and queue.empty():
+                self._journal_accepted(data)
                 self.tasks[data.jobId] = self._create_task(data)
                 return "Running"
 
@@ -211,16 +601,35 @@ class Executor:
             self.executor_logger.warning("jobId {} is running. current_task={}".format(data.jobId, current_task))
 
             if data.executorBlockStrategy == executorBlockStrategy.DISCARD_LATER.value:
-                return await self._handle_discard_later(data)
+                msg = await self._handle_discard_later(data)
             elif data.executorBlockStrategy == executorBlockStrategy.COVER_EARLY.value:
-                return await self._handle_cover_early(data)
+                msg = await self._handle_cover_early(data)
             elif data.executorBlockStrategy == executorBlockStrategy.SERIAL_EXECUTION.value:
-                return await self._handle_serial_execution(data)
+                msg = await self._handle_serial_execution(data)
             else:
                 raise error.JobParamsError(
                     "unknown executorBlockStrategy [%s]." % data.executorBlockStrategy,
                     executorBlockStrategy=data.executorBlockStrategy,
                 )
+            self._journal_accepted(data)
+            return msg
+
+    def _check_trigger(self, data: RunData, handler: HandlerInfo) -> None:
+        """拒绝过期的调度和超过限流的调度"""
+        lateness = self._stale_lateness(data)
+        if lateness is not None and handler.misfire_policy == MISFIRE_SKIP:
+            msg = self._stale_message(data, lateness)
+            self.executor_logger.warning(msg)
+            raise error.JobStaleError(msg)
+        if handler.limiter and handler.rate_policy == RATE_REJECT and not handler.limiter.try_acquire():
+            msg = "handler %s is rate limited %s, reject jobId=%s logId=%s." % (
+                data.executorHandler,
+                handler.limiter,
+                data.jobId,
+                data.logId,
+            )
+            self.executor_logger.warning(msg)
+            raise error.JobRateLimitedError(msg)
 
     async def cancel_job(self, job_id: int, include_queue: bool = True) -> None:
         await asyncio.sleep(0.01)  # delay for pytest
@@ -228,6 +637,7 @@ class Executor:
 
         job_lock = self._get_job_lock(job_id)
         task_to_cancel = None
+        superseded: List[int] = []
 
         # 在锁内进行队列清理和任务标记
         async with job_lock:
@@ -236,13 +646,24 @@ class Executor:
                 queue = self.get_queue(job_id)
                 while not queue.empty():
                     data = queue.get_nowait()
+                    self._journal_finished(data.logId)
+                    superseded.extend(self._coalesced.pop(data.logId, []))
                     self.executor_logger.warning("Discard jobId {} from queue, data: {}".format(job_id, data))
+                spill = self.spill.pop(job_id, None)
+                if spill:
+                    self.executor_logger.warning(
+                        "Discard jobId {} {} runs from spill queue.".format(job_id, spill.qsize())
+                    )
+                    while self.journal and not spill.empty():
+                        self.journal.finished(spill.get_nowait().logId)
+                    spill.clear()
 
             # 获取需要取消的任务
             task_to_cancel = self.tasks.get(job_id, None)
             if task_to_cancel:
                 task_to_cancel.cancel()
 
+        await self._callback_superseded(superseded, "Job {} is killed.".format(job_id))
         # 在锁外等待任务完成，避免死锁
         # 因为任务的finally块中也需要获取同一个锁
         if task_to_cancel:
@@ -255,33 +676,102 @@ class Executor:
     async def is_running(self, job_id: int) -> bool:
         return job_id in self.tasks
 
+    @property
+    def pool_usage(self) -> float:
+        """运行中的同步任务占线程池的比例,僵尸线程已经由reaper扩容,不计算在内"""
+        running_sync = 0
+        for t in self.tasks.values():
+            handler = self.get_handler(t.data)
+            if handler and not handler.is_async:
+                running_sync += 1
+        return running_sync / (self.autoscaler.limit if self.autoscaler else self.config.max_workers)
+
+    @property
+    def queued(self) -> int:
+        """所有排队的任务数,包括溢出到磁盘的"""
+        return sum(q.qsize() for q in self.queue.values()) + sum(s.qsize() for s in self.spill.values())
+
+    @property
+    def inflight(self) -> int:
+        return len(self.tasks) + self.queued
+
+    async def busy_reason(self, job_id: int) -> Optional[str]:
+        """执行器是否可以接收该jobId的任务,忙碌时返回原因,供xxl-admin的忙碌转移(BUSYOVER)路由使用"""
+        # 该jobId的队列只有在任务运行时才会有数据,所以运行中已经包含了排队的情况
+        if await self.is_running(job_id):
+            return "job %s is running." % job_id
+
+        config = self.config
+        if config.idle_max_pool_usage and self.pool_usage >= config.idle_max_pool_usage:
+            return "thread pool usage %.2f exceeds %s." % (self.pool_usage, config.idle_max_pool_usage)
+        if config.idle_max_running and self.inflight >= config.idle_max_running:
+            return "inflight tasks %s exceeds %s." % (self.inflight, config.idle_max_running)
+        if config.idle_max_loop_lag and self.loop_lag.lag >= config.idle_max_loop_lag:
+            return "event loop lag %.3fs exceeds %ss." % (self.loop_lag.lag, config.idle_max_loop_lag)
+        return None
+
     async def _run(self, data: RunData) -> None:
-        handler = self.handler.get(data.executorHandler)
+        handler = self.get_handler(data)
         assert handler
         g.set_xxl_run_data(data)
+        g.set_rate_limiter(handler.limiter)
+        g.set_resources(self.resources)
+        self._trace(STARTED, data)
+        lateness = self._lateness(data)
+        if lateness is not None:
+            self.lateness_callback(data.executorHandler, lateness)
+        if self.journal:
+            self.journal.started(data.logId)
 
         with new_logger(self.logger_factory, data.logId) as task_logger:
+            checkpoint = Checkpoint(
+                data.jobId,
+                self.get_checkpoint_store,
+                interval=self.config.checkpoint_interval,
+                pool=self._checkpoint_pool,
+                logger=task_logger,
+            )
+            g.set_checkpoint(checkpoint)
+            g.set_shard(
+                Shard(
+                    data.broadcastIndex or 0,
+                    data.broadcastTotal or 1,
+                    thread_pool=self.thread_pool,
+                    process_pool=self.get_process_pool,
+                    reaper=self.reaper,
+                    autoscaler=self.autoscaler,
+                    logger=task_logger,
+                )
+            )
             start_time = int(time.time() * 1000)
             try:
                 task_logger.info("Start job jobId=%s logId=%s [%s]" % (data.jobId, data.logId, data))
                 timeout = data.executorTimeout or self.config.task_timeout
-                result = await handler.start(timeout)
+                # 等待租约的时间也计入timeout
+                deadline = time.monotonic() + timeout
+                async with self._job_lease(data, timeout, task_logger), checkpoint:
+                    with self._trace_memory(data, task_logger):
+                        result = await self._start_cached(
+                            handler, data, max(deadline - time.monotonic(), 0), task_logger
+                        )
                 task_logger.info("Job finished jobId=%s logId=%s" % (data.jobId, data.logId))
-                await self.xxl_client.callback(data.logId, start_time, code=200, msg=result)
+                msg = self._callback_msg(data, task_logger, result, handler.serializer)
+                await self._callback(data, start_time, code=200, msg=msg)
                 self.successed_callback()
             except asyncio.CancelledError as e:
                 task_logger.info(e, exc_info=True)
-                await self.xxl_client.callback(data.logId, start_time, code=500, msg="CancelledError")
+                await self._callback(data, start_time, code=500, msg="CancelledError")
                 self.failed_callback("cancelled")
             except asyncio.exceptions.TimeoutError as e:
                 # 同步任务run_in_executor超时会抛出TimeoutError异常
-                # !!! 但是注意线程里面的任务仍然在运行，可能会占满所有的线程池
+                # !!! 但是注意线程里面的任务仍然在运行，由reaper追踪并扩容线程池，超过zombie_grace_period后强制中断
                 task_logger.warning(e, exc_info=True)
-                await self.xxl_client.callback(data.logId, start_time, code=500, msg="TimeoutError")
+                await self._callback(data, start_time, code=500, msg="TimeoutError")
                 self.failed_callback("timeout")
             except Exception as err:  # pylint: disable=broad-except
                 task_logger.exception(err, exc_info=True)
-                await self.xxl_client.callback(data.logId, start_time, code=500, msg=str(err))
+                msg = self._callback_msg(data, task_logger, str(err), log_full=False)
+                await self._callback(data, start_time, code=500, msg=msg)
                 self.failed_callback("exception")
             finally:
                 # 使用jobId对应的锁来保护finish操作
@@ -289,20 +779,377 @@ class Executor:
                 async with job_lock:
                     await self._finish(data.jobId)
 
-    async def _finish(self, job_id: int) -> None:
-        finish_task = self.tasks.pop(job_id, None)
-        self.executor_logger.info("Finish task {}".format(finish_task))
+    async def _start_cached(
+        self, handler: HandlerInfo, data: RunData, timeout: float, task_logger: logging.Logger
+    ) -> Any:
+        """handler开启了cache时优先使用缓存的结果"""
+        if handler.cache is None:
+            return await self._start_with_retry(handler, data, timeout, task_logger)
+
+        cache = self.result_caches.get(data.executorHandler)
+        if cache is None or cache.policy != handler.cache:
+            cache = ResultCache(data.executorHandler, handler.cache, logger=self.executor_logger)
+            self.result_caches[data.executorHandler] = cache
+        source, result = await cache.run(
+            data.executorParams or "", lambda: self._start_with_retry(handler, data, timeout, task_logger)
+        )
+        task_logger.info(
+            "Result cache %s handler=%s params=%r"
+            % ("miss" if source == MISS else "hit(%s)" % source, cache.name, data.executorParams)
+        )
+        self.cache_callback(data.executorHandler, source != MISS)
+        return result
+
+    async def _start_with_retry(
+        self, handler: HandlerInfo, data: RunData, timeout: float, task_logger: logging.Logger
+    ) -> Any:
+        """按照handler的重试策略执行,所有重试共用timeout"""
+        policy = handler.retry
+        progress = functools.partial(self._progress, data, task_logger)
+        # 限流等待的时间也计入timeout
+        deadline = time.monotonic() + timeout
+        attempt = 1
+        while True:
+            try:
+                await self._wait_rate_limit(handler, data, deadline, task_logger)
+                return await handler.start(
+                    max(deadline - time.monotonic(), 0),
+                    tracer=self.tracer,
+                    reaper=self.reaper,
+                    progress=progress,
+                    autoscaler=self.autoscaler,
+                )
+            except Exception as e:  # pylint: disable=broad-except
+                if policy is None:
+                    raise
+                delay = policy.delay(attempt)
+                if not policy.should_retry(attempt, e) or time.monotonic() + delay >= deadline:
+                    raise
+                task_logger.warning(
+                    "Attempt %s/%s failed jobId=%s logId=%s, retry after %.2fs. %r"
+                    % (attempt, policy.max_attempts, data.jobId, data.logId, delay, e),
+                    exc_info=True,
+                )
+                self.retry_callback()
+                await asyncio.sleep(delay)
+                attempt += 1
+                task_logger.info(
+                    "Start attempt %s/%s jobId=%s logId=%s" % (attempt, policy.max_attempts, data.jobId, data.logId)
+                )
 
-        # 检查队列中是否还有等待的任务
+    async def _wait_rate_limit(
+        self, handler: HandlerInfo, data: RunData, deadline: float, task_logger: logging.Logger
+    ) -> None:
+        # reject策略在接收调度时已经拿过令牌
+        if handler.limiter is None or handler.rate_policy != RATE_DELAY:
+            return
+        delay = handler.limiter.reserve()
+        if delay <= 0:
+            return
+        if time.monotonic() + delay >= deadline:
+            # 等到令牌时已经超时,不占用令牌直接超时
+            handler.limiter.release()
+            raise asyncio.TimeoutError(
+                "Rate limited %s, wait %.2fs exceeds the timeout jobId=%s logId=%s"
+                % (handler.limiter, delay, data.jobId, data.logId)
+            )
+        task_logger.info(
+            "Rate limited %s, wait %.2fs jobId=%s logId=%s" % (handler.limiter, delay, data.jobId, data.logId)
+        )
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            handler.limiter.release()
+            raise
+
+    @asynccontextmanager
+    async def _job_lease(self, data: RunData, timeout: float, task_logger: logging.Logger) -> AsyncIterator[None]:
+        """在执行器集群中持有jobId的租约,运行期间定时续约,续约失败时取消任务"""
+        if self.lease is None:
+            yield
+            return
+        key = str(data.jobId)
+        owner = "%s:%s:%s" % (socket.gethostname(), os.getpid(), data.logId)
+        ttl = self.config.job_lease_ttl
+        await asyncio.wait_for(self._acquire_lease(data, key, owner, task_logger), timeout=timeout)
+        task = asyncio.current_task()
+        assert task
+        renew_task = self.loop.create_task(self._renew_lease(key, owner, task, task_logger))
+        try:
+            yield
+        except asyncio.CancelledError:
+            if not renew_task.done() or renew_task.cancelled():
+                raise
+            # _renew_lease只在租约丢失并取消了任务后返回,按任务失败回调
+            if hasattr(task, "uncancel"):
+                task.uncancel()
+            raise error.JobLeaseLostError(
+                "Lease of jobId %s is lost, the job may run on another executor." % data.jobId
+            ) from None
+        finally:
+            renew_task.cancel()
+            try:
+                await self._lease_call(self.lease.release, key, owner)
+            except Exception as e:  # pylint: disable=broad-except
+                task_logger.warning("Release lease of jobId=%s failed, expires after %ss. %r" % (data.jobId, ttl, e))
+
+    async def _lease_call(self, func: Callable[..., Any], *args: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._lease_pool, func, *args)
+
+    async def _acquire_lease(self, data: RunData, key: str, owner: str, task_logger: logging.Logger) -> None:
+        assert self.lease
+        ttl = self.config.job_lease_ttl
+        waiting = False
+        while not await self._try_acquire_lease(key, owner, ttl):
+            if data.executorBlockStrategy == executorBlockStrategy.DISCARD_LATER.value:
+                raise error.JobDuplicateError("jobId %s is running on another executor." % data.jobId)
+            if not waiting:
+                waiting = True
+                task_logger.info("jobId=%s is running on another executor, waiting for the lease." % data.jobId)
+            await asyncio.sleep(min(ttl / 3, 1))
+        task_logger.info("Acquired lease of jobId=%s owner=%s" % (data.jobId, owner))
+
+    async def _try_acquire_lease(self, key: str, owner: str, ttl: float) -> bool:
+        assert self.lease
+        lease = self.lease
+        fut = asyncio.ensure_future(self._lease_call(lease.acquire, key, owner, ttl))
+        try:
+            return await asyncio.shield(fut)
+        except asyncio.CancelledError:
+            # 等待租约超时或取消时线程中的acquire仍然会完成,拿到的租约需要释放
+            def _release(f: asyncio.Future) -> None:
+                if not f.cancelled() and f.exception() is None and f.result():
+                    self.loop.run_in_executor(self._lease_pool, lease.release, key, owner)
+
+            fut.add_done_callback(_release)
+            raise
+
+    async def _renew_lease(self, key: str, owner: str, task: asyncio.Task, task_logger: logging.Logger) -> None:
+        assert self.lease
+        ttl = self.config.job_lease_ttl
+        while True:
+            await asyncio.sleep(ttl / 3)
+            try:
+                renewed = await self._lease_call(self.lease.renew, key, owner, ttl)
+            except Exception as e:  # pylint: disable=broad-except
+                task_logger.warning("Renew lease of jobId=%s failed. %r" % (key, e))
+                continue
+            if not renewed:
+                task_logger.error("Lease of jobId=%s is lost, cancel the job." % key)
+                task.cancel()
+                return
+
+    def _progress(self, data: RunData, task_logger: logging.Logger, index: int, item: Any) -> None:
+        """生成器任务每次yield的进度,同步的生成器在线程中调用"""
+        text = repr(item)
+        if len(text) > PROGRESS_MAX_LENGTH:
+            text = text[:PROGRESS_MAX_LENGTH] + "...(%s chars)" % len(text)
+        task_logger.info("Progress #%s jobId=%s logId=%s: %s" % (index, data.jobId, data.logId, text))
+        self.progress_callback(data.executorHandler)
+
+    def _callback_msg(
+        self,
+        data: RunData,
+        task_logger: logging.Logger,
+        result: Any,
+        serializer: Optional[Serializer] = None,
+        log_full: bool = True,
+    ) -> Optional[str]:
+        """序列化任务结果,超过callback_msg_max_bytes时截断,完整的结果写入任务日志"""
+        try:
+            msg = (serializer or serialize_result)(result)
+        except Exception as e:  # pylint: disable=broad-except
+            task_logger.warning("Serialize result failed jobId=%s logId=%s. %r" % (data.jobId, data.logId, e))
+            msg = str(result)
+        if msg is None:
+            return None
+        size = len(msg.encode())
+        self.result_size_callback(data.executorHandler, size)
+        max_bytes = self.config.callback_msg_max_bytes
+        if max_bytes <= 0 or size <= max_bytes:
+            return msg
+        if log_full:
+            task_logger.info("Full result jobId=%s logId=%s (%s bytes): %s" % (data.jobId, data.logId, size, msg))
+        return truncate_msg(msg, size, max_bytes)
+
+    async def _callback(self, data: RunData, start_time: int, code: int, msg: Optional[str]) -> None:
+        await self.xxl_client.callback(data.logId, start_time, code=code, msg=msg)
+        self._journal_finished(data.logId)
+        superseded = self._coalesced.pop(data.logId, None)
+        if superseded:
+            coalesced_msg = "Coalesced into logId {}. {}".format(data.logId, msg)
+            await self.xxl_client.callback_batch(superseded, start_time, code=code, msg=coalesced_msg)
+            self._journal_finished(*superseded)
+
+    async def _callback_superseded(self, log_ids: List[int], reason: str) -> None:
+        """被合并的调度在保留的调度被丢弃时回调为失败,否则在xxl-admin上会一直显示为运行中"""
+        if not log_ids:
+            return
+        msg = "Coalesced run is discarded. {}".format(reason)
+        try:
+            await self.xxl_client.callback_batch(log_ids, int(time.time() * 1000), code=500, msg=msg)
+        except error.XXLClientError as e:
+            # 保留在journal中,下次启动再回调
+            self.executor_logger.error("Callback superseded runs %s failed. %s", log_ids, e.message)
+            return
+        self._journal_finished(*log_ids)
+
+    def _journal_accepted(self, data: RunData) -> None:
+        if self.journal:
+            self.journal.accepted(data)
+
+    def _journal_finished(self, *log_ids: int) -> None:
+        if self.journal:
+            for log_id in log_ids:
+                self.journal.finished(log_id)
+
+    async def reconcile(self) -> None:
+        """
+        启动时处理journal中上次进程退出时未完成的任务
+
+        * 已经开始运行的任务一次性回调为失败
+        * 排队中的单机串行任务,配置了journal_restore_queued时重新执行,否则也回调为失败
+        """
+        if not self.journal:
+            return
+        restore: List[RunData] = []
+        lost: List[int] = []
+        for entry in await self.journal.recover():
+            if (
+                self.config.journal_restore_queued
+                and not entry.started
+                and entry.data.executorBlockStrategy == executorBlockStrategy.SERIAL_EXECUTION.value
+            ):
+                restore.append(entry.data)
+            else:
+                lost.append(entry.data.logId)
+
+        if lost:
+            self.executor_logger.warning("Callback %s runs lost in last executor process: %s", len(lost), lost)
+            try:
+                await self.xxl_client.callback_batch(
+                    lost, int(time.time() * 1000), code=500, msg="Executor exited unexpectedly, run is lost."
+                )
+                self._journal_finished(*lost)
+            except error.XXLClientError as e:
+                # 保留在journal中,下次启动再回调
+                self.executor_logger.error("Callback lost runs failed. %s", e.message)
+
+        for data in restore:
+            self.executor_logger.info("Restore queued run from journal. %s", data)
+            try:
+                await self.run_job(data)
+            except (
+                error.JobNotFoundError,
+                error.JobDuplicateError,
+                error.JobStaleError,
+                error.JobRateLimitedError,
+            ) as e:
+                await self._restore_failed(data, e.message)
+            except Exception as e:
+                # 单个任务恢复失败不影响后面的任务
+                self.executor_logger.exception("Restore run logId=%s failed.", data.logId)
+                await self._restore_failed(data, repr(e))
+
+    async def _restore_failed(self, data: RunData, msg: str) -> None:
+        self.executor_logger.error("Restore run logId=%s failed. %s", data.logId, msg)
+        try:
+            await self.xxl_client.callback(data.logId, int(time.time() * 1000), code=500, msg=msg)
+        except error.XXLClientError as e:
+            # 保留在journal中,下次启动再回调
+            self.executor_logger.error("Callback restore failed run logId=%s failed. %s", data.logId, e.message)
+            return
+        self._journal_finished(data.logId)
+
+    def _lateness(self, data: RunData) -> Optional[float]:
+        """当前时间距离调度时间的秒数,调度中心和执行器的时钟误差可能导致负数"""
+        if not data.logDateTime:
+            return None
+        return max(time.time() - data.logDateTime / 1000, 0)
+
+    def _stale_lateness(self, data: RunData) -> Optional[float]:
+        """调度已经过期时返回延迟的秒数,否则返回None"""
+        handler = self.get_handler(data)
+        if not handler or handler.max_lateness is None:
+            return None
+        lateness = self._lateness(data)
+        if lateness is None or lateness <= handler.max_lateness:
+            return None
+        return lateness
+
+    def _stale_message(self, data: RunData, lateness: float) -> str:
+        handler = self.get_handler(data)
+        return "Skip stale trigger jobId={} logId={}, lateness {:.3f}s exceeds max_lateness {}s.".format(
+            data.jobId, data.logId, lateness, handler.max_lateness if handler else None
+        )
+
+    def _next_queued(self, job_id: int) -> Optional[RunData]:
+        """按顺序取出下一个排队的任务,内存队列为空后取溢出队列"""
         queue = self.get_queue(job_id)
         if not queue.empty():
             data = queue.get_nowait()
+            queue.task_done()
             self.executor_logger.info(
                 "Get data from queue jobId={}, after queueSize={}, data={}".format(job_id, queue.qsize(), data)
             )
+            return data
+
+        spill = self.spill.get(job_id)
+        if spill and not spill.empty():
+            data = spill.get_nowait()
+            self.executor_logger.info(
+                "Get data from spill queue jobId={}, after spillSize={}, data={}".format(job_id, spill.qsize(), data)
+            )
+            return data
+        return None
+
+    async def _finish(self, job_id: int) -> None:
+        finish_task = self.tasks.pop(job_id, None)
+        self.executor_logger.info("Finish task {}".format(finish_task))
+        if finish_task:
+            self._trace(FINISHED, finish_task.data)
+
+        # 检查队列中是否还有等待的任务,跳过已经过期的调度
+        stale: List[RunData] = []
+        data = self._next_queued(job_id)
+        while data is not None:
+            handler = self.get_handler(data)
+            if not handler or self._stale_lateness(data) is None:
+                break
+            next_data = self._next_queued(job_id)
+            if handler.misfire_policy == MISFIRE_COALESCE:
+                if next_data is None:
+                    # 最后一个调度即使过期也要执行
+                    break
+                self._coalesced[next_data.logId] = (
+                    self._coalesced.pop(data.logId, []) + [data.logId] + self._coalesced.pop(next_data.logId, [])
+                )
+                self.executor_logger.warning(
+                    "Stale trigger jobId={} logId={} coalesced into logId {}.".format(
+                        job_id, data.logId, next_data.logId
+                    )
+                )
+            else:
+                stale.append(data)
+            data = next_data
+
+        if data is not None:
             # 启动队列中的下一个任务
             self.tasks[job_id] = self._create_task(data)
-            queue.task_done()
+        if stale:
+            # 回调需要请求xxl-admin,不在jobId的锁里面等待
+            _spawn_task(self.loop.create_task(self._skip_stale(stale)))
+
+    async def _skip_stale(self, stale: List[RunData]) -> None:
+        for data in stale:
+            g.set_xxl_run_data(data)
+            msg = self._stale_message(data, self._lateness(data) or 0)
+            self.executor_logger.warning(msg)
+            try:
+                await self._callback(data, int(time.time() * 1000), code=500, msg=msg)
+            except error.XXLClientError as e:
+                self.executor_logger.error("Callback stale trigger logId=%s failed. %s", data.logId, e.message)
+            self.failed_callback("stale")
 
     async def shutdown(self) -> None:
         """立即关闭执行器，取消所有任务"""
@@ -310,17 +1157,31 @@ class Executor:
 
         # 清空所有队列
         self.queue.clear()
+        for spill in self.spill.values():
+            spill.clear()
+        self.spill.clear()
+        # 运行中的调度合并的logId在任务回调时一起回调,其他的随排队的调度一起丢弃
+        running = {t.data.logId for t in self.tasks.values()}
+        superseded: List[int] = []
+        for log_id in [i for i in self._coalesced if i not in running]:
+            superseded.extend(self._coalesced.pop(log_id))
 
-        # 取消所有正在运行的任务
+        # 先取消所有正在运行的任务,xxl-admin回调变慢时也不影响任务的取消
         for _, task in self.tasks.items():
             task.task.cancel()
+        try:
+            await asyncio.wait_for(
+                self._callback_superseded(superseded, "Executor is shutting down."), SHUTDOWN_CALLBACK_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            self.executor_logger.error("Callback superseded runs %s timeout.", superseded)
 
     async def graceful_close(self, timeout: int = 60) -> None:
         """优雅关闭"""
         await asyncio.sleep(0.01)  # sleep for pytest
 
         async def _graceful_close() -> None:
-            while len(self.tasks) > 0 or any(i.qsize() > 0 for i in self.queue.values()):
+            while len(self.tasks) > 0 or self.queued > 0:
                 await asyncio.wait([i.task for i in self.tasks.values()])
                 await asyncio.sleep(0.05)
 
@@ -329,5 +1190,97 @@ class Executor:
     def reset_handler(self, handler: Optional[JobHandler] = None) -> None:
         self.handler = handler or JobHandler()
 
+    def get_handler(self, data: RunData) -> Optional[HandlerInfo]:
+        if data.glueType == glueType.GLUE_PYTHON.value:
+            return self._glue_handler
+        if data.glueType == glueType.GLUE_SHELL.value:
+            return self._glue_shell_handler
+        return self.handler.get(data.executorHandler)
+
+    async def _run_glue(self) -> Any:
+        """执行GLUE(Python)脚本,模块代码和同步的run函数在线程池中执行"""
+        data = g.xxl_run_data
+        if not data.glueSource:
+            raise error.JobParamsError("glueSource is empty.", jobId=data.jobId)
+        timeout = data.executorTimeout or self.config.task_timeout
+        task_logger = g.logger
+
+        if self.config.glue_process_workers > 0:
+            if self._glue_slots is None:
+                self._glue_slots = asyncio.Semaphore(self.config.glue_process_workers)
+            async with self._glue_slots:
+                result, output, hit, seconds = await run_in_subprocess(
+                    asdict(data), self.config.glue_cache_size, task_logger
+                )
+            self.glue_callback(hit, seconds)
+            for line in output.splitlines():
+                task_logger.info(line)
+            return result
+
+        code = await self.glue_codes.aget(data.jobId, data.glueUpdatetime or 0, data.glueSource)
+
+        def _print(*args: Any, sep: str = " ", **kwargs: Any) -> None:
+            task_logger.info(sep.join(str(i) for i in args))
+
+        namespace = glue_namespace(data, _print)
+
+        def glue_module() -> None:
+            exec(code, namespace)
+
+        await HandlerInfo(handler=glue_module).start(
+            timeout, tracer=self.tracer, reaper=self.reaper, autoscaler=self.autoscaler
+        )
+        run = namespace.get("run")
+        if callable(run):
+            return await HandlerInfo(handler=run).start(
+                timeout, tracer=self.tracer, reaper=self.reaper, autoscaler=self.autoscaler
+            )
+        return None
+
+    async def _run_glue_shell(self) -> str:
+        """
+        执行GLUE(Shell)脚本,和xxl-job的java执行器一致,参数为: 任务参数 分片序号 分片总数
+
+        脚本在asyncio的子进程中执行,不占用线程池
+        """
+        data = g.xxl_run_data
+        if not data.glueSource:
+            raise error.JobParamsError("glueSource is empty.", jobId=data.jobId)
+        script_dir = self.config.glue_script_dir or os.path.join(self.config.log_local_dir, "gluesource")
+        path = write_script(script_dir, data)
+        args = ["bash", path, data.executorParams or "", str(data.broadcastIndex or 0), str(data.broadcastTotal or 0)]
+        code = await run_shell_script(args, g.logger)
+        if code != 0:
+            raise error.JobScriptError("script exit code %s." % code)
+        return "script exit code 0."
+
+    def get_checkpoint_store(self) -> CheckpointStore:
+        """g.checkpoint使用的存储,第一次使用时创建"""
+        if self.checkpoint_store is None:
+            if self.config.checkpoint_store == "redis":
+                rclient = getattr(self.logger_factory, "rclient", None)
+                self.checkpoint_store = RedisCheckpointStore(
+                    self.config.executor_app_name, rclient or self.config.log_redis_uri
+                )
+            else:
+                self.checkpoint_store = SQLiteCheckpointStore(
+                    self.config.checkpoint_path or os.path.join(self.config.log_local_dir, "checkpoint.db")
+                )
+        return self.checkpoint_store
+
+    def get_process_pool(self) -> ProcessPoolExecutor:
+        """g.shard.map(process=True)使用的进程池,第一次使用时创建"""
+        if self.process_pool is None:
+            self.process_pool = ProcessPoolExecutor(
+                self.config.shard_process_workers or None, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self.process_pool
+
     def get_queue(self, job_id: int) -> asyncio.Queue[RunData]:
         return self.queue[job_id]
+
+    def get_spill(self, job_id: int) -> SpillQueue:
+        if job_id not in self.spill:
+            path = os.path.join(self.config.task_queue_spill_dir, "%s.jsonl" % job_id)
+            self.spill[job_id] = SpillQueue(path)
+        return self.spill[job_id]
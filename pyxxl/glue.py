@@ -0,0 +1,263 @@
+import asyncio
+import io
+import logging
+import os
+import pickle
+import signal
+import sys
+import time
+import traceback
+from collections import OrderedDict
+from types import CodeType
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pyxxl.schema import RunData
+
+GLUE_MODULE_NAME = "__pyxxl_glue__"
+
+
+class GlueCodeCache:
+    """
+    GLUE(Python)脚本编译后的code object缓存,key为(jobId, glueUpdatetime)
+
+    * 同一个jobId只保留最新版本的脚本,在admin上修改脚本后旧版本立即淘汰
+    * 超过maxsize后淘汰最久没有使用的脚本
+    """
+
+    def __init__(self, maxsize: int = 64, callback: Optional[Callable[[bool, Optional[float]], Any]] = None) -> None:
+        self.maxsize = maxsize
+        self.callback = callback or (lambda hit, seconds: 1)
+        self._codes: "OrderedDict[Tuple[int, int], CodeType]" = OrderedDict()
+        self._versions: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    def get(self, job_id: int, update_time: int, source: str) -> CodeType:
+        code = self._lookup(job_id, update_time)
+        if code is not None:
+            return code
+        start = time.perf_counter()
+        code = compile(source, "<glue jobId=%s version=%s>" % (job_id, update_time), "exec")
+        self._store(job_id, update_time, code, time.perf_counter() - start)
+        return code
+
+    async def aget(self, job_id: int, update_time: int, source: str) -> CodeType:
+        """和get相同,编译在线程池中执行,不阻塞loop"""
+        code = self._lookup(job_id, update_time)
+        if code is not None:
+            return code
+        start = time.perf_counter()
+        code = await asyncio.to_thread(compile, source, "<glue jobId=%s version=%s>" % (job_id, update_time), "exec")
+        self._store(job_id, update_time, code, time.perf_counter() - start)
+        return code
+
+    def _lookup(self, job_id: int, update_time: int) -> Optional[CodeType]:
+        key = (job_id, update_time)
+        code = self._codes.get(key)
+        if code is not None:
+            self._codes.move_to_end(key)
+            self.callback(True, None)
+        return code
+
+    def _store(self, job_id: int, update_time: int, code: CodeType, cost: float) -> None:
+        key = (job_id, update_time)
+        old_version = self._versions.get(job_id)
+        if old_version is not None:
+            self._codes.pop((job_id, old_version), None)
+        self._codes[key] = code
+        self._versions[job_id] = update_time
+        while len(self._codes) > self.maxsize:
+            (old_job_id, _), _ = self._codes.popitem(last=False)
+            self._versions.pop(old_job_id, None)
+        self.callback(False, cost)
+
+
+def glue_namespace(data: RunData, print_func: Callable[..., None]) -> Dict[str, Any]:
+    """
+    GLUE(Python)脚本执行时可以直接使用的变量
+
+    * params: 任务参数(executorParams)
+    * shard_index, shard_total: 分片参数
+    * print: 输出到任务日志
+    * 脚本中定义了run函数(支持async)时,执行完脚本后调用run,返回值作为任务结果
+    """
+    return {
+        "__name__": GLUE_MODULE_NAME,
+        "params": data.executorParams,
+        "shard_index": data.broadcastIndex,
+        "shard_total": data.broadcastTotal,
+        "print": print_func,
+    }
+
+
+_process_cache: Optional[GlueCodeCache] = None
+
+
+def run_in_process(data: dict, cache_size: int) -> Tuple[Any, str, bool, Optional[float]]:
+    """
+    在进程池中执行GLUE(Python)脚本,每个进程有自己的code object缓存
+
+    Returns:
+        (任务结果, print的输出, 是否命中缓存, 编译耗时)
+    """
+    global _process_cache
+    stats: Dict[str, Any] = {}
+
+    def _callback(hit: bool, seconds: Optional[float]) -> None:
+        stats.update(hit=hit, seconds=seconds)
+
+    if _process_cache is None:
+        _process_cache = GlueCodeCache(cache_size)
+    _process_cache.callback = _callback
+    run_data = RunData.from_dict(data)
+    code = _process_cache.get(run_data.jobId, run_data.glueUpdatetime or 0, run_data.glueSource or "")
+
+    output = io.StringIO()
+
+    def _print(*args: Any, sep: str = " ", **kwargs: Any) -> None:
+        output.write(sep.join(str(i) for i in args) + "\n")
+
+    namespace = glue_namespace(run_data, _print)
+    exec(code, namespace)
+    result = None
+    run = namespace.get("run")
+    if callable(run):
+        result = asyncio.run(run()) if asyncio.iscoroutinefunction(run) else run()
+    return result, output.getvalue(), stats["hit"], stats["seconds"]
+
+
+def process_main() -> None:
+    """
+    子进程的入口,从stdin读取pickle的(RunData字典, 缓存大小),执行脚本后把结果pickle写入stdout
+
+    脚本中直接写sys.stdout的内容重定向到stderr,由执行器按行写入任务日志
+    """
+    out = sys.stdout.buffer
+    sys.stdout = sys.stderr
+    data, cache_size = pickle.load(sys.stdin.buffer)
+    try:
+        value: Tuple[bool, Any] = (True, run_in_process(data, cache_size))
+    except BaseException as e:  # pylint: disable=broad-except
+        value = (False, (repr(e), traceback.format_exc()))
+    try:
+        payload = pickle.dumps(value)
+    except Exception as e:  # pylint: disable=broad-except
+        payload = pickle.dumps((False, ("result can not be pickled. %r" % e, "")))
+    out.write(payload)
+    out.flush()
+
+
+async def run_in_subprocess(
+    data: dict, cache_size: int, logger: logging.Logger
+) -> Tuple[Any, str, bool, Optional[float]]:
+    """
+    在新的子进程(进程组)中执行GLUE(Python)脚本,返回值和run_in_process一致
+
+    任务被取消(超时或者kill)时和run_shell_script一样终止整个进程组,不会一直占用进程
+    """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(p for p in sys.path if p))
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable,
+        "-c",
+        "from pyxxl.glue import process_main; process_main()",
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        start_new_session=True,
+        env=env,
+    )
+    assert proc.stdin and proc.stdout and proc.stderr
+    logger.info("Start glue process pid=%s", proc.pid)
+    try:
+        proc.stdin.write(pickle.dumps((data, cache_size)))
+        await proc.stdin.drain()
+        proc.stdin.close()
+        payload, _ = await asyncio.gather(proc.stdout.read(), _pipe_lines(proc.stderr, logger.warning))
+        code = await proc.wait()
+    except BaseException:
+        await _terminate(proc, logger)
+        raise
+    if code != 0 or not payload:
+        raise RuntimeError("glue process exit code %s." % code)
+    ok, value = pickle.loads(payload)
+    if not ok:
+        message, tb = value
+        logger.error(tb)
+        raise RuntimeError(message)
+    return value
+
+
+SHELL_KILL_TIMEOUT = 5
+
+
+def write_script(script_dir: str, data: RunData, suffix: str = ".sh") -> str:
+    """脚本按jobId和glueUpdatetime写入文件,内容没有变化时不会重复写入"""
+    path = os.path.join(script_dir, "%s_%s%s" % (data.jobId, data.glueUpdatetime or 0, suffix))
+    source = data.glueSource or ""
+    try:
+        with open(path) as f:
+            if f.read() == source:
+                return path
+    except OSError:
+        os.makedirs(script_dir, exist_ok=True)
+    # 同一个任务可能并发执行,写入各自的临时文件后原子替换
+    tmp = "%s.%s.tmp" % (path, data.logId)
+    with open(tmp, "w") as f:
+        f.write(source)
+    os.replace(tmp, path)
+    return path
+
+
+async def _pipe_lines(stream: asyncio.StreamReader, log: Callable[[str], Any]) -> None:
+    """按行输出到日志,超过StreamReader缓冲区的长行分段输出,不会缓存全部输出"""
+    while True:
+        try:
+            line = await stream.readuntil(b"\n")
+        except asyncio.IncompleteReadError as e:
+            if e.partial:
+                log(e.partial.decode(errors="replace"))
+            return
+        except asyncio.LimitOverrunError as e:
+            line = await stream.readexactly(e.consumed)
+        log(line.decode(errors="replace").rstrip("\n"))
+
+
+def _kill_group(pid: int, sig: int) -> None:
+    try:
+        os.killpg(pid, sig)
+    except ProcessLookupError:
+        pass
+
+
+async def run_shell_script(args: List[str], logger: logging.Logger) -> int:
+    """
+    在新的进程组中执行脚本,stdout和stderr按行写入任务日志,返回退出码
+
+    任务被取消(超时或者kill)时向整个进程组发送SIGTERM,超过SHELL_KILL_TIMEOUT秒未退出时发送SIGKILL
+    """
+    proc = await asyncio.create_subprocess_exec(
+        *args,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        start_new_session=True,
+    )
+    assert proc.stdout and proc.stderr
+    logger.info("Start script pid=%s %s", proc.pid, args)
+    try:
+        await asyncio.gather(_pipe_lines(proc.stdout, logger.info), _pipe_lines(proc.stderr, logger.warning))
+        return await proc.wait()
+    except BaseException:
+        await _terminate(proc, logger)
+        raise
+
+
+async def _terminate(proc: asyncio.subprocess.Process, logger: logging.Logger) -> None:
+    """向进程组发送SIGTERM,超过SHELL_KILL_TIMEOUT秒未退出时发送SIGKILL"""
+    _kill_group(proc.pid, signal.SIGTERM)
+    try:
+        await asyncio.wait_for(asyncio.shield(proc.wait()), SHELL_KILL_TIMEOUT)
+    except asyncio.TimeoutError:
+        _kill_group(proc.pid, signal.SIGKILL)
+    logger.warning("Kill script pid=%s exit code %s", proc.pid, proc.returncode)
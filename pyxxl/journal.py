@@ -0,0 +1,168 @@
+import asyncio
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from typing import IO, Any, Dict, List, NamedTuple, Optional
+
+from pyxxl.schema import RunData
+
+ACCEPTED = "A"
+STARTED = "S"
+FINISHED = "F"
+
+
+class JournalEntry(NamedTuple):
+    data: RunData
+    started: bool
+
+
+class RunJournal:
+    """
+    执行器的运行记录(write-ahead journal),每行一条json记录: 任务接收(带RunData)/开始/结束
+
+    * 记录先写入内存缓冲,每隔flush_interval由单独的线程批量写入并fsync一次(group commit),不会每个任务fsync一次
+    * 记录数超过compact_records后用未结束的任务重写文件,文件大小只和未结束的任务数相关
+    * 进程意外退出后重启时,用recover读取未结束的任务
+
+    !!! warning
+
+        进程退出前最后flush_interval时间内的记录可能丢失.
+        live中保存了所有未结束任务的RunData(压缩文件时需要重写),包括溢出到磁盘(task_queue_spill_dir)的排队任务,
+        排队的任务很多时journal的内存占用也会随之增长
+    """
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        flush_interval: float = 0.2,
+        compact_records: int = 10000,
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
+        self.path = path
+        self.flush_interval = flush_interval
+        self.compact_records = compact_records
+        self.logger = logger or logging.getLogger("pyxxl.executor")
+        self.live: Dict[int, JournalEntry] = {}
+        self._buffer: List[Dict[str, Any]] = []
+        self._records = 0
+        self._file: Optional[IO[bytes]] = None
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pyxxl_journal")
+
+    def accepted(self, data: RunData) -> None:
+        self.live[data.logId] = JournalEntry(data, False)
+        self._buffer.append({"e": ACCEPTED, "d": asdict(data)})
+
+    def started(self, log_id: int) -> None:
+        entry = self.live.get(log_id)
+        if entry:
+            self.live[log_id] = entry._replace(started=True)
+        self._buffer.append({"e": STARTED, "l": log_id})
+
+    def finished(self, log_id: int) -> None:
+        self.live.pop(log_id, None)
+        self._buffer.append({"e": FINISHED, "l": log_id})
+
+    async def recover(self) -> List[JournalEntry]:
+        """
+        读取上次进程退出时未结束的任务(按接收顺序),并用它们重写journal文件
+
+        文件的读写在journal的写入线程中执行,不阻塞事件循环,也不会和flush交错
+        """
+        loop = asyncio.get_running_loop()
+        records = await loop.run_in_executor(self._pool, self._read)
+        recovered: Dict[int, JournalEntry] = {}
+        for record in records:
+            self._replay(recovered, record)
+        # 读取期间新接收的任务排在后面
+        self.live = {**recovered, **self.live}
+        await loop.run_in_executor(self._pool, self._write, [], self._snapshot())
+        return list(recovered.values())
+
+    def _read(self) -> List[Dict[str, Any]]:
+        records: List[Dict[str, Any]] = []
+        if not os.path.exists(self.path):
+            return records
+        with open(self.path, "rb") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # 最后一行可能只写入了一半
+                    self.logger.warning("Skip broken journal record %r", line)
+        return records
+
+    def _replay(self, live: Dict[int, JournalEntry], record: Dict[str, Any]) -> None:
+        try:
+            if record["e"] == ACCEPTED:
+                data = RunData.from_dict(record["d"])
+                live[data.logId] = JournalEntry(data, False)
+            elif record["e"] == STARTED:
+                if record["l"] in live:
+                    live[record["l"]] = live[record["l"]]._replace(started=True)
+            elif record["e"] == FINISHED:
+                live.pop(record["l"], None)
+        except (KeyError, TypeError):
+            self.logger.warning("Skip broken journal record %r", record)
+
+    def _snapshot(self) -> List[Dict[str, Any]]:
+        records: List[Dict[str, Any]] = []
+        for entry in self.live.values():
+            records.append({"e": ACCEPTED, "d": asdict(entry.data)})
+            if entry.started:
+                records.append({"e": STARTED, "l": entry.data.logId})
+        return records
+
+    def _write(self, records: List[Dict[str, Any]], snapshot: Optional[List[Dict[str, Any]]] = None) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        if snapshot is not None:
+            # 快照已经包含了缓冲中记录的结果,写临时文件后原子替换
+            tmp = self.path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(b"".join(_dumps(r) for r in snapshot))
+                f.flush()
+                os.fsync(f.fileno())
+            if self._file is not None:
+                self._file.close()
+            os.replace(tmp, self.path)
+            self._file = None
+            self._records = len(snapshot)
+            return
+
+        if self._file is None:
+            self._file = open(self.path, "ab")
+        self._file.write(b"".join(_dumps(r) for r in records))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._records += len(records)
+
+    async def flush(self) -> None:
+        if not self._buffer:
+            return
+        records, self._buffer = self._buffer, []
+        snapshot = self._snapshot() if self._records + len(records) > self.compact_records else None
+        await asyncio.get_running_loop().run_in_executor(self._pool, self._write, records, snapshot)
+
+    async def run(self) -> None:
+        try:
+            while True:
+                await asyncio.sleep(self.flush_interval)
+                try:
+                    await self.flush()
+                except OSError as e:
+                    self.logger.error("Write journal %s failed. %s", self.path, e)
+        except asyncio.CancelledError:
+            pass
+
+    async def close(self) -> None:
+        await self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._pool.shutdown()
+
+
+def _dumps(record: Dict[str, Any]) -> bytes:
+    return json.dumps(record, separators=(",", ":")).encode() + b"\n"
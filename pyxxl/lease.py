@@ -0,0 +1,115 @@
+import os
+from typing import IO, TYPE_CHECKING, Dict, Tuple, Union
+
+from pyxxl.utils import try_import
+
+if TYPE_CHECKING:
+    import fcntl
+
+    import redis
+else:
+    fcntl = try_import("fcntl")
+    redis = try_import("redis")
+
+
+KEY_PREFIX = "pyxxl:lease:{app}:{key}"
+
+_RENEW_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("pexpire", KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class LeaseBackend:
+    """
+    跨执行器的任务租约,同一个key同时只能有一个owner持有
+
+    持有者需要在ttl内续约,持有者进程意外退出后租约在ttl后自动失效
+    """
+
+    def acquire(self, key: str, owner: str, ttl: float) -> bool:
+        raise NotImplementedError
+
+    def renew(self, key: str, owner: str, ttl: float) -> bool:
+        """续约,租约已经不属于owner时返回False"""
+        raise NotImplementedError
+
+    def release(self, key: str, owner: str) -> None:
+        raise NotImplementedError
+
+
+class FileLease(LeaseBackend):
+    """
+    基于flock的文件锁,适用于同一台机器上的多个执行器进程(如prefork模式)
+
+    锁随进程退出由系统释放,不依赖ttl
+    """
+
+    def __init__(self, lock_dir: str) -> None:
+        if fcntl is None:
+            raise ImportError("FileLease depends on fcntl, which is not available on this platform.")
+        self.lock_dir = lock_dir
+        self._files: Dict[str, Tuple[str, IO[str]]] = {}
+
+    def acquire(self, key: str, owner: str, ttl: float) -> bool:
+        if key in self._files:
+            return False
+        os.makedirs(self.lock_dir, exist_ok=True)
+        f = open(os.path.join(self.lock_dir, "%s.lock" % key), "a+")
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        # 写入持有者,方便排查
+        f.truncate(0)
+        f.write(owner)
+        f.flush()
+        self._files[key] = (owner, f)
+        return True
+
+    def renew(self, key: str, owner: str, ttl: float) -> bool:
+        holder = self._files.get(key)
+        return holder is not None and holder[0] == owner
+
+    def release(self, key: str, owner: str) -> None:
+        holder = self._files.get(key)
+        if holder is None or holder[0] != owner:
+            return
+        del self._files[key]
+        # 不删除锁文件,避免其他进程锁住已经被删除的文件
+        fcntl.flock(holder[1].fileno(), fcntl.LOCK_UN)
+        holder[1].close()
+
+
+class RedisLease(LeaseBackend):
+    """基于redis SET NX PX的租约,适用于多台机器上的执行器"""
+
+    def __init__(self, app: str, redis_client: Union[str, "redis.Redis"]) -> None:
+        if redis is None:
+            raise ImportError("Depend on redis. pip install redis or pip install pyxxl[redis].")  # pragma: no cover
+        self.app = app
+        self.rclient = redis.Redis.from_url(redis_client) if isinstance(redis_client, str) else redis_client
+        self._renew = self.rclient.register_script(_RENEW_SCRIPT)
+        self._release = self.rclient.register_script(_RELEASE_SCRIPT)
+
+    def key(self, key: str) -> str:
+        return KEY_PREFIX.format(app=self.app, key=key)
+
+    def acquire(self, key: str, owner: str, ttl: float) -> bool:
+        return bool(self.rclient.set(self.key(key), owner, nx=True, px=int(ttl * 1000)))
+
+    def renew(self, key: str, owner: str, ttl: float) -> bool:
+        return bool(self._renew(keys=[self.key(key)], args=[owner, int(ttl * 1000)]))
+
+    def release(self, key: str, owner: str) -> None:
+        self._release(keys=[self.key(key)], args=[owner])
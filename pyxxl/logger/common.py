@@ -15,6 +15,18 @@ TASKDATE_FORMAT = "%Y-%m-%d %H:%M:%S"
 TASK_FORMATTER = logging.Formatter(TASK_FORMAT, datefmt=TASKDATE_FORMAT)
 
 
+def new_task_logger(name: str, level: int) -> logging.Logger:
+    """
+    创建任务日志的logger,不注册到logging的全局manager中
+
+    logging.getLogger会把每个logId的logger永久保存在全局字典里,setLevel还会持有logging的全局锁清理所有logger的缓存,
+    任务越多越慢,free-threaded构建下并发执行的任务会在这把锁上竞争.任务的logger不向上传播,不需要注册
+    """
+    logger = logging.Logger(name, level)
+    logger.propagate = False
+    return logger
+
+
 class LogBase(ABC):
     executor_logger: logging.Logger
 
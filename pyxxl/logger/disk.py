@@ -11,7 +11,7 @@ import aiofiles
 from pyxxl.log import executor_logger
 from pyxxl.types import LogRequest, LogResponse
 
-from .common import TASK_FORMATTER, LogBase, PyxxlFileHandler, PyxxlStreamHandler
+from .common import TASK_FORMATTER, LogBase, PyxxlFileHandler, PyxxlStreamHandler, new_task_logger
 
 if TYPE_CHECKING:
     from logging import Handler
@@ -42,9 +42,7 @@ class DiskLog(LogBase):
         return self.log_path.joinpath(LOG_NAME_PREFIX.format(log_id=log_id)).absolute().as_posix()
 
     def get_logger(self, log_id: int, *, stdout: bool = True, level: int = logging.INFO) -> logging.Logger:
-        logger = logging.getLogger("pyxxl.task_log.disk.task-{%s}" % log_id)
-        logger.propagate = False
-        logger.setLevel(level)
+        logger = new_task_logger("pyxxl.task_log.disk.task-{%s}" % log_id, level)
         handlers: list[Handler] = [PyxxlStreamHandler()] if stdout else []
         handlers.append(PyxxlFileHandler(self.key(log_id), delay=True))
         for h in handlers:
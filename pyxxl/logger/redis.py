@@ -8,7 +8,7 @@ from pyxxl.log import executor_logger
 from pyxxl.types import LogRequest, LogResponse
 from pyxxl.utils import try_import
 
-from .common import MAX_LOG_TAIL_LINES, TASK_FORMATTER, LogBase, PyxxlStreamHandler
+from .common import MAX_LOG_TAIL_LINES, TASK_FORMATTER, LogBase, PyxxlStreamHandler, new_task_logger
 
 if TYPE_CHECKING:
     from logging import Handler
@@ -78,9 +78,7 @@ class RedisLog(LogBase):
         self.rclient = rclient
 
     def get_logger(self, log_id: int, *, stdout: bool = True, level: int = logging.INFO) -> logging.Logger:
-        logger = logging.getLogger("pyxxl.task_log.redis.task-{%s}" % log_id)
-        logger.propagate = False
-        logger.setLevel(level)
+        logger = new_task_logger("pyxxl.task_log.redis.task-{%s}" % log_id, level)
         handlers: list[Handler] = [PyxxlStreamHandler()] if stdout else []
         handlers.append(RedisHandler(self.key(log_id), self.expired_seconds, self.rclient))
         for h in handlers:
@@ -1,8 +1,10 @@
 import asyncio
 import logging
 import os
+from contextlib import AsyncExitStack
+from functools import partial
 from multiprocessing import Process
-from typing import Any, AsyncGenerator, NamedTuple, Optional
+from typing import Any, AsyncGenerator, Callable, NamedTuple, Optional
 
 from aiohttp import web
 
@@ -19,14 +21,29 @@ if try_import("prometheus_client"):
     class Executor(executor.Executor):
         def __init__(self, *args: Any, **kwargs: Any) -> None:
             super().__init__(*args, **kwargs)
-            self._successed_callback = prometheus.success
-            self._failed_callback = prometheus.failed
+            self.successed_callback = prometheus.success
+            self.failed_callback = prometheus.failed
+            self.memory_callback = prometheus.memory
+            self.lateness_callback = prometheus.lateness
+            self.retry_callback = prometheus.retry
+            self.cache_callback = prometheus.cache
+            self.glue_callback = prometheus.glue
+            self.progress_callback = prometheus.progress
+            self.result_size_callback = prometheus.result_size
+            self.pool_resize_callback = prometheus.pool_resize
+            self.zombie_killed_callback = prometheus.zombie_killed
 
 else:
 
     class Executor(executor.Executor): ...  # type: ignore[no-redef]
 
 
+def _log_task_error(logger: logging.Logger, task: asyncio.Task) -> None:
+    """后台任务异常退出时输出日志,否则异常要等到task被回收时才会打印"""
+    if not task.cancelled() and task.exception():
+        logger.error("Task %s failed.", task.get_name(), exc_info=task.exception())
+
+
 async def server_info_ctx(app: web.Application) -> AsyncGenerator:
     pid = os.getpid()
     state: State = app["pyxxl_state"]
@@ -45,11 +62,14 @@ class State(NamedTuple):
 class PyxxlRunner:
     daemon: Optional[Process] = None
     _logging_setup: bool = False
+    _worker_index: Optional[int] = None
+    """prefork模式下worker的编号,worker由supervisor统一注册"""
 
     def __init__(
         self,
         config: ExecutorConfig,
         handler: Optional[executor.JobHandler] = None,
+        loop_factory: Optional[Callable[[], asyncio.AbstractEventLoop]] = None,
     ):
         """
         !!! example
@@ -67,10 +87,12 @@ class PyxxlRunner:
         Args:
             config (ExecutorConfig): 配置参数
             handler (JobHandler, optional): 执行器支持的job,没有预先定义的job名称也会执行失败
+            loop_factory (Callable, optional): 创建事件循环的方法,优先级高于配置中的event_loop
         """
 
         self.handler = handler or executor.JobHandler(logger=config.executor_logger)
         self.config = config
+        self.loop_factory = loop_factory
         self.log_level = logging.DEBUG if self.config.debug else logging.INFO
 
     async def _register_task(self, xxl_client: XXL) -> None:
@@ -112,6 +134,24 @@ class PyxxlRunner:
 
         raise NotImplementedError
 
+    async def _stop_executor(self, executor: Executor) -> None:
+        """等待(或取消)所有任务结束"""
+        if self.config.graceful_close:
+            await executor.graceful_close(self.config.graceful_timeout)
+        else:
+            await executor.shutdown()
+            running = [t.task for t in executor.tasks.values()]
+            if running:
+                await asyncio.wait(running, timeout=5)
+        if executor.process_pool:
+            executor.process_pool.shutdown(wait=False, cancel_futures=True)
+        # 任务都结束后只剩下很快完成的租约释放和checkpoint写入,等待它们完成后再关闭checkpoint存储
+        if executor._lease_pool:
+            executor._lease_pool.shutdown(wait=True)
+        executor._checkpoint_pool.shutdown(wait=True)
+        if executor.checkpoint_store:
+            executor.checkpoint_store.close()
+
     async def _cleanup_ctx(self, app: web.Application) -> AsyncGenerator:
         task_log = self._get_log()
         xxl_client = self._get_xxl_clint()
@@ -129,10 +169,25 @@ class PyxxlRunner:
             executor_logger=self.config.executor_logger,
         )
         app["pyxxl_state"] = state
+        # 共享资源在执行器接收任务之前创建,在任务全部结束之后关闭
+        resources = AsyncExitStack()
+        executor.resources = await resources.enter_async_context(self.handler.lifespan())
         executor_log_task = asyncio.create_task(
             state.task_log.expired_loop(self.config.log_clean_interval), name="log_task"
         )
-        register_task = asyncio.create_task(self._register_task(state.xxl_client), name="register_task")
+        loop_lag_task = asyncio.create_task(state.executor.loop_lag.run(), name="loop_lag_task")
+        autoscale_task = None
+        if state.executor.autoscaler:
+            autoscale_task = asyncio.create_task(state.executor.autoscaler.run(), name="autoscale_task")
+        journal_task = reconcile_task = None
+        if state.executor.journal:
+            # xxl-admin不可用时回调会重试,不阻塞执行器启动
+            reconcile_task = asyncio.create_task(state.executor.reconcile(), name="journal_reconcile")
+            reconcile_task.add_done_callback(partial(_log_task_error, state.executor_logger))
+            journal_task = asyncio.create_task(state.executor.journal.run(), name="journal_task")
+        register_task = None
+        if self._worker_index is None:
+            register_task = asyncio.create_task(self._register_task(state.xxl_client), name="register_task")
         if state.executor.handler:
             state.executor_logger.info("register with handlers %s", list(executor.handler.handlers_info()))
         else:
@@ -140,13 +195,23 @@ class PyxxlRunner:
 
         yield
 
-        register_task.cancel()
         executor_log_task.cancel()
-        await state.xxl_client.registryRemove(self.config.executor_app_name, self.config.executor_baseurl)
-        if self.config.graceful_close:
-            await state.executor.graceful_close(self.config.graceful_timeout)
-        else:
-            await state.executor.shutdown()
+        loop_lag_task.cancel()
+        if autoscale_task:
+            autoscale_task.cancel()
+        if register_task:
+            register_task.cancel()
+            await state.xxl_client.registryRemove(self.config.executor_app_name, self.config.executor_baseurl)
+        await self._stop_executor(state.executor)
+        await resources.aclose()
+        if journal_task and state.executor.journal:
+            if reconcile_task:
+                reconcile_task.cancel()
+            journal_task.cancel()
+            await state.executor.journal.close()
+        if state.executor.tracer and self.config.trace_dump_path:
+            state.executor.tracer.dump(self.config.trace_dump_path)
+            state.executor_logger.info("dump executor trace to %s", self.config.trace_dump_path)
         await state.xxl_client.close()
         state.executor_logger.info("cleanup executor success.")
 
@@ -157,18 +222,35 @@ class PyxxlRunner:
         app.cleanup_ctx.append(server_info_ctx)
         return app
 
+    def new_event_loop(self) -> asyncio.AbstractEventLoop:
+        """run_executor使用的事件循环"""
+        if self.loop_factory:
+            return self.loop_factory()
+        if self.config.event_loop == "uvloop":
+            uvloop = try_import("uvloop")
+            if uvloop:
+                return uvloop.new_event_loop()
+            self.config.executor_logger.warning("uvloop is not installed, fallback to asyncio event loop.")
+        return asyncio.new_event_loop()
+
     def _setup_logging(self) -> None:
         if not self._logging_setup:
             setup_logging(self.config.executor_log_path, "pyxxl", level=self.log_level)
 
     def run_executor(self, handle_signals: bool = True) -> None:
-        """用aiohttp的web服务器启动执行器"""
+        """用aiohttp的web服务器启动执行器,配置workers大于1时以prefork模式启动多个进程"""
         self._setup_logging()
+        if self.config.workers > 1:
+            from pyxxl.prefork import PreforkSupervisor
+
+            PreforkSupervisor(self, self.config.workers).run(handle_signals=handle_signals)
+            return
         web.run_app(
             self.create_server_app(),
             port=self.config.executor_listen_port,
             host=self.config.executor_listen_host,
             handle_signals=handle_signals,
+            loop=self.new_event_loop(),
         )
 
     def _runner(self) -> None:
@@ -185,6 +267,10 @@ class PyxxlRunner:
     def register(self) -> Any:
         return self.handler.register
 
+    @property
+    def resource(self) -> Any:
+        return self.handler.resource
+
     # def exit_daemon(self):
     #     logger.info("Exit daemon name=%s", self.daemon.name )
     #     self.daemon.terminate()
@@ -0,0 +1,78 @@
+import logging
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Collection, Generator, Optional
+
+from pyxxl.schema import RunData
+from pyxxl.utils import get_rss
+
+
+@dataclass
+class MemoryStats:
+    peak: int = 0
+    """本次运行期间tracemalloc的峰值增量(字节)"""
+    rss_delta: int = 0
+    """本次运行前后进程RSS的变化(字节)"""
+
+
+class MemoryTracer:
+    """
+    记录每次任务运行的内存使用情况
+
+    tracemalloc是进程级别的,多个任务并发时峰值会互相叠加,此时记录的峰值是该任务运行期间的上限值.
+    只有在没有其他任务被追踪时才会重置峰值.
+    """
+
+    def __init__(
+        self,
+        *,
+        frames: int = 1,
+        snapshot_jobs: Collection[int] = (),
+        snapshot_top: int = 10,
+        callback: Optional[Callable[[str, MemoryStats], Any]] = None,
+    ) -> None:
+        self.frames = frames
+        self.snapshot_jobs = set(snapshot_jobs)
+        self.snapshot_top = snapshot_top
+        self.callback = callback or (lambda name, stats: None)
+        self._active = 0
+
+    def _take_snapshot(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(
+            (
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            )
+        )
+
+    @contextmanager
+    def trace(self, data: RunData, logger: logging.Logger) -> Generator[MemoryStats, None, None]:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        if self._active == 0:
+            tracemalloc.reset_peak()
+        self._active += 1
+
+        stats = MemoryStats()
+        start_snapshot = self._take_snapshot() if data.jobId in self.snapshot_jobs else None
+        start_traced, _ = tracemalloc.get_traced_memory()
+        start_rss = get_rss()
+        try:
+            yield stats
+        finally:
+            self._active -= 1
+            _, peak = tracemalloc.get_traced_memory()
+            stats.peak = max(peak - start_traced, 0)
+            stats.rss_delta = get_rss() - start_rss
+            logger.info(
+                "Memory jobId=%s logId=%s peak=%.1fKiB rss_delta=%.1fKiB"
+                % (data.jobId, data.logId, stats.peak / 1024, stats.rss_delta / 1024)
+            )
+            if start_snapshot is not None:
+                diff = self._take_snapshot().compare_to(start_snapshot, "lineno")
+                logger.info("Top %s memory allocation diff:\n%s" % (self.snapshot_top, self._format_diff(diff)))
+            self.callback(data.executorHandler, stats)
+
+    def _format_diff(self, diff: list) -> str:
+        return "\n".join(str(stat) for stat in diff[: self.snapshot_top])
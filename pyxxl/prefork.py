@@ -0,0 +1,237 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+from multiprocessing.process import BaseProcess
+from typing import TYPE_CHECKING, AsyncGenerator, Dict, List, Mapping, Optional
+
+import aiohttp
+from aiohttp import web
+
+from pyxxl.utils import try_import
+
+if TYPE_CHECKING:
+    from pyxxl.main import PyxxlRunner
+
+
+routes = web.RouteTableDef()
+
+WORKER_RETRY_TIMES = 10
+WORKER_RETRY_DURATION = 0.2
+LOG_ROUTE_SIZE = 10000
+"""记录最近的logId -> jobId的数量,/log按jobId转发到执行该logId的worker"""
+
+
+def _worker_main(runner: "PyxxlRunner", index: int, path: str) -> None:
+    # 脱离终端的进程组,ctrl+c只发给supervisor,由supervisor统一terminate,避免worker收到两次信号中断清理
+    os.setpgrp()
+    runner._worker_index = index
+    if runner.config.journal_dir:
+        # jobId按取模固定分配到worker,每个worker使用自己的journal
+        runner.config.journal_dir = os.path.join(runner.config.journal_dir, "worker-%s" % index)
+    runner._setup_logging()
+    web.run_app(runner.create_server_app(), path=path, print=None, handle_signals=True, loop=runner.new_event_loop())
+
+
+class PreforkSupervisor:
+    """
+    prefork模式: 一个对外的监听端口,后面挂N个执行器worker进程
+
+    * 只有supervisor向xxl-admin注册,worker之间通过unix socket通信
+    * /run /kill /idleBeat 按jobId取模转发到固定的worker,保证同一个jobId的阻塞策略在单个进程内生效
+    * /log 按/run时记录的jobId转发,找不到记录时(supervisor重启或记录被淘汰)按logId取模转发,
+      所以worker的任务日志需要使用共享的存储(同一个log_local_dir或者redis)
+    * /metrics 汇总所有worker的指标并增加worker标签
+
+    worker进程通过fork启动(直接继承runner和注册的handler),不支持fork的平台无法使用prefork模式
+    """
+
+    def __init__(self, runner: "PyxxlRunner", workers: int, socket_dir: Optional[str] = None) -> None:
+        if workers < 1:
+            raise ValueError("workers must be greater than 0.")
+        if "fork" not in multiprocessing.get_all_start_methods():
+            raise RuntimeError(
+                "prefork mode requires the 'fork' start method, which is not available on this platform."
+            )
+        self.runner = runner
+        self.config = runner.config
+        self.workers = workers
+        self.socket_dir = socket_dir or tempfile.mkdtemp(prefix="pyxxl-")
+        self.socket_paths = [os.path.join(self.socket_dir, "worker-%s.sock" % i) for i in range(workers)]
+        self.processes: Dict[int, BaseProcess] = {}
+        self.log_jobs: "OrderedDict[int, int]" = OrderedDict()
+        self.sessions: List[aiohttp.ClientSession] = []
+        self._stopping = False
+
+    @property
+    def logger(self) -> logging.Logger:
+        return self.config.executor_logger
+
+    def worker_index(self, key: int) -> int:
+        return key % self.workers
+
+    def remember_log(self, log_id: int, job_id: int) -> None:
+        self.log_jobs[log_id] = job_id
+        self.log_jobs.move_to_end(log_id)
+        while len(self.log_jobs) > LOG_ROUTE_SIZE:
+            self.log_jobs.popitem(last=False)
+
+    def log_worker_index(self, log_id: int) -> int:
+        return self.worker_index(self.log_jobs.get(log_id, log_id))
+
+    def _start_worker(self, index: int) -> None:
+        if os.path.exists(self.socket_paths[index]):
+            os.unlink(self.socket_paths[index])
+        # 不使用默认的start method(3.14开始linux默认为forkserver),spawn需要pickle runner和handler
+        p = multiprocessing.get_context("fork").Process(
+            target=_worker_main,
+            args=(self.runner, index, self.socket_paths[index]),
+            name="pyxxljob-worker-%s" % index,
+            daemon=True,
+        )
+        p.start()
+        self.processes[index] = p
+        self.logger.info("start executor worker %s pid=%s", index, p.pid)
+
+    async def _watch_workers(self) -> None:
+        """worker异常退出时重新拉起"""
+        while not self._stopping:
+            for index, p in list(self.processes.items()):
+                if not p.is_alive() and not self._stopping:
+                    self.logger.error("executor worker %s pid=%s exit with %s, restart it.", index, p.pid, p.exitcode)
+                    self._start_worker(index)
+            await asyncio.sleep(1)
+
+    def _stop_workers(self) -> None:
+        self._stopping = True
+        for p in self.processes.values():
+            p.terminate()
+        for p in self.processes.values():
+            p.join(self.config.graceful_timeout + 5 if self.config.graceful_close else 30)
+            if p.is_alive():  # pragma: no cover
+                p.kill()
+        shutil.rmtree(self.socket_dir, ignore_errors=True)
+
+    async def forward(
+        self,
+        index: int,
+        method: str,
+        path: str,
+        body: bytes = b"",
+        headers: Optional[Mapping[str, str]] = None,
+    ) -> web.Response:
+        url = "http://pyxxl-worker%s" % path
+        headers = {"Content-Type": "application/json", **(headers or {})}
+        times = 0
+        while True:
+            try:
+                async with self.sessions[index].request(method, url, data=body, headers=headers) as resp:
+                    return web.Response(body=await resp.read(), status=resp.status, content_type=resp.content_type)
+            except aiohttp.ClientConnectionError as e:
+                # worker启动或者重启中
+                times += 1
+                if times >= WORKER_RETRY_TIMES:
+                    self.logger.error("forward %s to worker %s failed. %s", path, index, e)
+                    return web.json_response(dict(code=500, msg="executor worker %s unavailable." % index))
+                await asyncio.sleep(WORKER_RETRY_DURATION)
+
+    async def fetch_all(self, path: str) -> List[str]:
+        async def _fetch(index: int) -> str:
+            resp = await self.forward(index, "GET", path)
+            return (resp.text or "") if resp.status == 200 else ""
+
+        return await asyncio.gather(*[_fetch(i) for i in range(self.workers)])
+
+    async def _sessions_ctx(self, app: web.Application) -> AsyncGenerator:
+        self.sessions = [
+            aiohttp.ClientSession(connector=aiohttp.UnixConnector(path=path)) for path in self.socket_paths
+        ]
+        yield
+        for session in self.sessions:
+            await session.close()
+
+    async def _cleanup_ctx(self, app: web.Application) -> AsyncGenerator:
+        xxl_client = self.runner._get_xxl_clint()
+        register_task = asyncio.create_task(self.runner._register_task(xxl_client), name="register_task")
+        watch_task = asyncio.create_task(self._watch_workers(), name="watch_workers")
+
+        yield
+
+        register_task.cancel()
+        watch_task.cancel()
+        await xxl_client.registryRemove(self.config.executor_app_name, self.config.executor_baseurl)
+        await xxl_client.close()
+        await asyncio.to_thread(self._stop_workers)
+        self.logger.info("cleanup prefork supervisor success.")
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app["pyxxl_supervisor"] = self
+        app.add_routes(routes)
+        if try_import("prometheus_client"):
+            app.router.add_get("/metrics", metrics)
+        app.cleanup_ctx.append(self._sessions_ctx)
+        return app
+
+    def run(self, handle_signals: bool = True) -> None:
+        for i in range(self.workers):
+            self._start_worker(i)
+        app = self.create_app()
+        app.cleanup_ctx.append(self._cleanup_ctx)
+        web.run_app(
+            app,
+            host=self.config.executor_listen_host,
+            port=self.config.executor_listen_port,
+            handle_signals=handle_signals,
+            loop=self.runner.new_event_loop(),
+        )
+
+
+def app_supervisor(request: web.Request) -> PreforkSupervisor:
+    return request.app["pyxxl_supervisor"]
+
+
+@routes.post("/beat")
+async def beat(request: web.Request) -> web.Response:
+    return web.json_response(dict(code=200, msg=None))
+
+
+@routes.post("/run")
+@routes.post("/kill")
+@routes.post("/idleBeat")
+async def by_job_id(request: web.Request) -> web.Response:
+    supervisor = app_supervisor(request)
+    body = await request.read()
+    data = await request.json()
+    if request.path == "/run":
+        supervisor.remember_log(int(data["logId"]), int(data["jobId"]))
+    return await supervisor.forward(supervisor.worker_index(int(data["jobId"])), "POST", request.path, body)
+
+
+@routes.post("/log")
+async def log(request: web.Request) -> web.Response:
+    supervisor = app_supervisor(request)
+    body = await request.read()
+    data = await request.json()
+    return await supervisor.forward(supervisor.log_worker_index(int(data["logId"])), "POST", request.path, body)
+
+
+@routes.get("/debug/{name}")
+async def debug(request: web.Request) -> web.Response:
+    """通过?worker=N指定查看的worker,默认为0"""
+    supervisor = app_supervisor(request)
+    index = int(request.query.get("worker", 0))
+    if not 0 <= index < supervisor.workers:
+        raise web.HTTPNotFound(text="worker %s not found." % index)
+    headers = {k: v for k, v in request.headers.items() if k.upper() == "XXL-JOB-ACCESS-TOKEN"}
+    return await supervisor.forward(index, "GET", request.rel_url.path_qs, headers=headers)
+
+
+async def metrics(request: web.Request) -> web.Response:
+    from pyxxl.prometheus import aggregate_metrics
+
+    texts = await app_supervisor(request).fetch_all("/metrics")
+    return web.Response(body=aggregate_metrics(texts), content_type="text/plain")
@@ -1,27 +1,65 @@
 import asyncio
+import time
 from concurrent.futures import ThreadPoolExecutor
 from dataclasses import asdict, is_dataclass
-from typing import Any
+from typing import Any, Awaitable, Callable, Iterable, List, Optional
 
 from aiohttp import web
-from prometheus_client import Counter, Gauge, Info
-from prometheus_client.exposition import _bake_output
-from prometheus_client.registry import REGISTRY
+from prometheus_client import Counter, Gauge, Histogram, Info
+from prometheus_client.exposition import _bake_output, generate_latest
+from prometheus_client.metrics_core import Metric
+from prometheus_client.parser import text_string_to_metric_families
+from prometheus_client.registry import REGISTRY, Collector, CollectorRegistry
 
 from pyxxl.ctx import g
 from pyxxl.executor import Executor
+from pyxxl.memory import MemoryStats
 
 FAILED_COUNTER = Counter("failed", "task failed number.", ["jobId", "reason"])
 SUCCESS_COUNTER = Counter("success", "task success number.", ["jobId"])
+RETRY_COUNTER = Counter("retry", "task local retry number.", ["jobId"])
+CACHE_COUNTER = Counter("result_cache", "task result cache lookup number.", ["handler", "result"])
+GLUE_CACHE_COUNTER = Counter("glue_code_cache", "glue script code cache lookup number.", ["result"])
+GLUE_COMPILE_TIME = Histogram("glue_compile_seconds", "glue script compile time.")
+ZOMBIE_KILLED_COUNTER = Counter("zombie_killed", "zombie threads injected with JobKilledError.")
+PROGRESS_COUNTER = Counter("progress_items", "items yielded by generator tasks.", ["handler"])
 
 RUNNING_TASKS = Gauge("running_tasks", "running tasks")
 QUEUE_TASKS = Gauge("queue_tasks", "queue_tasks", ["jobId"])
 ASYNCIO_TASKS_TOTAL = Gauge("asyncio_tasks_total", "ASYNCIO_TASKS_TOTAL")
+LOOP_LAG = Gauge("event_loop_lag_seconds", "event loop lag seconds.")
+THREAD_POOL_USAGE = Gauge("thread_pool_usage", "running sync tasks / max_workers.")
+ZOMBIE_THREADS = Gauge("zombie_threads", "sync task threads still running after timeout or cancel.")
+THREAD_POOL_WORKERS = Gauge("thread_pool_workers", "sync tasks allowed to run at the same time(adaptive_workers).")
+THREAD_POOL_WAIT = Gauge(
+    "thread_pool_wait_seconds", "average seconds sync tasks waited for a thread(adaptive_workers)."
+)
+THREAD_POOL_RESIZE_COUNTER = Counter("thread_pool_resize", "adaptive_workers resize decisions.", ["reason"])
 
 RUNNING_TASK_INFO = Info("running_task", "running task info", ["pk"])
 QUEUE_TASKS_INFO = Info("queue_task", "queue task info", ["pk"])
 THREAD_POOL_INFO = Info("executor_thread_pool", "executor_thread_pool")
 
+_MEMORY_BUCKETS = tuple(2**i * 1024 for i in range(0, 24, 2)) + (float("inf"),)
+TASK_MEMORY_PEAK = Histogram(
+    "task_memory_peak_bytes", "task tracemalloc peak bytes.", ["handler"], buckets=_MEMORY_BUCKETS
+)
+TASK_RSS_DELTA = Histogram("task_rss_delta_bytes", "task rss delta bytes.", ["handler"], buckets=_MEMORY_BUCKETS)
+
+RESULT_SIZE = Histogram("result_size_bytes", "task callback result size.", ["handler"], buckets=_MEMORY_BUCKETS)
+
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "executor http request latency.", ["route", "status"])
+REQUESTS_IN_PROGRESS = Gauge("http_requests_in_progress", "executor http requests in progress.", ["route"])
+RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes", "executor http response size.", ["route"], buckets=_MEMORY_BUCKETS
+)
+TASK_LATENESS = Histogram(
+    "task_lateness_seconds",
+    "seconds between trigger time(logDateTime) and task start.",
+    ["handler"],
+    buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 300, 600, 1800, 3600),
+)
+
 routes = web.RouteTableDef()
 
 
@@ -33,6 +71,48 @@ def failed(reason: str) -> None:
     FAILED_COUNTER.labels(g.xxl_run_data.jobId, reason).inc(1)
 
 
+def retry() -> None:
+    RETRY_COUNTER.labels(g.xxl_run_data.jobId).inc(1)
+
+
+def cache(handler: str, hit: bool) -> None:
+    CACHE_COUNTER.labels(handler, "hit" if hit else "miss").inc(1)
+
+
+def glue(hit: bool, seconds: Optional[float]) -> None:
+    GLUE_CACHE_COUNTER.labels("hit" if hit else "miss").inc(1)
+    if seconds is not None:
+        GLUE_COMPILE_TIME.observe(seconds)
+
+
+def zombie_killed() -> None:
+    ZOMBIE_KILLED_COUNTER.inc(1)
+
+
+def progress(handler: str) -> None:
+    PROGRESS_COUNTER.labels(handler).inc(1)
+
+
+def result_size(handler: str, size: int) -> None:
+    RESULT_SIZE.labels(handler).observe(size)
+
+
+def pool_resize(workers: int, wait: float, reason: str) -> None:
+    THREAD_POOL_WORKERS.set(workers)
+    THREAD_POOL_WAIT.set(wait)
+    if reason:
+        THREAD_POOL_RESIZE_COUNTER.labels(reason).inc(1)
+
+
+def memory(handler: str, stats: MemoryStats) -> None:
+    TASK_MEMORY_PEAK.labels(handler).observe(stats.peak)
+    TASK_RSS_DELTA.labels(handler).observe(stats.rss_delta)
+
+
+def lateness(handler: str, seconds: float) -> None:
+    TASK_LATENESS.labels(handler).observe(seconds)
+
+
 def as_str_dict(obj: Any) -> dict:
     if is_dataclass(obj):
         obj = asdict(obj)  # type: ignore[arg-type]
@@ -48,8 +128,37 @@ def _get_thread_pool_info(pool: ThreadPoolExecutor) -> dict:
     return data
 
 
+def _route_name(request: web.Request) -> str:
+    # 使用路由定义而不是请求路径,避免label数量失控
+    resource = request.match_info.route.resource
+    return resource.canonical if resource else "unknown"
+
+
+@web.middleware
+async def metrics_middleware(
+    request: web.Request, handler: Callable[[web.Request], Awaitable[web.StreamResponse]]
+) -> web.StreamResponse:
+    route = _route_name(request)
+    status = 500
+    start = time.perf_counter()
+    REQUESTS_IN_PROGRESS.labels(route).inc()
+    try:
+        response = await handler(request)
+        status = response.status
+        RESPONSE_SIZE.labels(route).observe(getattr(response, "content_length", None) or 0)
+        return response
+    except web.HTTPException as e:
+        status = e.status
+        raise
+    finally:
+        REQUESTS_IN_PROGRESS.labels(route).dec()
+        REQUEST_LATENCY.labels(route, status).observe(time.perf_counter() - start)
+
+
 @routes.get("/metrics")
 async def metrics(request: web.Request) -> web.Response:
+    # 在loop线程中收集,和executor修改tasks/queue在同一个线程;
+    # prometheus_client的指标自带锁,线程中调用的callback(如progress)在free-threaded构建下也是安全的
     # init
     RUNNING_TASK_INFO.clear()
     QUEUE_TASKS_INFO.clear()
@@ -57,6 +166,9 @@ async def metrics(request: web.Request) -> web.Response:
     # export executor info
     executor: Executor = request.app["pyxxl_state"].executor
     RUNNING_TASKS.set(len(executor.tasks))
+    LOOP_LAG.set(executor.loop_lag.lag)
+    THREAD_POOL_USAGE.set(executor.pool_usage)
+    ZOMBIE_THREADS.set(executor.reaper.count)
 
     for k, v in executor.tasks.items():
         RUNNING_TASK_INFO.labels(k).info(as_str_dict(v.data))
@@ -73,5 +185,29 @@ async def metrics(request: web.Request) -> web.Response:
     return web.Response(body=output, headers=headers)
 
 
+class _WorkerMetricsCollector(Collector):
+    def __init__(self, texts: List[str]) -> None:
+        self.texts = texts
+
+    def collect(self) -> Iterable[Metric]:
+        families: dict = {}
+        for index, text in enumerate(self.texts):
+            for family in text_string_to_metric_families(text):
+                merged = families.get(family.name)
+                if merged is None:
+                    merged = families[family.name] = Metric(family.name, family.documentation, family.type)
+                for sample in family.samples:
+                    merged.add_sample(sample.name, dict(sample.labels, worker=str(index)), sample.value)
+        return families.values()
+
+
+def aggregate_metrics(texts: List[str]) -> bytes:
+    """汇总prefork模式下每个worker的指标,增加worker标签区分"""
+    registry = CollectorRegistry(auto_describe=False)
+    registry.register(_WorkerMetricsCollector(texts))
+    return generate_latest(registry)
+
+
 def mount_app(app: web.Application) -> None:
     app.add_routes(routes)
+    app.middlewares.append(metrics_middleware)
@@ -0,0 +1,97 @@
+import asyncio
+import threading
+import time
+
+RATE_DELAY = "delay"
+"""没有令牌时等待,直到拿到令牌后再执行"""
+RATE_REJECT = "reject"
+"""没有令牌时直接拒绝调度,xxl-admin上的调度结果为失败"""
+
+
+class TokenBucket:
+    """
+    令牌桶限流,每秒生成rate个令牌,最多积累burst个
+
+    等待的调用按到达顺序预约令牌(令牌数可以为负),不会出现后来的调用插队的情况.
+    可以同时在协程(acquire)和线程(acquire_sync)中使用
+
+    !!! example
+
+        ```python
+        from pyxxl.ctx import g
+
+        @app.register(rate=10, burst=5)
+        async def call_api():
+            for item in items:
+                # 和任务的调度共用同一个令牌桶
+                await g.rate_limiter.acquire()
+                await request(item)
+        ```
+
+    """
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be greater than 0.")
+        if burst < 1:
+            raise ValueError("burst must be greater than 0.")
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return "<TokenBucket rate=%s burst=%s>" % (self.rate, self.burst)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self._tokens + (now - self._updated) * self.rate, self.burst)
+        self._updated = now
+
+    @property
+    def tokens(self) -> float:
+        """当前可用的令牌数,为负数时表示已经被等待中的调用预约"""
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+    def try_acquire(self, tokens: int = 1) -> bool:
+        """有足够的令牌时拿走并返回True,否则不拿令牌返回False"""
+        with self._lock:
+            self._refill()
+            if self._tokens < tokens:
+                return False
+            self._tokens -= tokens
+            return True
+
+    def reserve(self, tokens: int = 1) -> float:
+        """预约令牌,返回需要等待的秒数"""
+        with self._lock:
+            self._refill()
+            self._tokens -= tokens
+            return max(-self._tokens / self.rate, 0)
+
+    def release(self, tokens: int = 1) -> None:
+        """归还预约了但没有使用的令牌"""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens + tokens, self.burst)
+
+    async def acquire(self, tokens: int = 1) -> float:
+        """等待直到拿到令牌,返回等待的秒数,等待中被取消时归还令牌"""
+        delay = self.reserve(tokens)
+        if delay > 0:
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                self.release(tokens)
+                raise
+        return delay
+
+    def acquire_sync(self, tokens: int = 1) -> float:
+        """同步任务(线程中)使用的acquire"""
+        delay = self.reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+        return delay
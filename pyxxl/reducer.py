@@ -0,0 +1,25 @@
+from typing import Any, Callable, List
+
+Reducer = Callable[[Any, Any], Any]
+"""reducer(上次合并的结果, 本次yield的item) -> 合并的结果,第一次调用时上次合并的结果为None"""
+
+
+def last(acc: Any, item: Any) -> Any:
+    """使用最后一次yield的结果"""
+    return item
+
+
+def count(acc: Any, item: Any) -> int:
+    """yield的次数"""
+    return (acc or 0) + 1
+
+
+def tail(n: int) -> Reducer:
+    """最后n次yield的结果"""
+    if n < 1:
+        raise ValueError("n must be greater than 0.")
+
+    def _tail(acc: List[Any], item: Any) -> List[Any]:
+        return (acc or [])[-(n - 1) :] + [item] if n > 1 else [item]
+
+    return _tail
@@ -0,0 +1,30 @@
+import json
+from typing import Any, Callable, Optional
+
+Serializer = Callable[[Any], Optional[str]]
+"""把任务的返回值转换为回调给xxl-admin的handleMsg"""
+
+TRUNCATED_SUFFIX = "...[truncated, {size} bytes in total, see the task log for the full result]"
+
+
+def serialize_result(result: Any) -> Optional[str]:
+    """默认的序列化: None和str原样返回,bytes按utf8解码,dict/list等转为json,其他对象使用str"""
+    if result is None or isinstance(result, str):
+        return result
+    if isinstance(result, bytes):
+        return result.decode(errors="replace")
+    if isinstance(result, (dict, list, tuple, int, float, bool)):
+        try:
+            return json.dumps(result, ensure_ascii=False, default=str)
+        except (TypeError, ValueError):
+            pass
+    return str(result)
+
+
+def truncate_msg(msg: str, size: int, max_bytes: int) -> str:
+    """按utf8字节数截断msg,截断后(包含后缀)不超过max_bytes"""
+    suffix = TRUNCATED_SUFFIX.format(size=size).encode()
+    if len(suffix) >= max_bytes:
+        # max_bytes比后缀还小时连后缀一起截断
+        return suffix[: max(max_bytes, 0)].decode(errors="ignore")
+    return msg.encode()[: max_bytes - len(suffix)].decode(errors="ignore") + suffix.decode()
@@ -0,0 +1,46 @@
+import random
+from dataclasses import dataclass
+from typing import Tuple, Type
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """
+    任务失败后在同一个logId内重试,所有重试和等待的总时间不超过任务的超时时间(executorTimeout)
+
+    !!! example
+
+        ```python
+        from pyxxl import RetryPolicy
+
+        @app.register(retry=RetryPolicy(max_attempts=3, retry_on=(ConnectionError,)))
+        async def test():
+            ...
+        ```
+
+    """
+
+    max_attempts: int = 3
+    """最多执行的次数(包含第一次). Default: 3"""
+    retry_on: Tuple[Type[Exception], ...] = (Exception,)
+    """需要重试的异常类型. Default: (Exception,)"""
+    backoff: float = 1
+    """第一次重试前等待的秒数. Default: 1"""
+    backoff_factor: float = 2
+    """每次重试等待时间的倍数. Default: 2"""
+    max_backoff: float = 60
+    """最大的等待秒数. Default: 60"""
+    jitter: float = 0.1
+    """等待时间随机增加的比例,避免多个任务同时重试. Default: 0.1"""
+
+    def __post_init__(self) -> None:
+        if self.max_attempts < 1:
+            raise ValueError("max_attempts must be greater than 0.")
+
+    def should_retry(self, attempt: int, exc: BaseException) -> bool:
+        return attempt < self.max_attempts and isinstance(exc, self.retry_on)
+
+    def delay(self, attempt: int) -> float:
+        """第attempt次执行失败后等待的秒数"""
+        delay = min(self.backoff * self.backoff_factor ** (attempt - 1), self.max_backoff)
+        return delay * (1 + random.uniform(0, self.jitter))
@@ -1,9 +1,10 @@
 import logging
-from typing import TYPE_CHECKING
+import time
+from typing import TYPE_CHECKING, Awaitable, Callable
 
 from aiohttp import web
 
-from pyxxl import error
+from pyxxl import debug, error
 from pyxxl.executor import Executor
 from pyxxl.schema import RunData
 from pyxxl.utils import try_import
@@ -23,6 +24,51 @@ def app_executor(request: web.Request) -> Executor:
     return request.app["pyxxl_state"].executor
 
 
+async def _request_ids(request: web.Request) -> str:
+    if request.method != "POST" or not request.body_exists:
+        return ""
+    try:
+        data = await request.json()
+    except ValueError:
+        return ""
+    if not isinstance(data, dict):
+        return ""
+    return " ".join("%s=%s" % (k, data[k]) for k in ("jobId", "logId") if k in data)
+
+
+@web.middleware
+async def slow_request_middleware(
+    request: web.Request, handler: Callable[[web.Request], Awaitable[web.StreamResponse]]
+) -> web.StreamResponse:
+    start = time.perf_counter()
+    try:
+        return await handler(request)
+    finally:
+        duration = time.perf_counter() - start
+        threshold = app_executor(request).config.slow_request_threshold
+        if threshold and duration > threshold:
+            app_logger(request).warning(
+                "Slow request %s %s cost %.3fs. %s"
+                % (request.method, request.path, duration, await _request_ids(request))
+            )
+
+
+ADMIN_PATHS = ("/beat", "/idleBeat", "/run", "/kill", "/log")
+"""xxl-admin调用的接口,配置了access_token时需要校验XXL-JOB-ACCESS-TOKEN"""
+
+
+@web.middleware
+async def access_token_middleware(
+    request: web.Request, handler: Callable[[web.Request], Awaitable[web.StreamResponse]]
+) -> web.StreamResponse:
+    token = app_executor(request).config.access_token
+    if token and request.path in ADMIN_PATHS and request.headers.get("XXL-JOB-ACCESS-TOKEN") != token:
+        app_logger(request).warning("Reject %s %s, the access token is wrong." % (request.method, request.path))
+        # 和java执行器一致,返回code=500
+        return web.json_response(dict(code=500, msg="The access token is wrong."))
+    return await handler(request)
+
+
 @routes.post("/beat")
 async def beat(request: web.Request) -> web.Response:
     app_logger(request).debug("beat")
@@ -34,8 +80,9 @@ async def idle_beat(request: web.Request) -> web.Response:
     data = await request.json()
     job_id = data["jobId"]
     app_logger(request).debug("idleBeat: %s" % data)
-    if await app_executor(request).is_running(data["jobId"]):
-        return web.json_response(dict(code=500, msg="job %s is running." % job_id))
+    reason = await app_executor(request).busy_reason(job_id)
+    if reason:
+        return web.json_response(dict(code=500, msg=reason))
     return web.json_response(dict(code=200, msg=None))
 
 
@@ -67,6 +114,10 @@ async def run(request: web.Request) -> web.Response:
         return web.json_response(dict(code=500, msg=e.message))
     except error.JobNotFoundError as e:
         return web.json_response(dict(code=500, msg=e.message))
+    except error.JobStaleError as e:
+        return web.json_response(dict(code=500, msg=e.message))
+    except error.JobRateLimitedError as e:
+        return web.json_response(dict(code=500, msg=e.message))
 
     return web.json_response(dict(code=200, msg=msg))
 
@@ -82,7 +133,7 @@ async def kill(request: web.Request) -> web.Response:
 async def log(request: web.Request) -> web.Response:
     """
         {
-        "logDateTim":0,     // 本次调度日志时间
+        "logDateTim":0,     // 本次调度日志时间(logDateTime),xxl-admin发送的字段名就是logDateTim
         "logId":0,          // 本次调度日志ID
         "fromLineNum":0     // 日志开始行号，滚动加载日志
     }
@@ -100,8 +151,9 @@ async def log(request: web.Request) -> web.Response:
 
 
 def create_app() -> web.Application:
-    app = web.Application()
+    app = web.Application(middlewares=[slow_request_middleware, access_token_middleware])
     app.add_routes(routes)
+    debug.mount_app(app)
     if try_import("prometheus_client"):
         from pyxxl.prometheus import mount_app
 
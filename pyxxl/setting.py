@@ -2,7 +2,7 @@ import inspect
 import logging
 import os
 from dataclasses import asdict, dataclass, field
-from typing import Any, Literal, Optional, get_origin
+from typing import Any, List, Literal, Optional, get_origin
 from urllib.parse import urlparse
 
 from pyxxl.log import executor_logger, setting_logger
@@ -58,12 +58,75 @@ class ExecutorConfig:
     由于task的日志需要能展示在xxl-admin上,所以暂时无法定制.
     """
 
+    event_loop: Literal["asyncio", "uvloop"] = "asyncio"
+    """执行器使用的事件循环,uvloop需要先安装(pip install uvloop),未安装时使用asyncio. Default: asyncio"""
+    workers: int = 1
+    """执行器进程数,大于1时以prefork模式运行: 一个监听端口,请求按jobId转发给固定的worker进程. Default: 1"""
     max_workers: int = 30
-    """执行器线程池（执行同步任务时使用）. Default: 30"""
+    """执行器线程池（执行同步任务时使用）,开启adaptive_workers时为最大线程数. Default: 30"""
+    adaptive_workers: bool = False
+    """根据cgroup的CPU/内存限制和同步任务的排队时间,吞吐量自动调整线程数,max_workers为上限. Default: False"""
+    min_workers: int = 2
+    """adaptive_workers的最小线程数. Default: 2"""
+    adaptive_interval: float = 5
+    """adaptive_workers调整线程数的间隔,单位秒. Default: 5"""
+    adaptive_max_wait: float = 0.1
+    """adaptive_workers同步任务平均等待线程的秒数超过该值(并且CPU没有用满)时扩容. Default: 0.1"""
+    worker_memory: int = 64 * 1024 * 1024
+    """adaptive_workers每个线程预估的内存,线程数不超过cgroup内存限制/worker_memory,0为不限制.
+    Default: 64 * 1024 * 1024"""
+    glue_enabled: bool = False
+    """是否执行GLUE(Python)和GLUE(Shell)脚本.开启后能访问/run接口的请求都可以在执行器上执行任意代码,请同时配置access_token.
+    Default: False"""
+    glue_cache_size: int = 64
+    """GLUE(Python)脚本编译结果的缓存数量. Default: 64"""
+    glue_process_workers: int = 0
+    """大于0时每个GLUE(Python)脚本在独立的子进程中执行,最多同时运行glue_process_workers个,
+    脚本的异常(如内存泄漏,修改全局状态)不会影响执行器进程,超时或者kill时终止子进程. Default: 0"""
+    glue_script_dir: str = ""
+    """GLUE(Shell)脚本文件的存储目录. Default: "{log_local_dir}/gluesource" """
+    shard_process_workers: int = 0
+    """g.shard.map(process=True)使用的进程池的进程数,第一次使用时创建,为0时使用cpu数量. Default: 0"""
+    callback_msg_max_bytes: int = 32 * 1024
+    """回调结果(handleMsg)的最大字节数,超过后截断并把完整的结果写入任务日志,为0时不限制. Default: 32 * 1024"""
     task_timeout: int = 60 * 10
     """任务的默认超时时间,如果调度器传了以参数executorTimeout为准. Default: 60 * 10"""
     task_queue_length: int = 30
     """任务的队列长度.单机串行的队列长度,当阻塞的任务大于此值时会抛弃. Default: 30"""
+    task_queue_spill_dir: str = ""
+    """单机串行队列满后溢出写入该目录下的文件(每个jobId一个文件)而不是抛弃,为空时不开启. Default: "" """
+    job_lease: Literal["", "file", "redis"] = ""
+    """跨执行器的任务租约,同一个jobId同时只在一个执行器上运行,单机串行和丢弃后续调度对整个执行器集群生效.
+    file为文件锁(同一台机器上的多个进程,如prefork), redis使用log_redis_uri. Default: "" """
+    job_lease_dir: str = ""
+    """文件锁的存储目录. Default: "{log_local_dir}/lease" """
+    job_lease_ttl: float = 30
+    """租约的过期秒数,任务运行期间每ttl/3续约一次,执行器意外退出后其他执行器需要等待ttl. Default: 30"""
+    checkpoint_store: Literal["sqlite", "redis"] = "sqlite"
+    """g.checkpoint的存储,sqlite为本地文件(checkpoint_path), redis使用log_redis_uri. Default: sqlite"""
+    checkpoint_path: str = ""
+    """sqlite存储的文件路径. Default: "{log_local_dir}/checkpoint.db" """
+    checkpoint_interval: float = 1
+    """g.checkpoint.save写入存储的最小间隔秒数,任务结束时总会写入. Default: 1"""
+    journal_dir: str = ""
+    """
+    运行记录(journal)的目录,为空时不开启. Default: ""
+
+    开启后执行器意外退出(OOM,kill等)重启时,会把上次未完成的logId一次性回调为失败,不需要等待xxl-admin超时.
+    journal在内存中保存所有未结束任务的RunData,同时开启task_queue_spill_dir时溢出的任务仍然占用这部分内存
+    """
+    journal_flush_interval: float = 0.2
+    """journal批量写入并fsync的间隔秒数. Default: 0.2"""
+    journal_restore_queued: bool = False
+    """重启时重新执行上次还在排队的单机串行任务,而不是回调为失败. Default: False"""
+    idle_max_pool_usage: float = 1
+    """/idleBeat判断忙碌的线程池使用率(运行中的同步任务数/max_workers),达到该值时返回忙碌,0为不判断. Default: 1"""
+    idle_max_running: int = 0
+    """/idleBeat判断忙碌的任务数(运行中+队列中),达到该值时返回忙碌,0为不判断. Default: 0"""
+    idle_max_loop_lag: float = 1
+    """/idleBeat判断忙碌的事件循环延迟,单位秒,达到该值时返回忙碌,0为不判断. Default: 1"""
+    zombie_grace_period: float = 60
+    """同步任务超时或取消后,线程仍未退出时等待的秒数,超过后向线程注入JobKilledError异常,0为不注入. Default: 60"""
     graceful_close: bool = False
     """是否优雅关闭. Default: True"""
     graceful_timeout: int = 60 * 5
@@ -88,6 +151,25 @@ class ExecutorConfig:
     """xxl-admin的http请求重试间隔时间,单位秒. Default: 3"""
     http_timeout: int = 30
     """xxl-admin的http请求超时时间,单位秒. Default: 10"""
+    slow_request_threshold: float = 1
+    """执行器接口(/run,/log等)处理时间超过该值时打印warning日志,单位秒,0为不打印. Default: 1"""
+
+    memory_trace: bool = False
+    """是否记录每次任务运行的内存使用(tracemalloc峰值和RSS变化),结果写入task日志. Default: False
+
+    开启后tracemalloc会带来明显的性能损耗,建议只在排查内存问题时开启
+    """
+    memory_snapshot_jobs: str = ""
+    """需要输出内存分配差异的jobId,多个用逗号分隔(如"1,2"),需要同时开启memory_trace. Default: "" """
+    memory_snapshot_top: int = 10
+    """内存分配差异输出的条数. Default: 10"""
+
+    debug_api: bool = False
+    """是否开启/debug/*接口. 如果配置了access_token,请求时需要在header中携带XXL-JOB-ACCESS-TOKEN. Default: False"""
+    trace_buffer_size: int = 0
+    """执行器事件记录的环形缓冲区大小,0为不记录. 通过/debug/trace导出Chrome trace格式. Default: 0"""
+    trace_dump_path: str = ""
+    """执行器关闭时将事件记录导出到该文件(Chrome trace格式),需要trace_buffer_size大于0. Default: "" """
 
     dotenv_try: bool = True
     dotenv_path: Optional[str] = None
@@ -153,7 +235,17 @@ class ExecutorConfig:
         if self.log_target == "redis" and not self.log_redis_uri:
             raise ValueError("log_target 'redis' config item 'log_redis_uri' is necessary.")
 
+        if self.checkpoint_store == "redis" and not self.log_redis_uri:
+            raise ValueError("checkpoint_store 'redis' config item 'log_redis_uri' is necessary.")
+
+        if self.job_lease == "redis" and not self.log_redis_uri:
+            raise ValueError("job_lease 'redis' config item 'log_redis_uri' is necessary.")
+
     @property
     def executor_baseurl(self) -> str:
         """暴露给xxl-admin的地址"""
         return self.executor_url
+
+    @property
+    def memory_snapshot_job_ids(self) -> List[int]:
+        return [int(i) for i in self.memory_snapshot_jobs.split(",") if i.strip()]
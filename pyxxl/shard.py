@@ -0,0 +1,205 @@
+import asyncio
+import bisect
+import contextvars
+import functools
+import hashlib
+import itertools
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Executor as PoolExecutor
+from typing import TYPE_CHECKING, Any, Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
+
+from pyxxl.threads import ThreadReaper, WatchedCall
+
+if TYPE_CHECKING:
+    from pyxxl.capacity import PoolAutoscaler
+
+MODULO = "modulo"
+"""按 key % 分片总数 分配,没有指定key时按元素的位置分配"""
+CONSISTENT_HASH = "consistent_hash"
+"""一致性hash分配,分片总数变化时只有少量的key需要重新分配"""
+
+RING_VNODES = 160
+MAP_POOL_FRACTION = 0.5
+"""map没有指定concurrency时最多占用线程池(进程池)的比例,给同一执行器的其他任务留出线程"""
+
+
+def stable_hash(key: Hashable) -> int:
+    """跨进程稳定的hash(内置的hash对str是随机的,不同机器上的结果不一致)"""
+    if isinstance(key, int):
+        return key
+    return int.from_bytes(hashlib.md5(str(key).encode()).digest()[:8], "big")
+
+
+@functools.lru_cache(maxsize=32)
+def _hash_ring(total: int, vnodes: int) -> Tuple[List[int], List[int]]:
+    points = sorted((stable_hash("shard-%s-%s" % (index, i)), index) for index in range(total) for i in range(vnodes))
+    return [p for p, _ in points], [index for _, index in points]
+
+
+class Shard:
+    """
+    分片广播任务的分片工具,通过g.shard使用
+
+    !!! example
+
+        ```python
+        from pyxxl.ctx import g
+
+        @app.register(name="sync_users")
+        async def sync_users():
+            user_ids = g.shard.items(await all_user_ids(), mode="consistent_hash")
+            await g.shard.map(sync_user, user_ids, concurrency=8)
+        ```
+
+    """
+
+    def __init__(
+        self,
+        index: int = 0,
+        total: int = 1,
+        *,
+        thread_pool: Optional[PoolExecutor] = None,
+        process_pool: Optional[Callable[[], PoolExecutor]] = None,
+        reaper: Optional[ThreadReaper] = None,
+        autoscaler: Optional["PoolAutoscaler"] = None,
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
+        self.index = index
+        # 非分片广播的任务broadcastTotal可能为0
+        self.total = max(total, 1)
+        self.thread_pool = thread_pool or (reaper.pool if reaper else None)
+        self._process_pool = process_pool
+        # 和handler的同步任务一样经过reaper和autoscaler,取消后仍在运行的线程由reaper追踪
+        self.reaper = reaper
+        self.autoscaler = autoscaler
+        self.logger = logger or logging.getLogger("pyxxl.executor")
+
+    def __repr__(self) -> str:
+        return "<Shard %s/%s>" % (self.index, self.total)
+
+    def owner(self, key: Hashable, mode: str = MODULO) -> int:
+        """key所属的分片序号"""
+        if mode == MODULO:
+            return stable_hash(key) % self.total
+        if mode == CONSISTENT_HASH:
+            points, owners = _hash_ring(self.total, RING_VNODES)
+            # key都用md5计算,避免连续的int聚集在环上的同一段
+            pos = bisect.bisect(points, stable_hash(str(key))) % len(points)
+            return owners[pos]
+        raise ValueError("unknown shard mode %r." % mode)
+
+    def owns(self, key: Hashable, mode: str = MODULO) -> bool:
+        return self.owner(key, mode) == self.index
+
+    def items(
+        self, iterable: Iterable[Any], key: Optional[Callable[[Any], Hashable]] = None, mode: str = MODULO
+    ) -> Iterator[Any]:
+        """
+        返回属于当前分片的元素(惰性迭代)
+
+        Args:
+            iterable: 所有分片的全部元素,每个分片上的顺序需要一致
+            key: 计算元素分片key的函数,为空时MODULO按元素的位置分配,CONSISTENT_HASH使用元素本身
+            mode: MODULO或者CONSISTENT_HASH
+        """
+        if key is None and mode == MODULO:
+            return (item for i, item in enumerate(iterable) if i % self.total == self.index)
+        if mode not in (MODULO, CONSISTENT_HASH):
+            raise ValueError("unknown shard mode %r." % mode)
+        key_func = key or (lambda item: item)
+        return (item for item in iterable if self.owner(key_func(item), mode) == self.index)
+
+    def range(self, start: int, stop: int) -> range:
+        """整数区间[start, stop)中按MODULO属于当前分片的key"""
+        return range(start + (self.index - start) % self.total, stop, self.total)
+
+    async def map(
+        self,
+        func: Callable[[Any], Any],
+        items: Iterable[Any],
+        *,
+        concurrency: Optional[int] = None,
+        process: bool = False,
+        progress_interval: float = 10,
+    ) -> List[Any]:
+        """
+        在执行器的线程池(或者进程池)中并发执行func(item),按items的顺序返回结果
+
+        * 同时最多执行concurrency个,items是惰性读取的,可以是很大的生成器
+        * 任务被取消(超时)或出现异常时设置g.cancel_event并取消还没有开始的调用,线程中的func可以据此提前退出
+        * 某个调用出现异常时抛出该异常
+        * 每隔progress_interval秒在任务日志中输出进度
+
+        Args:
+            func: 同步函数,process为True时需要能被pickle
+            concurrency: 为空时为线程池(进程池)大小的MAP_POOL_FRACTION
+            process: 是否在进程池中执行,适合cpu密集型的函数
+        """
+        pool = self._get_pool(process)
+        limit = concurrency or self._default_concurrency(pool, process)
+        # 每次map使用独立的event,func中通过g.cancel_event读取
+        event = threading.Event()
+
+        results: Dict[int, Any] = {}
+        pending: Dict[asyncio.Future, Tuple[int, Optional[WatchedCall]]] = {}
+        source = enumerate(items)
+        start = last_log = time.monotonic()
+        try:
+            while True:
+                for i, item in itertools.islice(source, limit - len(pending)):
+                    fut, call = self._submit(pool, process, event, func, item)
+                    pending[fut] = (i, call)
+                if not pending:
+                    break
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for fut in done:
+                    results[pending.pop(fut)[0]] = fut.result()
+                if time.monotonic() - last_log >= progress_interval:
+                    last_log = time.monotonic()
+                    self.logger.info("%r map progress: %s done, %s running.", self, len(results), len(pending))
+        except BaseException:
+            event.set()
+            for fut, (_, call) in pending.items():
+                fut.cancel()
+                if call:
+                    call.reaper.abandon(call)
+            raise
+        self.logger.info("%r map finished %s items in %.2fs.", self, len(results), time.monotonic() - start)
+        return [results[i] for i in range(len(results))]
+
+    def _submit(
+        self,
+        pool: Optional[PoolExecutor],
+        process: bool,
+        event: threading.Event,
+        func: Callable[[Any], Any],
+        item: Any,
+    ) -> Tuple[asyncio.Future, Optional[WatchedCall]]:
+        from pyxxl.ctx import g
+
+        loop = asyncio.get_running_loop()
+        if process:
+            return loop.run_in_executor(pool, func, item), None
+        ctx = contextvars.copy_context()
+        ctx.run(g.set_cancel_event, event)
+        if self.reaper is None:
+            return loop.run_in_executor(pool, ctx.run, func, item), None
+        call = self.reaper.watch(functools.partial(ctx.run, func, item), g.try_get_run_data())
+        return asyncio.ensure_future(self.reaper.submit(call, self.autoscaler)), call
+
+    def _default_concurrency(self, pool: Optional[PoolExecutor], process: bool) -> int:
+        if self.autoscaler and not process:
+            workers = self.autoscaler.limit
+        else:
+            workers = getattr(pool, "_max_workers", None) or os.cpu_count() or 1
+        return max(1, int(workers * MAP_POOL_FRACTION))
+
+    def _get_pool(self, process: bool) -> Optional[PoolExecutor]:
+        if not process:
+            return self.thread_pool
+        if self._process_pool is None:
+            raise RuntimeError("process pool is not available.")
+        return self._process_pool()
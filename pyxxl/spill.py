@@ -0,0 +1,81 @@
+import json
+import os
+import shutil
+from dataclasses import asdict
+from typing import IO, Optional
+
+from pyxxl.schema import RunData
+
+COMPACT_BYTES = 4 * 1024 * 1024
+
+
+class SpillQueue:
+    """
+    单机串行队列满后的磁盘溢出队列,每个jobId一个只追加写入的文件,每行为一个json格式的RunData
+
+    * 内存中只保存读写位置和数量,排队的任务再多内存占用也不会增长
+    * 写入先进入文件缓冲,读取前才flush,不保证进程崩溃后可以恢复,重启时直接覆盖上次残留的文件
+      (开启journal_dir时溢出的调度也记录在journal中,重启时按journal_restore_queued处理)
+    * 已经读取的部分超过compact_bytes并且超过未读取的部分时压缩文件,持续溢出时文件也不会无限增长
+    * 队列取空后删除文件
+    """
+
+    def __init__(self, path: str, compact_bytes: int = COMPACT_BYTES) -> None:
+        self.path = path
+        self.compact_bytes = compact_bytes
+        self._writer: Optional[IO[bytes]] = None
+        self._reader: Optional[IO[bytes]] = None
+        self._size = 0
+
+    def qsize(self) -> int:
+        return self._size
+
+    def empty(self) -> bool:
+        return self._size == 0
+
+    def put(self, data: RunData) -> None:
+        if self._writer is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            # 上次进程退出残留的文件直接覆盖
+            self._writer = open(self.path, "wb")
+        self._writer.write(json.dumps(asdict(data), separators=(",", ":")).encode() + b"\n")
+        self._size += 1
+
+    def get_nowait(self) -> RunData:
+        if self._size == 0 or self._writer is None:
+            raise IndexError("spill queue is empty.")
+        # 缓冲中的调度写入文件后才能读到
+        self._writer.flush()
+        if self._reader is None:
+            self._reader = open(self.path, "rb")
+        data = RunData.from_dict(json.loads(self._reader.readline()))
+        self._size -= 1
+        if self._size == 0:
+            self.clear()
+        else:
+            consumed = self._reader.tell()
+            if consumed >= self.compact_bytes and consumed >= self._writer.tell() - consumed:
+                self._compact()
+        return data
+
+    def _compact(self) -> None:
+        """把未读取的部分复制到新文件,丢弃已经读取的部分"""
+        assert self._reader is not None and self._writer is not None
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            shutil.copyfileobj(self._reader, f)
+        self._reader.close()
+        self._writer.close()
+        os.replace(tmp, self.path)
+        self._writer = open(self.path, "ab")
+        self._reader = open(self.path, "rb")
+
+    def clear(self) -> None:
+        """关闭并删除溢出文件"""
+        for f in (self._reader, self._writer):
+            if f is not None:
+                f.close()
+        self._reader = self._writer = None
+        self._size = 0
+        if os.path.exists(self.path):
+            os.unlink(self.path)
@@ -0,0 +1,74 @@
+import asyncio
+import time
+
+import pytest
+import pytest_asyncio
+from aiohttp.test_utils import TestClient
+from pytest_aiohttp.plugin import AiohttpClient
+
+from pyxxl import ExecutorConfig
+from pyxxl.tests.conftest import GLOBAL_CONFIG
+from pyxxl.tests.utils import MokePyxxlRunner
+
+from .test_server import send_demoJobHandler
+
+ACCESS_TOKEN = "pytest-token"
+
+
+@pytest_asyncio.fixture
+async def debug_cli(aiohttp_client: AiohttpClient) -> TestClient:
+    config = ExecutorConfig(**GLOBAL_CONFIG, debug_api=True, trace_buffer_size=100, access_token=ACCESS_TOKEN)
+    runner = MokePyxxlRunner(config)
+
+    @runner.register(name="demoJobHandler")
+    async def test_task() -> None:
+        await asyncio.sleep(1)
+
+    @runner.register(name="demoJobHandlerSync")
+    def test_task_sync() -> None:
+        time.sleep(1)
+
+    return await aiohttp_client(runner.create_server_app())
+
+
+@pytest.mark.asyncio
+async def test_debug_disabled(cli: TestClient):
+    resp = await cli.get("/debug/trace")
+    assert resp.status == 404
+
+
+@pytest.mark.asyncio
+async def test_debug_trace(debug_cli: TestClient):
+    resp = await debug_cli.get("/debug/trace")
+    assert resp.status == 403
+
+    await send_demoJobHandler(debug_cli, headers={"XXL-JOB-ACCESS-TOKEN": ACCESS_TOKEN}, jobId=700, logId=700)
+    resp = await debug_cli.get("/debug/trace", headers={"XXL-JOB-ACCESS-TOKEN": ACCESS_TOKEN})
+    assert resp.status == 200
+    trace = await resp.json()
+    assert any(e["name"] == "accepted" and e["args"]["logId"] == 700 for e in trace["traceEvents"])
+
+
+@pytest.mark.asyncio
+async def test_debug_stacks(debug_cli: TestClient):
+    await send_demoJobHandler(debug_cli, headers={"XXL-JOB-ACCESS-TOKEN": ACCESS_TOKEN}, jobId=701, logId=7011)
+    await send_demoJobHandler(
+        debug_cli,
+        headers={"XXL-JOB-ACCESS-TOKEN": ACCESS_TOKEN},
+        jobId=702,
+        logId=7021,
+        executorHandler="demoJobHandlerSync",
+    )
+    await asyncio.sleep(0.1)
+    resp = await debug_cli.get("/debug/stacks", headers={"XXL-JOB-ACCESS-TOKEN": ACCESS_TOKEN})
+    assert resp.status == 200
+    text = await resp.text()
+    assert "--- Task 701_7011 jobId=701 logId=7011" in text
+    assert "--- Thread pyxxl_pool" in text
+    assert "test_task_sync" in text
+
+    for limit in ("abc", "-1", "0"):
+        resp = await debug_cli.get("/debug/stacks?limit=%s" % limit, headers={"XXL-JOB-ACCESS-TOKEN": ACCESS_TOKEN})
+        assert resp.status == 400
+    resp = await debug_cli.get("/debug/stacks?limit=2", headers={"XXL-JOB-ACCESS-TOKEN": ACCESS_TOKEN})
+    assert resp.status == 200
@@ -18,4 +18,7 @@ async def test_metrics(cli: TestClient):
     await asyncio.sleep(1)
     resp = await cli.get("/metrics")
     assert resp.status == 200
-    assert "python_gc_objects_collected_total" in await resp.text()
+    text = await resp.text()
+    assert "python_gc_objects_collected_total" in text
+    assert 'http_request_duration_seconds_count{route="/run",status="200"}' in text
+    assert 'http_requests_in_progress{route="/metrics"} 1.0' in text
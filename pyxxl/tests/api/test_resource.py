@@ -0,0 +1,55 @@
+import asyncio
+from typing import List
+
+import pytest
+from pytest_aiohttp.plugin import AiohttpClient
+
+from pyxxl import ExecutorConfig
+from pyxxl.ctx import g
+from pyxxl.error import JobRegisterError
+from pyxxl.executor import JobHandler
+from pyxxl.tests.conftest import GLOBAL_CONFIG
+from pyxxl.tests.utils import MokePyxxlRunner
+
+from .test_server import send_demoJobHandler
+
+
+@pytest.mark.asyncio
+async def test_resource(aiohttp_client: AiohttpClient):
+    events: List[str] = []
+    runner = MokePyxxlRunner(ExecutorConfig(**{**GLOBAL_CONFIG, "graceful_close": True}))
+
+    @runner.resource("pool")
+    async def pool():
+        events.append("pool open")
+        yield {"name": "pool"}
+        events.append("pool close")
+
+    @runner.resource
+    async def model():
+        events.append("model load")
+        return "model"
+
+    @runner.register(name="demoJobHandler")
+    async def use_resource():
+        await asyncio.sleep(0.2)
+        events.append("run with %s %s" % (g.resources["pool"]["name"], g.resources["model"]))
+
+    with pytest.raises(JobRegisterError):
+        runner.resource("pool")(pool)
+    with pytest.raises(JobRegisterError):
+        runner.resource("sync")(lambda: 1)
+
+    cli = await aiohttp_client(runner.create_server_app())
+    assert events == ["pool open", "model load"]
+    # 资源属于执行器,不会泄露到其他执行器或者任务之外
+    assert dict(g.resources) == {}
+    assert cli.server.app["pyxxl_state"].executor.resources == {"pool": {"name": "pool"}, "model": "model"}
+    other = JobHandler()
+    async with other.lifespan() as resources:
+        assert resources == {}
+    await send_demoJobHandler(cli)
+    await cli.close()
+    # 关闭时先等待任务结束,再按相反的顺序关闭资源
+    assert events == ["pool open", "model load", "run with pool model", "pool close"]
+    assert dict(g.resources) == {}
@@ -1,10 +1,17 @@
+import logging
 import time
+from typing import Dict, List, Optional
 
 import pytest
 from aiohttp.test_utils import TestClient
+from pytest_aiohttp.plugin import AiohttpClient
 
+from pyxxl import ExecutorConfig
+from pyxxl.tests.conftest import GLOBAL_CONFIG
+from pyxxl.tests.utils import MokePyxxlRunner
 
-async def send_demoJobHandler(cli: TestClient, **kwargs):
+
+async def send_demoJobHandler(cli: TestClient, headers: Optional[Dict[str, str]] = None, **kwargs):
     job_data = {
         "jobId": int(time.time() * 1000),
         "executorHandler": "demoJobHandler",
@@ -20,7 +27,7 @@ async def send_demoJobHandler(cli: TestClient, **kwargs):
         "broadcastTotal": 0,
     }
     job_data.update(kwargs)
-    resp = await cli.post("/run", json=job_data)
+    resp = await cli.post("/run", json=job_data, headers=headers)
     return resp, job_data["jobId"]
 
 
@@ -85,3 +92,41 @@ async def test_log(cli: TestClient):
         },
     )
     assert (await resp.json())["code"] == 200
+
+
+@pytest.mark.asyncio
+async def test_slow_request_log(aiohttp_client: AiohttpClient):
+    records: List[logging.LogRecord] = []
+    logger = logging.getLogger("pyxxl-pytest-slow-request")
+    logger.addHandler(logging.Handler())
+    logger.handlers[-1].emit = records.append  # type: ignore[method-assign]
+    config = ExecutorConfig(**GLOBAL_CONFIG, slow_request_threshold=0.000001, executor_logger=logger)
+    runner = MokePyxxlRunner(config)
+    slow_cli = await aiohttp_client(runner.create_server_app())
+
+    await send_demoJobHandler(slow_cli, jobId=800, logId=8001)
+    messages = [r.getMessage() for r in records if "Slow request" in r.getMessage()]
+    assert any("POST /run" in m and "jobId=800 logId=8001" in m for m in messages)
+
+
+@pytest.mark.asyncio
+async def test_access_token(aiohttp_client: AiohttpClient):
+    config = ExecutorConfig(**GLOBAL_CONFIG, access_token="pytest-token", glue_enabled=True)
+    token_cli = await aiohttp_client(MokePyxxlRunner(config).create_server_app())
+    glue = dict(glueType="GLUE_PYTHON", glueSource="raise SystemExit", jobId=900, logId=900)
+
+    for headers in (None, {"XXL-JOB-ACCESS-TOKEN": "wrong"}):
+        resp, _ = await send_demoJobHandler(token_cli, headers=headers, **glue)
+        assert await resp.json() == {"code": 500, "msg": "The access token is wrong."}
+        resp = await token_cli.post("/kill", json={"jobId": 900}, headers=headers)
+        assert (await resp.json())["code"] == 500
+    resp = await token_cli.post("/beat", headers={"XXL-JOB-ACCESS-TOKEN": "pytest-token"})
+    assert await resp.json() == {"code": 200, "msg": None}
+
+
+@pytest.mark.asyncio
+async def test_run_glue_disabled(cli: TestClient):
+    resp, _ = await send_demoJobHandler(cli, glueType="GLUE_PYTHON", glueSource="print(1)")
+    response_dict = await resp.json()
+    assert response_dict["code"] == 500
+    assert "glue_enabled" in response_dict["msg"]
@@ -0,0 +1,111 @@
+import asyncio
+import os
+import time
+from pathlib import Path
+from typing import Iterator, List
+
+import pytest
+
+from pyxxl import CachePolicy
+from pyxxl.cache import DISK, MEMORY, MISS, SHARED, ResultCache
+from pyxxl.enum import executorBlockStrategy
+from pyxxl.executor import Executor, JobHandler
+from pyxxl.schema import RunData
+
+job_handler = JobHandler()
+calls: List[str] = []
+
+
+@job_handler.register(cache=CachePolicy(ttl=60))
+async def pytest_cache_report():
+    calls.append("report")
+    await asyncio.sleep(0.2)
+    return "report ok"
+
+
+@pytest.mark.asyncio
+async def test_result_cache_lru():
+    cache = ResultCache("lru", CachePolicy(ttl=60, maxsize=2))
+    for i in range(3):
+        await cache.set(cache.key(str(i)), i)
+    assert await cache.get(cache.key("0")) == (None, None)
+    assert await cache.get(cache.key("2")) == (MEMORY, 2)
+
+    expired = ResultCache("ttl", CachePolicy(ttl=-1))
+    await expired.set(expired.key("a"), "a")
+    assert await expired.get(expired.key("a")) == (None, None)
+
+
+@pytest.mark.asyncio
+async def test_result_cache_disk(tmp_path: Path):
+    policy = CachePolicy(ttl=60, disk_dir=str(tmp_path))
+    await ResultCache("disk", policy).set(ResultCache("disk", policy).key("a"), {"rows": 1})
+    cache = ResultCache("disk", policy)
+    assert await cache.get(cache.key("a")) == (DISK, {"rows": 1})
+    assert await cache.get(cache.key("a")) == (MEMORY, {"rows": 1})
+    # 不能json序列化的结果只缓存在内存中
+    await cache.set(cache.key("b"), object())
+    assert len(list(tmp_path.iterdir())) == 1
+
+
+@pytest.mark.asyncio
+async def test_result_cache_disk_evict(tmp_path: Path):
+    policy = CachePolicy(ttl=60, maxsize=1, disk_dir=str(tmp_path), disk_maxsize=2)
+    cache = ResultCache("evict", policy)
+    for i, key in enumerate("abc"):
+        await cache.set(cache.key(key), key)
+        os.utime(cache._disk_path(cache.key(key)), (i, i))
+        if key == "b":
+            # 读取过的文件最后淘汰
+            cache._memory.clear()
+            assert await cache.get(cache.key("a")) == (DISK, "a")
+    assert len(list(tmp_path.glob("*.json"))) == 2
+    cache._memory.clear()
+    assert await cache.get(cache.key("b")) == (None, None)
+    assert await cache.get(cache.key("a")) == (DISK, "a")
+    assert await cache.get(cache.key("c")) == (DISK, "c")
+
+
+@pytest.mark.asyncio
+async def test_result_cache_single_flight():
+    cache = ResultCache("flight", CachePolicy())
+    runs: List[int] = []
+
+    async def func() -> int:
+        runs.append(1)
+        await asyncio.sleep(0.1)
+        if len(runs) == 1:
+            raise ValueError("first run failed")
+        return len(runs)
+
+    results = await asyncio.gather(*[cache.run("p", func) for _ in range(3)], return_exceptions=True)
+    # 第一次执行失败,等待的任务重新执行一次,其余复用它的结果
+    assert isinstance(results[0], ValueError)
+    assert sorted(results[1:]) == [(MISS, 2), (SHARED, 2)]
+    assert await cache.run("p", func) == (MEMORY, 2)
+    assert len(runs) == 2
+
+
+@pytest.mark.asyncio
+async def test_runner_cache(executor: Executor, log_id_iter: Iterator[int]):
+    calls.clear()
+    executor.xxl_client.clear_result()
+    executor.reset_handler(job_handler)
+    hits: List[bool] = []
+    executor.cache_callback = lambda name, hit: hits.append(hit)
+    log_ids = [next(log_id_iter) for _ in range(4)]
+    for i, log_id in enumerate(log_ids):
+        await executor.run_job(
+            RunData(
+                jobId=int(time.time() * 1000) + i,
+                logId=log_id,
+                executorHandler="pytest_cache_report",
+                executorBlockStrategy=executorBlockStrategy.SERIAL_EXECUTION.value,
+                executorParams="2024-01-01" if i < 3 else "2024-01-02",
+            )
+        )
+    await executor.graceful_close(5)
+    executor.cache_callback = lambda name, hit: 1
+    assert all(executor.xxl_client.callback_result.get(log_id) == 200 for log_id in log_ids)
+    assert calls == ["report", "report"]
+    assert sorted(hits) == [False, False, True, True]
@@ -0,0 +1,213 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from pyxxl import ExecutorConfig, capacity
+from pyxxl.capacity import (
+    IDLE_INTERVALS,
+    LoopLagMonitor,
+    PoolAutoscaler,
+    available_cpus,
+    cgroup_cpu_limit,
+    cgroup_memory_limit,
+)
+from pyxxl.enum import executorBlockStrategy
+from pyxxl.executor import Executor, HandlerInfo, JobHandler
+from pyxxl.schema import RunData
+from pyxxl.tests.conftest import GLOBAL_CONFIG
+from pyxxl.tests.utils import MokeXXL
+from pyxxl.threads import ThreadReaper
+
+job_handler = JobHandler()
+
+
+@job_handler.register
+def pytest_capacity_sync():
+    time.sleep(0.5)
+
+
+@pytest.mark.asyncio
+async def test_loop_lag():
+    monitor = LoopLagMonitor(interval=0.05)
+    task = asyncio.create_task(monitor.run())
+    await asyncio.sleep(0.01)
+    time.sleep(0.3)  # 阻塞事件循环
+    await asyncio.sleep(0.01)
+    assert monitor.lag > 0.2
+    task.cancel()
+    await task
+
+
+@pytest.mark.asyncio
+async def test_busy_reason(log_id_iter):
+    config = ExecutorConfig(**{**GLOBAL_CONFIG, "max_workers": 2}, idle_max_running=3)
+    executor = Executor(MokeXXL(config.xxl_admin_baseurl), config, handler=job_handler)
+
+    def _data(job_id: int) -> RunData:
+        return RunData(
+            jobId=job_id,
+            logId=next(log_id_iter),
+            executorHandler="pytest_capacity_sync",
+            executorBlockStrategy=executorBlockStrategy.SERIAL_EXECUTION.value,
+        )
+
+    assert await executor.busy_reason(1) is None
+    await executor.run_job(_data(1))
+    assert await executor.busy_reason(1) == "job 1 is running."
+    assert executor.pool_usage == 0.5
+    assert await executor.busy_reason(2) is None
+
+    await executor.run_job(_data(2))
+    assert "thread pool usage 1.00" in await executor.busy_reason(3)
+
+    executor.config.idle_max_pool_usage = 0
+    await executor.run_job(_data(2))
+    assert executor.inflight == 3
+    assert "inflight tasks 3 exceeds 3" in await executor.busy_reason(3)
+
+    executor.config.idle_max_running = 0
+    assert await executor.busy_reason(3) is None
+    executor.loop_lag.lag = 2
+    assert "event loop lag" in await executor.busy_reason(3)
+    await executor.graceful_close()
+
+
+def test_cgroup_limit(tmp_path: Path):
+    assert cgroup_cpu_limit(str(tmp_path)) is None
+    assert cgroup_memory_limit(str(tmp_path)) is None
+
+    (tmp_path / "cpu.max").write_text("max 100000\n")
+    (tmp_path / "memory.max").write_text("max\n")
+    assert cgroup_cpu_limit(str(tmp_path)) is None
+    assert cgroup_memory_limit(str(tmp_path)) is None
+
+    (tmp_path / "cpu.max").write_text("150000 100000\n")
+    (tmp_path / "memory.max").write_text("536870912\n")
+    assert cgroup_cpu_limit(str(tmp_path)) == 1.5
+    assert cgroup_memory_limit(str(tmp_path)) == 512 * 1024 * 1024
+    assert available_cpus(str(tmp_path)) <= 1.5
+
+    # cgroup v1
+    v1 = tmp_path / "v1"
+    (v1 / "cpu").mkdir(parents=True)
+    (v1 / "memory").mkdir()
+    (v1 / "cpu" / "cpu.cfs_quota_us").write_text("-1\n")
+    (v1 / "cpu" / "cpu.cfs_period_us").write_text("100000\n")
+    (v1 / "memory" / "memory.limit_in_bytes").write_text("9223372036854771712\n")
+    assert cgroup_cpu_limit(str(v1)) is None
+    assert cgroup_memory_limit(str(v1)) is None
+    (v1 / "cpu" / "cpu.cfs_quota_us").write_text("200000\n")
+    (v1 / "memory" / "memory.limit_in_bytes").write_text("1073741824\n")
+    assert cgroup_cpu_limit(str(v1)) == 2
+    assert cgroup_memory_limit(str(v1)) == 1024 * 1024 * 1024
+
+
+def _autoscaler(tmp_path: Path, pool: ThreadPoolExecutor, cpus: int = 1, **kwargs) -> PoolAutoscaler:
+    (tmp_path / "cpu.max").write_text("%s 100000\n" % (cpus * 100000))
+    reaper = ThreadReaper(pool, asyncio.get_running_loop())
+    return PoolAutoscaler(reaper, cgroup_root=str(tmp_path), **{"min_workers": 1, "max_workers": 30, **kwargs})
+
+
+@pytest.mark.asyncio
+async def test_autoscaler_init(tmp_path: Path):
+    with ThreadPoolExecutor(max_workers=30) as pool:
+        scaler = _autoscaler(tmp_path, pool)
+        assert scaler.cpus == 1
+        # 和ThreadPoolExecutor默认的cpu+4一致
+        assert scaler.limit == 5
+        assert pool._max_workers == 5
+
+        (tmp_path / "memory.max").write_text(str(128 * 1024 * 1024))
+        scaler = _autoscaler(tmp_path, pool, worker_memory=64 * 1024 * 1024)
+        assert scaler.max_workers == 2
+        assert scaler.limit == 2
+        assert pool._max_workers == 2
+
+
+@pytest.mark.asyncio
+async def test_autoscaler_adjust(tmp_path: Path):
+    decisions = []
+    with ThreadPoolExecutor(max_workers=30) as pool:
+        scaler = _autoscaler(tmp_path, pool, callback=lambda *args: decisions.append(args))
+        # 排队时间长,CPU空闲: 扩容
+        scaler._waits = [0.5, 0.5]
+        scaler.adjust(1, 0.1)
+        assert scaler.limit == 6
+        assert pool._max_workers == 6
+        assert decisions[-1] == (6, 0.5, "queue_wait")
+
+        # 继续扩容后CPU用满,吞吐量没有提升: 撤销上次扩容
+        scaler._waits, scaler._completed = [0.5], 10
+        scaler.adjust(1, 0.5)
+        assert scaler.limit == 7
+        scaler._waits, scaler._completed = [0.5], 10
+        scaler.adjust(1, 1)
+        assert scaler.limit == 6
+        assert decisions[-1] == (6, 0.5, "cpu_bound")
+        # CPU用满时不再扩容
+        scaler._waits = [0.5]
+        scaler.adjust(1, 1)
+        assert decisions[-1] == (6, 0.5, "")
+
+        # 连续空闲后缩容,不低于min_workers
+        for _ in range(IDLE_INTERVALS):
+            scaler.adjust(1, 0)
+        assert scaler.limit == 5
+        assert pool._max_workers == 5
+        assert decisions[-1] == (5, 0, "idle")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("gil", [True, False])
+async def test_autoscaler_adjust_cpus(tmp_path: Path, monkeypatch: pytest.MonkeyPatch, gil: bool):
+    monkeypatch.setattr(capacity, "gil_enabled", lambda: gil)
+    monkeypatch.setattr(capacity.os, "sched_getaffinity", lambda pid: set(range(8)), raising=False)
+    with ThreadPoolExecutor(max_workers=30) as pool:
+        scaler = _autoscaler(tmp_path, pool, cpus=4)
+        assert scaler.cpus == 4 and scaler.limit == 8
+        # 1秒内用了1个核: 启用GIL时python线程已经用满CPU,free-threaded时只用了1/4
+        scaler._waits = [0.5]
+        scaler.adjust(1, 1)
+        assert scaler.limit == (8 if gil else 10)
+        scaler._waits = [0.5]
+        scaler.adjust(1, 3.8)
+        assert scaler.limit == (8 if gil else 10)
+
+
+@pytest.mark.asyncio
+async def test_autoscaler_slot(tmp_path: Path):
+    def _sleep():
+        time.sleep(0.2)
+
+    with ThreadPoolExecutor(max_workers=30) as pool:
+        scaler = _autoscaler(tmp_path, pool, max_workers=1)
+        assert scaler.limit == 1
+        handler = HandlerInfo(handler=_sleep)
+        tasks = [asyncio.create_task(handler.start(5, reaper=scaler.reaper, autoscaler=scaler)) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        assert scaler.running == 1
+        assert scaler.waiting == 2
+        await asyncio.gather(*tasks)
+        assert scaler.running == 0
+        assert scaler._completed == 3
+        assert max(scaler._waits) >= 0.3
+
+        # 等待slot时超时不占用slot
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.gather(*[handler.start(0.1, reaper=scaler.reaper, autoscaler=scaler) for _ in range(2)])
+        await asyncio.sleep(0.3)
+        assert scaler.running == 0
+        assert scaler.waiting == 0
+
+
+@pytest.mark.asyncio
+async def test_adaptive_executor():
+    config = ExecutorConfig(**GLOBAL_CONFIG, adaptive_workers=True, max_workers=4)
+    executor = Executor(MokeXXL(config.xxl_admin_baseurl), config, handler=job_handler)
+    assert executor.autoscaler is not None
+    assert executor.autoscaler.limit <= 4
+    assert executor.thread_pool._max_workers == executor.autoscaler.limit
+    await executor.shutdown()
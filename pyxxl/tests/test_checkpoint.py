@@ -0,0 +1,175 @@
+import asyncio
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Iterator, List
+
+import pytest
+
+from pyxxl import ExecutorConfig
+from pyxxl.checkpoint import Checkpoint, SQLiteCheckpointStore
+from pyxxl.ctx import g
+from pyxxl.enum import executorBlockStrategy
+from pyxxl.executor import Executor, JobHandler
+from pyxxl.schema import RunData
+from pyxxl.tests.conftest import GLOBAL_CONFIG
+from pyxxl.tests.utils import MokePyxxlRunner, MokeXXL
+
+job_handler = JobHandler()
+outputs: List[Any] = []
+
+
+@job_handler.register
+async def pytest_checkpoint():
+    start = await g.checkpoint.aload(default=0)
+    outputs.append(start)
+    for i in range(start, 10):
+        g.checkpoint.save(i)
+        await asyncio.sleep(0.1)
+    return "done"
+
+
+def test_sqlite_store(tmp_path: Path):
+    store = SQLiteCheckpointStore(str(tmp_path / "a" / "checkpoint.db"))
+    assert store.load(1) is None
+    store.save(1, '{"a":1}')
+    store.save(1, '{"a":2}')
+    # 其他进程打开同一个文件
+    assert SQLiteCheckpointStore(store.path).load(1) == '{"a":2}'
+    store.delete(1)
+    assert store.load(1) is None
+    store.close()
+
+
+def test_checkpoint(tmp_path: Path):
+    store = SQLiteCheckpointStore(str(tmp_path / "checkpoint.db"))
+    with Checkpoint(1, lambda: store, interval=60) as checkpoint:
+        assert checkpoint.load(default={"offset": 0}) == {"offset": 0}
+        checkpoint.save({"offset": 1})
+        checkpoint.save({"offset": 2})
+        # 间隔内只写入第一次
+        assert store.load(1) == '{"offset":1}'
+    # 正常结束时删除进度
+    assert store.load(1) is None
+
+    checkpoint = Checkpoint(1, lambda: store, interval=60)
+    with pytest.raises(asyncio.CancelledError):
+        with checkpoint:
+            checkpoint.save({"offset": 1})
+            checkpoint.save({"offset": 2})
+            raise asyncio.CancelledError
+    # 取消时写入最后一次的进度,之后的保存被忽略
+    assert store.load(1) == '{"offset":2}'
+    checkpoint.save({"offset": 3})
+    assert store.load(1) == '{"offset":2}'
+    assert Checkpoint(1, lambda: store).load() == {"offset": 2}
+
+    checkpoint = Checkpoint(1, lambda: store)
+    checkpoint.clear_on_success = False
+    with checkpoint:
+        checkpoint.save({"offset": 4})
+    assert store.load(1) == '{"offset":4}'
+
+
+@pytest.mark.asyncio
+async def test_checkpoint_pool(tmp_path: Path):
+    store = SQLiteCheckpointStore(str(tmp_path / "checkpoint.db"))
+    threads: List[str] = []
+    save = store.save
+
+    def record_save(job_id: int, value: str) -> None:
+        threads.append(threading.current_thread().name)
+        save(job_id, value)
+
+    store.save = record_save  # type: ignore[method-assign]
+    with ThreadPoolExecutor(1, thread_name_prefix="pytest_checkpoint") as pool:
+        checkpoint = Checkpoint(1, lambda: store, interval=0, pool=pool)
+        assert await checkpoint.aload(default=0) == 0
+        value = {"offset": 1}
+        checkpoint.save(value)
+        # 保存时已经序列化,之后修改value不影响写入的值
+        value["offset"] = 2
+        await checkpoint.aflush()
+        assert store.load(1) == '{"offset":1}'
+        assert threads == ["pytest_checkpoint_0"]
+
+        with pytest.raises(asyncio.CancelledError):
+            async with checkpoint:
+                checkpoint.save({"offset": 3})
+                raise asyncio.CancelledError
+        # 退出时等待最后的进度写入完成
+        assert store.load(1) == '{"offset":3}'
+        assert await Checkpoint(1, lambda: store, pool=pool).aload() == {"offset": 3}
+
+        async with Checkpoint(1, lambda: store, pool=pool) as checkpoint:
+            checkpoint.save({"offset": 4})
+        assert store.load(1) is None
+    store.close()
+
+
+@pytest.mark.asyncio
+async def test_runner_checkpoint(
+    executor: Executor, job_id: int, log_id_iter: Iterator[int], tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(executor.config, "checkpoint_path", str(tmp_path / "checkpoint.db"))
+    monkeypatch.setattr(executor, "checkpoint_store", None)
+    executor.reset_handler(job_handler)
+    executor.xxl_client.clear_result()
+    outputs.clear()
+
+    def run_data(timeout: int = 0) -> RunData:
+        return RunData(
+            jobId=job_id,
+            logId=next(log_id_iter),
+            executorHandler="pytest_checkpoint",
+            executorBlockStrategy=executorBlockStrategy.SERIAL_EXECUTION.value,
+            executorTimeout=timeout,
+        )
+
+    first, second, third = run_data(), run_data(), run_data()
+    await executor.run_job(first)
+    await asyncio.sleep(0.45)
+    await executor.cancel_job(job_id)
+    await executor.run_job(second)
+    await executor.graceful_close()
+    await executor.run_job(third)
+    await executor.graceful_close()
+    assert executor.checkpoint_store
+    executor.checkpoint_store.close()
+
+    assert executor.xxl_client.callback_result[first.logId] == 500
+    assert executor.xxl_client.callback_result[second.logId] == 200
+    # 被kill后从保存的进度继续,成功后下次从头开始
+    assert outputs[0] == 0 and 3 <= outputs[1] <= 5 and outputs[2] == 0
+
+
+@pytest.mark.asyncio
+async def test_stop_executor_pools(tmp_path: Path, log_id_iter: Iterator[int]):
+    config = ExecutorConfig(
+        **GLOBAL_CONFIG,
+        checkpoint_path=str(tmp_path / "checkpoint.db"),
+        job_lease="file",
+        job_lease_dir=str(tmp_path / "lease"),
+    )
+    runner = MokePyxxlRunner(config)
+    xxl_client = MokeXXL(config.xxl_admin_baseurl)
+    executor = Executor(xxl_client, config, handler=job_handler)
+    await executor.run_job(
+        RunData(
+            jobId=1,
+            logId=next(log_id_iter),
+            executorHandler="pytest_checkpoint",
+            executorBlockStrategy=executorBlockStrategy.SERIAL_EXECUTION.value,
+        )
+    )
+    await asyncio.sleep(0.2)
+    await runner._stop_executor(executor)
+    await xxl_client.close()
+    # 最后的租约释放和checkpoint写入完成后才关闭线程池和存储
+    assert executor._lease_pool and executor._lease_pool._shutdown
+    assert executor._checkpoint_pool._shutdown
+    assert isinstance(executor.checkpoint_store, SQLiteCheckpointStore)
+    with pytest.raises(sqlite3.ProgrammingError):
+        executor.checkpoint_store.load(1)
+    assert executor.lease and executor.lease.acquire("1", "other", 10)
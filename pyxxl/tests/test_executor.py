@@ -4,9 +4,12 @@ from typing import Iterator
 
 import pytest
 
+import pyxxl.executor
+from pyxxl.ctx import g
 from pyxxl.enum import executorBlockStrategy
-from pyxxl.error import JobDuplicateError, JobNotFoundError, JobParamsError
-from pyxxl.executor import Executor, JobHandler
+from pyxxl.error import JobDuplicateError, JobNotFoundError, JobParamsError, JobRegisterError, JobStaleError
+from pyxxl.executor import Executor, HandlerInfo, JobHandler
+from pyxxl.reducer import count, tail
 from pyxxl.schema import RunData
 
 job_handler = JobHandler()
@@ -25,11 +28,40 @@ def pytest_executor_sync():
     return "成功30"
 
 
+@job_handler.register(coalesce=True)
+async def pytest_executor_coalesce():
+    await asyncio.sleep(0.5)
+    return g.xxl_run_data.executorParams
+
+
+@job_handler.register(max_lateness=0.3)
+async def pytest_executor_stale_skip():
+    await asyncio.sleep(0.5)
+
+
+@job_handler.register(max_lateness=0.3, misfire_policy="coalesce")
+async def pytest_executor_stale_coalesce():
+    await asyncio.sleep(0.5)
+
+
 @job_handler.register
 async def pytest_executor_error():
     assert 1 == 2
 
 
+@job_handler.register(reducer=count)
+async def pytest_executor_async_gen():
+    for i in range(3):
+        await asyncio.sleep(0.01)
+        yield i
+
+
+@job_handler.register(reducer=tail(2))
+def pytest_executor_sync_gen():
+    for i in range(3):
+        yield {"done": i}
+
+
 HANDLER_NAMES = [
     "pytest_executor_async",
     "pytest_executor_sync",
@@ -152,6 +184,84 @@ async def test_runner_SERIAL_EXECUTION(executor: Executor, job_id: int, handler_
     await executor.shutdown()
 
 
+@pytest.mark.asyncio
+async def test_runner_SERIAL_EXECUTION_coalesce(executor: Executor, job_id: int, log_id_iter: Iterator[int]):
+    executor.xxl_client.clear_result()
+    executor.reset_handler(job_handler)
+    run_data = dict(
+        jobId=job_id,
+        executorHandler="pytest_executor_coalesce",
+        executorBlockStrategy=executorBlockStrategy.SERIAL_EXECUTION.value,
+    )
+    # 超过task_queue_length也不会丢弃
+    log_ids = [next(log_id_iter) for _ in range(executor.config.task_queue_length + 3)]
+    for i, log_id in enumerate(log_ids):
+        await executor.run_job(RunData(logId=log_id, executorParams=str(i), **run_data))
+
+    assert executor.queue.get(job_id).qsize() == 1
+    pending = executor.queue.get(job_id)._queue[0]  # type: ignore[attr-defined]
+    assert pending.logId == log_ids[-1]
+    assert pending.executorParams == str(len(log_ids) - 1)
+    await executor.graceful_close(10)
+
+    assert all(executor.xxl_client.callback_result.get(log_id) == 200 for log_id in log_ids)
+    superseded, code, msg = executor.xxl_client.callback_batch_result[0]
+    assert superseded == log_ids[1:-1]
+    assert code == 200
+    assert "Coalesced into logId %s" % log_ids[-1] in msg
+    assert executor._coalesced == {}
+
+
+def test_misfire_policy_register():
+    with pytest.raises(JobRegisterError, match="misfire_policy"):
+        JobHandler().register(misfire_policy="unknown")
+
+
+@pytest.mark.asyncio
+async def test_runner_stale_skip(executor: Executor, job_id: int, log_id_iter: Iterator[int]):
+    executor.xxl_client.clear_result()
+    executor.reset_handler(job_handler)
+    run_data = dict(
+        jobId=job_id,
+        executorHandler="pytest_executor_stale_skip",
+        executorBlockStrategy=executorBlockStrategy.SERIAL_EXECUTION.value,
+    )
+    now = int(time.time() * 1000)
+    with pytest.raises(JobStaleError, match="lateness"):
+        await executor.run_job(RunData(logId=next(log_id_iter), logDateTime=now - 10_000, **run_data))
+
+    # 第二个调度在队列中等待了0.5s,出队时已经过期
+    log_ids = [next(log_id_iter) for _ in range(2)]
+    for log_id in log_ids:
+        await executor.run_job(RunData(logId=log_id, logDateTime=now, **run_data))
+    await executor.graceful_close(5)
+    await asyncio.sleep(0.1)
+    assert executor.xxl_client.callback_result.get(log_ids[0]) == 200
+    assert executor.xxl_client.callback_result.get(log_ids[1]) == 500
+
+
+@pytest.mark.asyncio
+async def test_runner_stale_coalesce(executor: Executor, job_id: int, log_id_iter: Iterator[int]):
+    executor.xxl_client.clear_result()
+    executor.reset_handler(job_handler)
+    run_data = dict(
+        jobId=job_id,
+        executorHandler="pytest_executor_stale_coalesce",
+        executorBlockStrategy=executorBlockStrategy.SERIAL_EXECUTION.value,
+    )
+    now = int(time.time() * 1000)
+    # 过期的调度在没有排队的任务时仍然执行
+    log_ids = [next(log_id_iter) for _ in range(4)]
+    for log_id in log_ids:
+        await executor.run_job(RunData(logId=log_id, logDateTime=now - 10_000, **run_data))
+    await executor.graceful_close(5)
+
+    assert all(executor.xxl_client.callback_result.get(log_id) == 200 for log_id in log_ids)
+    superseded, _, msg = executor.xxl_client.callback_batch_result[0]
+    assert superseded == log_ids[1:3]
+    assert "Coalesced into logId %s" % log_ids[3] in msg
+
+
 @pytest.mark.asyncio
 @pytest.mark.parametrize("handler_name", HANDLER_NAMES)
 async def test_runner_DISCARD_LATER(executor: Executor, job_id: int, handler_name: str, log_id_iter: Iterator[int]):
@@ -261,3 +371,127 @@ async def test_many_jobs_running(executor: Executor, job_id: int, log_id_iter: I
 
     assert executor.xxl_client.callback_result.get(task1.logId) == 200
     assert executor.xxl_client.callback_result.get(task2.logId) == 200
+
+
+@pytest.mark.asyncio
+async def test_generator_handler():
+    progress = []
+    closed = []
+
+    def gen():
+        try:
+            yield from range(1000)
+        finally:
+            closed.append(True)
+
+    result = await HandlerInfo(handler=gen, reducer=count).start(5, progress=lambda i, item: progress.append(i))
+    assert result == 1000 and progress[-1] == 1000 and closed
+    assert await HandlerInfo(handler=pytest_executor_async_gen).start(5) == 2
+    assert await HandlerInfo(handler=pytest_executor_sync_gen, reducer=tail(2)).start(5) == [{"done": 1}, {"done": 2}]
+
+    async def slow_gen():
+        try:
+            yield 1
+            await asyncio.sleep(10)
+        finally:
+            closed.append("async")
+
+    with pytest.raises(asyncio.TimeoutError):
+        await HandlerInfo(handler=slow_gen).start(0.1)
+    assert closed[-1] == "async"
+
+    with pytest.raises(JobRegisterError, match="generator"):
+        JobHandler().register(reducer=count)(pytest_executor_async)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("handler_name", ["pytest_executor_async_gen", "pytest_executor_sync_gen"])
+async def test_runner_generator(
+    executor: Executor, job_id: int, log_id: int, handler_name: str, monkeypatch: pytest.MonkeyPatch
+):
+    executor.reset_handler(job_handler)
+    executor.xxl_client.clear_result()
+    progress = []
+    monkeypatch.setattr(executor, "progress_callback", progress.append)
+    await executor.run_job(
+        RunData(
+            jobId=job_id,
+            logId=log_id,
+            executorHandler=handler_name,
+            executorBlockStrategy=executorBlockStrategy.SERIAL_EXECUTION.value,
+        )
+    )
+    await executor.graceful_close()
+    assert executor.xxl_client.callback_result[log_id] == 200
+    assert progress == [handler_name] * 3
+
+
+@pytest.mark.asyncio
+async def test_runner_coalesce_killed(executor: Executor, job_id: int, log_id_iter: Iterator[int]):
+    executor.xxl_client.clear_result()
+    executor.reset_handler(job_handler)
+    run_data = dict(
+        jobId=job_id,
+        executorHandler="pytest_executor_coalesce",
+        executorBlockStrategy=executorBlockStrategy.SERIAL_EXECUTION.value,
+    )
+    log_ids = [next(log_id_iter) for _ in range(4)]
+    for log_id in log_ids:
+        await executor.run_job(RunData(logId=log_id, **run_data))
+
+    await executor.cancel_job(job_id)
+    superseded, code, msg = executor.xxl_client.callback_batch_result[0]
+    assert superseded == log_ids[1:-1]
+    assert code == 500
+    assert "killed" in msg
+    assert executor._coalesced == {}
+
+    # shutdown时排队中的调度合并的logId也需要回调
+    executor.xxl_client.clear_result()
+    log_ids = [next(log_id_iter) for _ in range(4)]
+    for log_id in log_ids:
+        await executor.run_job(RunData(logId=log_id, **run_data))
+    await executor.shutdown()
+    await asyncio.sleep(0.1)
+    superseded, code, msg = executor.xxl_client.callback_batch_result[0]
+    assert superseded == log_ids[1:-1]
+    assert code == 500
+    assert executor._coalesced == {}
+
+
+@pytest.mark.asyncio
+async def test_runner_shutdown_slow_callback(
+    executor: Executor, job_id: int, log_id_iter: Iterator[int], monkeypatch: pytest.MonkeyPatch
+):
+    handler = JobHandler()
+    cancelled = asyncio.Event()
+
+    @handler.register(coalesce=True)
+    async def pytest_shutdown_slow_callback():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    async def slow_callback_batch(*args, **kwargs):
+        await asyncio.sleep(10)
+
+    executor.reset_handler(handler)
+    monkeypatch.setattr(pyxxl.executor, "SHUTDOWN_CALLBACK_TIMEOUT", 0.1)
+    for _ in range(4):
+        await executor.run_job(
+            RunData(
+                jobId=job_id,
+                logId=next(log_id_iter),
+                executorHandler="pytest_shutdown_slow_callback",
+                executorBlockStrategy=executorBlockStrategy.SERIAL_EXECUTION.value,
+            )
+        )
+    await asyncio.sleep(0.1)
+    monkeypatch.setattr(executor.xxl_client, "callback_batch", slow_callback_batch)
+    start = time.monotonic()
+    await executor.shutdown()
+    # 回调排队的调度很慢时,运行中的任务已经被取消,shutdown也不会一直等待
+    assert time.monotonic() - start < 1
+    await asyncio.wait_for(cancelled.wait(), 1)
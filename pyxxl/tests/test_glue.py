@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import os
+import time
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Iterator, List
+
+import pytest
+
+from pyxxl import ExecutorConfig
+from pyxxl.enum import executorBlockStrategy, glueType
+from pyxxl.error import JobNotFoundError
+from pyxxl.executor import Executor
+from pyxxl.glue import GlueCodeCache, run_in_process, run_shell_script, write_script
+from pyxxl.schema import RunData
+from pyxxl.tests.conftest import GLOBAL_CONFIG
+from pyxxl.tests.utils import MokeXXL
+
+outputs: List[Any] = []
+
+SYNC_SCRIPT = """
+import pyxxl.tests.test_glue as t
+print("glue params", params)
+
+def run():
+    t.outputs.append(("sync", params, shard_index))
+    return "ok"
+"""
+
+ASYNC_SCRIPT = """
+import asyncio
+import pyxxl.tests.test_glue as t
+
+async def run():
+    await asyncio.sleep(0.01)
+    t.outputs.append(("async", params))
+"""
+
+
+def _glue_data(
+    job_id: int, log_id: int, source: str, update_time: int = 1, glue: glueType = glueType.GLUE_PYTHON, **kwargs: Any
+) -> RunData:
+    return RunData(
+        jobId=job_id,
+        logId=log_id,
+        executorHandler="",
+        executorBlockStrategy=executorBlockStrategy.SERIAL_EXECUTION.value,
+        glueType=glue.value,
+        glueSource=source,
+        glueUpdatetime=update_time,
+        **kwargs,
+    )
+
+
+def test_glue_code_cache():
+    stats: List[bool] = []
+    cache = GlueCodeCache(maxsize=2, callback=lambda hit, seconds: stats.append(hit))
+    code = cache.get(1, 1, "a = 1")
+    assert cache.get(1, 1, "a = 1") is code
+    # 修改脚本后旧版本被替换
+    assert cache.get(1, 2, "a = 2") is not code
+    assert len(cache) == 1
+    cache.get(2, 1, "b = 1")
+    cache.get(3, 1, "c = 1")
+    assert len(cache) == 2
+    cache.get(1, 2, "a = 2")
+    assert stats == [False, True, False, False, False, False]
+
+
+def test_run_in_process():
+    data = _glue_data(1, 1, "print('hello', params)\ndef run():\n    return params * 2", executorParams="ab")
+    assert run_in_process(asdict(data), 8) == ("abab", "hello ab\n", False, pytest.approx(0, abs=1))
+    assert run_in_process(asdict(data), 8)[2] is True
+
+
+@pytest.mark.asyncio
+async def test_runner_glue_disabled(executor: Executor, job_id: int, log_id_iter: Iterator[int]):
+    assert executor.config.glue_enabled is False
+    with pytest.raises(JobNotFoundError, match="glue_enabled"):
+        await executor.run_job(_glue_data(job_id, next(log_id_iter), SYNC_SCRIPT))
+    with pytest.raises(JobNotFoundError, match="glue_enabled"):
+        await executor.run_job(_glue_data(job_id, next(log_id_iter), "echo hello", glue=glueType.GLUE_SHELL))
+
+
+@pytest.mark.asyncio
+async def test_runner_glue(
+    executor: Executor, job_id: int, log_id_iter: Iterator[int], monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(executor.config, "glue_enabled", True)
+    outputs.clear()
+    executor.xxl_client.clear_result()
+    stats: List[bool] = []
+    executor.glue_callback = lambda hit, seconds: stats.append(hit)
+    log_ids = [next(log_id_iter) for _ in range(3)]
+    await executor.run_job(_glue_data(job_id, log_ids[0], SYNC_SCRIPT, executorParams="p1", broadcastIndex=0))
+    await executor.run_job(_glue_data(job_id, log_ids[1], SYNC_SCRIPT, executorParams="p2", broadcastIndex=1))
+    await executor.run_job(_glue_data(job_id + 1, log_ids[2], ASYNC_SCRIPT, executorParams="p3"))
+    await executor.graceful_close(5)
+    executor.glue_callback = lambda hit, seconds: 1
+
+    assert all(executor.xxl_client.callback_result.get(log_id) == 200 for log_id in log_ids)
+    assert sorted(outputs) == [("async", "p3"), ("sync", "p1", 0), ("sync", "p2", 1)]
+    assert sorted(stats) == [False, False, True]
+
+
+@pytest.mark.asyncio
+async def test_runner_glue_process(log_id_iter: Iterator[int]):
+    config = ExecutorConfig(**GLOBAL_CONFIG, glue_enabled=True, glue_process_workers=1)
+    xxl_client = MokeXXL("http://localhost:8080/xxl-job-admin/api/")
+    xxl_client.clear_result()
+    executor = Executor(xxl_client, config)
+    ok, error, timeout = next(log_id_iter), next(log_id_iter), next(log_id_iter)
+    await executor.run_job(_glue_data(1, ok, "import sys\nsys.stdout.write('raw')\ndef run():\n    return 1"))
+    await executor.run_job(_glue_data(2, error, "raise ValueError('glue error')"))
+    await executor.run_job(_glue_data(3, timeout, "import time\nwhile True:\n    time.sleep(1)", executorTimeout=1))
+    start = time.monotonic()
+    await executor.graceful_close(30)
+    await xxl_client.close()
+    assert xxl_client.callback_result == {ok: 200, error: 500, timeout: 500}
+    assert "glue error" in (xxl_client.callback_msg[error] or "")
+    # 超时的脚本所在的子进程被终止,不会一直占用glue_process_workers
+    assert time.monotonic() - start < 10
+    assert executor._glue_slots and not executor._glue_slots.locked()
+
+
+@pytest.mark.asyncio
+async def test_run_shell_script(caplog: pytest.LogCaptureFixture):
+    logger = logging.getLogger("pytest.glue.shell")
+    script = "echo out $1; echo err >&2; head -c 200000 /dev/zero | tr '\\0' a; echo; exit 3"
+    with caplog.at_level(logging.INFO, logger="pytest.glue.shell"):
+        code = await run_shell_script(["bash", "-c", script, "bash", "p1"], logger)
+    assert code == 3
+    messages = [(r.levelno, r.getMessage()) for r in caplog.records if r.name == "pytest.glue.shell"]
+    assert (logging.INFO, "out p1") in messages
+    assert (logging.WARNING, "err") in messages
+    # 超长的行分段输出
+    assert sum(len(m) for _, m in messages if set(m) == {"a"}) == 200000
+
+
+@pytest.mark.asyncio
+async def test_runner_glue_shell(
+    executor: Executor, job_id: int, log_id_iter: Iterator[int], tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(executor.config, "glue_enabled", True)
+    monkeypatch.setattr(executor.config, "glue_script_dir", str(tmp_path / "gluesource"))
+    executor.xxl_client.clear_result()
+    ok, failed, timeout, killed = [next(log_id_iter) for _ in range(4)]
+    pid_file = tmp_path / "pid"
+    script = "sleep 30 & echo $! > %s; wait" % pid_file
+
+    await executor.run_job(
+        _glue_data(
+            job_id,
+            ok,
+            'test "$1 $2 $3" = "p 1 2"',
+            glue=glueType.GLUE_SHELL,
+            executorParams="p",
+            broadcastIndex=1,
+            broadcastTotal=2,
+        )
+    )
+    await executor.run_job(_glue_data(job_id + 1, failed, "exit 1", glue=glueType.GLUE_SHELL))
+    await executor.run_job(_glue_data(job_id + 2, timeout, "sleep 30", glue=glueType.GLUE_SHELL, executorTimeout=1))
+    await executor.run_job(_glue_data(job_id + 3, killed, script, glue=glueType.GLUE_SHELL))
+    start = time.monotonic()
+    while not pid_file.exists() or not pid_file.read_text().strip():
+        await asyncio.sleep(0.05)
+    await executor.cancel_job(job_id + 3)
+    await executor.graceful_close(10)
+    assert time.monotonic() - start < 5
+
+    assert executor.xxl_client.callback_result.get(ok) == 200
+    assert executor.xxl_client.callback_result.get(failed) == 500
+    assert executor.xxl_client.callback_result.get(timeout) == 500
+    assert executor.xxl_client.callback_result.get(killed) == 500
+    # 整个进程组都被kill
+    await asyncio.sleep(0.1)
+    with pytest.raises(ProcessLookupError):
+        os.kill(int(pid_file.read_text()), 0)
+
+
+def test_write_script(tmp_path: Path):
+    data = _glue_data(1, 1, "echo 1", glue=glueType.GLUE_SHELL)
+    path = write_script(str(tmp_path), data)
+    assert Path(path).read_text() == "echo 1"
+    # 内容不一致(如jobId被重新使用)时覆盖
+    data = _glue_data(1, 2, "echo 2", glue=glueType.GLUE_SHELL)
+    assert write_script(str(tmp_path), data) == path
+    assert Path(path).read_text() == "echo 2"
+    assert os.listdir(tmp_path) == [os.path.basename(path)]
@@ -0,0 +1,127 @@
+import asyncio
+import json
+from pathlib import Path
+
+import pytest
+
+from pyxxl import ExecutorConfig
+from pyxxl.enum import executorBlockStrategy
+from pyxxl.executor import Executor, JobHandler
+from pyxxl.journal import RunJournal
+from pyxxl.schema import RunData
+from pyxxl.tests.conftest import GLOBAL_CONFIG
+from pyxxl.tests.utils import MokeXXL
+
+
+def _data(log_id: int, job_id: int = 1, strategy: executorBlockStrategy = executorBlockStrategy.SERIAL_EXECUTION):
+    return RunData(jobId=job_id, logId=log_id, executorHandler="journal_task", executorBlockStrategy=strategy.value)
+
+
+@pytest.mark.asyncio
+async def test_journal_recover(tmp_path: Path):
+    path = str(tmp_path / "journal" / "journal.jsonl")
+    journal = RunJournal(path)
+    for i in range(1, 5):
+        journal.accepted(_data(i))
+    journal.started(1)
+    journal.started(2)
+    journal.finished(2)
+    await journal.flush()
+    # 模拟进程退出时写入了一半的记录
+    with open(path, "ab") as f:
+        f.write(b'{"e":"F","l":')
+
+    entries = await RunJournal(path).recover()
+    assert [(e.data.logId, e.started) for e in entries] == [(1, True), (3, False), (4, False)]
+    # recover后文件只保留未结束的任务
+    with open(path) as f:
+        assert len([json.loads(line) for line in f]) == 4
+    await journal.close()
+
+    # recover之前新接收的任务不算作上次进程遗留的任务
+    journal = RunJournal(path)
+    journal.accepted(_data(5))
+    assert [e.data.logId for e in await journal.recover()] == [1, 3, 4]
+    assert list(journal.live) == [1, 3, 4, 5]
+    await journal.close()
+
+
+@pytest.mark.asyncio
+async def test_journal_compact(tmp_path: Path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = RunJournal(path, compact_records=10)
+    for i in range(20):
+        journal.accepted(_data(i))
+        journal.finished(i)
+        await journal.flush()
+    journal.accepted(_data(100))
+    await journal.flush()
+    with open(path) as f:
+        assert len(f.readlines()) < 10
+    await journal.close()
+    assert [e.data.logId for e in await RunJournal(path).recover()] == [100]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("restore", [True, False])
+async def test_executor_reconcile(tmp_path: Path, restore: bool):
+    config = ExecutorConfig(**GLOBAL_CONFIG, journal_dir=str(tmp_path), journal_restore_queued=restore)
+    handler = JobHandler()
+
+    @handler.register
+    async def journal_task():
+        await asyncio.sleep(0.1)
+
+    journal = RunJournal(str(tmp_path / "journal.jsonl"))
+    journal.accepted(_data(1))
+    journal.started(1)
+    journal.accepted(_data(2))
+    journal.accepted(_data(3, job_id=2, strategy=executorBlockStrategy.COVER_EARLY))
+    await journal.close()
+
+    xxl_client = MokeXXL("http://localhost:8080/xxl-job-admin/api/")
+    xxl_client.clear_result()
+    executor = Executor(xxl_client, config, handler=handler)
+    assert executor.journal
+    await executor.reconcile()
+    if restore:
+        assert xxl_client.callback_batch_result[0][0] == [1, 3]
+    else:
+        assert xxl_client.callback_batch_result[0][0] == [1, 2, 3]
+    assert xxl_client.callback_batch_result[0][1] == 500
+
+    await executor.graceful_close(5)
+    assert xxl_client.callback_result[2] == (200 if restore else 500)
+    assert executor.journal.live == {}
+    await executor.journal.close()
+    await xxl_client.close()
+    assert await RunJournal(str(tmp_path / "journal.jsonl")).recover() == []
+
+
+@pytest.mark.asyncio
+async def test_executor_reconcile_rate_limited(tmp_path: Path):
+    config = ExecutorConfig(**GLOBAL_CONFIG, journal_dir=str(tmp_path), journal_restore_queued=True)
+    handler = JobHandler()
+
+    @handler.register(rate=0.01, burst=1, rate_policy="reject")
+    async def journal_task():
+        await asyncio.sleep(0.1)
+
+    journal = RunJournal(str(tmp_path / "journal.jsonl"))
+    for log_id in (1, 2, 3):
+        journal.accepted(_data(log_id, job_id=log_id))
+    await journal.close()
+
+    xxl_client = MokeXXL("http://localhost:8080/xxl-job-admin/api/")
+    xxl_client.clear_result()
+    executor = Executor(xxl_client, config, handler=handler)
+    assert executor.journal
+    await executor.reconcile()
+    await executor.graceful_close(5)
+    # 被限流拒绝的任务回调为失败,不影响后面的任务恢复,也不会一直留在journal中
+    assert xxl_client.callback_result == {1: 200, 2: 500, 3: 500}
+    assert "rate limited" in (xxl_client.callback_msg[2] or "")
+    assert executor.journal.live == {}
+    await executor.journal.close()
+    await xxl_client.close()
+    assert await RunJournal(str(tmp_path / "journal.jsonl")).recover() == []
@@ -0,0 +1,124 @@
+import asyncio
+import time
+from dataclasses import replace
+from pathlib import Path
+from typing import Iterator, List, Tuple
+
+import pytest
+
+from pyxxl.enum import executorBlockStrategy
+from pyxxl.executor import Executor, JobHandler
+from pyxxl.lease import FileLease, RedisLease
+from pyxxl.schema import RunData
+from pyxxl.tests.utils import INSTALL_REDIS, REDIS_TEST_URI, MokeXXL
+
+job_handler = JobHandler()
+runs: List[Tuple[str, float, float]] = []
+
+
+@job_handler.register
+async def pytest_lease():
+    start = time.monotonic()
+    await asyncio.sleep(0.3)
+    runs.append(("run", start, time.monotonic()))
+
+
+@job_handler.register
+async def pytest_lease_long():
+    await asyncio.sleep(5)
+
+
+class _LosingLease(FileLease):
+    """续约时租约已经被其他执行器拿走"""
+
+    def renew(self, key: str, owner: str, ttl: float) -> bool:
+        return False
+
+
+def test_file_lease(tmp_path: Path):
+    a, b = FileLease(str(tmp_path)), FileLease(str(tmp_path))
+    assert a.acquire("1", "a", 1)
+    assert not a.acquire("1", "a2", 1)
+    assert not b.acquire("1", "b", 1)
+    assert b.acquire("2", "b", 1)
+    assert a.renew("1", "a", 1) and not a.renew("1", "b", 1)
+    b.release("1", "b")
+    assert not b.acquire("1", "b", 1)
+    a.release("1", "a")
+    assert b.acquire("1", "b", 1)
+    assert (tmp_path / "1.lock").read_text() == "b"
+
+
+@pytest.mark.skipif(not INSTALL_REDIS, reason="no redis package.")
+def test_redis_lease():
+    lease = RedisLease("pytest", REDIS_TEST_URI)
+    lease.release("1", "a")
+    lease.release("1", "b")
+    assert lease.acquire("1", "a", 1)
+    assert not lease.acquire("1", "b", 1)
+    assert lease.renew("1", "a", 1) and not lease.renew("1", "b", 1)
+    lease.release("1", "b")
+    assert not lease.acquire("1", "b", 1)
+    lease.release("1", "a")
+    assert lease.acquire("1", "b", 0.1)
+    time.sleep(0.2)
+    assert lease.acquire("1", "a", 1)
+    lease.release("1", "a")
+
+
+@pytest.mark.asyncio
+async def test_runner_lease(executor: Executor, job_id: int, log_id_iter: Iterator[int], tmp_path: Path):
+    config = replace(executor.config, job_lease="file", job_lease_dir=str(tmp_path), job_lease_ttl=0.3)
+    xxl = MokeXXL(config.xxl_admin_baseurl)
+    xxl.clear_result()
+    nodes = [Executor(xxl, config, handler=job_handler) for _ in range(2)]
+    runs.clear()
+
+    def run_data(strategy: executorBlockStrategy) -> RunData:
+        return RunData(
+            jobId=job_id, logId=next(log_id_iter), executorHandler="pytest_lease", executorBlockStrategy=strategy.value
+        )
+
+    first, discard, serial = (
+        run_data(executorBlockStrategy.SERIAL_EXECUTION),
+        run_data(executorBlockStrategy.DISCARD_LATER),
+        run_data(executorBlockStrategy.SERIAL_EXECUTION),
+    )
+    await nodes[0].run_job(first)
+    await asyncio.sleep(0.05)
+    # 相同的jobId被路由到另一个执行器
+    await nodes[1].run_job(discard)
+    await asyncio.sleep(0.05)
+    await nodes[1].run_job(serial)
+    await nodes[0].graceful_close()
+    await nodes[1].graceful_close()
+
+    assert xxl.callback_result[first.logId] == 200
+    assert xxl.callback_result[serial.logId] == 200
+    assert xxl.callback_result[discard.logId] == 500
+    assert "another executor" in (xxl.callback_msg[discard.logId] or "")
+    # 两个执行器上的任务没有同时运行
+    assert len(runs) == 2 and runs[1][1] >= runs[0][2]
+
+
+@pytest.mark.asyncio
+async def test_runner_lease_lost(executor: Executor, job_id: int, log_id_iter: Iterator[int], tmp_path: Path):
+    config = replace(executor.config, job_lease="file", job_lease_dir=str(tmp_path), job_lease_ttl=0.3)
+    xxl = MokeXXL(config.xxl_admin_baseurl)
+    xxl.clear_result()
+    node = Executor(xxl, config, handler=job_handler)
+    node.lease = _LosingLease(str(tmp_path))
+    data = RunData(
+        jobId=job_id,
+        logId=next(log_id_iter),
+        executorHandler="pytest_lease_long",
+        executorBlockStrategy=executorBlockStrategy.SERIAL_EXECUTION.value,
+    )
+    start = time.monotonic()
+    await node.run_job(data)
+    await node.graceful_close()
+    # 第一次续约时发现租约丢失,取消任务并按失败回调,租约已经释放
+    assert time.monotonic() - start < 1
+    assert xxl.callback_result[data.logId] == 500
+    assert "is lost" in (xxl.callback_msg[data.logId] or "")
+    assert FileLease(str(tmp_path)).acquire(str(job_id), "other", 1)
@@ -1,4 +1,6 @@
+import logging
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import TYPE_CHECKING, Callable
 
@@ -124,3 +126,16 @@ async def test_disk_expired():
         assert log_file.exists()
         await file_log.expired_once()
         assert log_file.exists() is False
+
+
+def test_task_logger_not_registered(tmp_path: Path):
+    file_log = DiskLog(log_path=str(tmp_path))
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        loggers = list(pool.map(lambda _: file_log.get_logger(1, stdout=False), range(32)))
+
+    assert len({id(i) for i in loggers}) == 32
+    assert all(len(i.handlers) == 1 for i in loggers)
+    assert not any(i.name in logging.Logger.manager.loggerDict for i in loggers)
+    for i in loggers:
+        file_log.after_running(i)
+        assert i.handlers == []
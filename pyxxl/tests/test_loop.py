@@ -0,0 +1,97 @@
+import asyncio
+import time
+from typing import Callable
+
+import pytest
+
+from pyxxl import ExecutorConfig
+from pyxxl.ctx import g
+from pyxxl.enum import executorBlockStrategy
+from pyxxl.executor import Executor, JobHandler
+from pyxxl.schema import RunData
+from pyxxl.tests.conftest import GLOBAL_CONFIG
+from pyxxl.tests.utils import MokePyxxlRunner, MokeXXL
+from pyxxl.utils import try_import
+
+uvloop = try_import("uvloop")
+
+job_handler = JobHandler()
+
+
+@job_handler.register
+async def pytest_loop_async():
+    await asyncio.sleep(0.2)
+    return "ok"
+
+
+@job_handler.register
+def pytest_loop_sync():
+    time.sleep(0.2)
+    return "ok"
+
+
+@job_handler.register
+def pytest_loop_sync_forever():
+    while not g.cancel_event.is_set():
+        time.sleep(0.1)
+
+
+async def _executor_paths() -> None:
+    executor = Executor(
+        MokeXXL(GLOBAL_CONFIG["xxl_admin_baseurl"]), ExecutorConfig(**GLOBAL_CONFIG), handler=job_handler
+    )
+    assert executor.loop is asyncio.get_running_loop()
+
+    def _data(log_id: int, handler: str, timeout: int = 0) -> RunData:
+        return RunData(
+            jobId=log_id,
+            logId=log_id,
+            executorHandler=handler,
+            executorBlockStrategy=executorBlockStrategy.SERIAL_EXECUTION.value,
+            executorTimeout=timeout,
+        )
+
+    await executor.run_job(_data(9901, "pytest_loop_async"))
+    await executor.run_job(_data(9902, "pytest_loop_sync"))
+    await executor.run_job(_data(9903, "pytest_loop_sync_forever"))
+    await executor.run_job(_data(9904, "pytest_loop_sync_forever", timeout=1))
+    await executor.cancel_job(9903)
+    await executor.graceful_close(10)
+
+    result = executor.xxl_client.callback_result
+    assert [result.get(i) for i in (9901, 9902, 9903, 9904)] == [200, 200, 500, 500]
+    await executor.xxl_client.close()
+
+
+@pytest.mark.parametrize(
+    "loop_factory",
+    [
+        asyncio.new_event_loop,
+        pytest.param(
+            uvloop and uvloop.new_event_loop,
+            marks=pytest.mark.skipif(not uvloop, reason="no uvloop package."),
+        ),
+    ],
+    ids=["asyncio", "uvloop"],
+)
+def test_executor_paths(loop_factory: Callable[[], asyncio.AbstractEventLoop]):
+    loop = loop_factory()
+    try:
+        loop.run_until_complete(_executor_paths())
+    finally:
+        loop.close()
+
+
+def test_new_event_loop():
+    runner = MokePyxxlRunner(ExecutorConfig(**GLOBAL_CONFIG, event_loop="uvloop"))
+    loop = runner.new_event_loop()
+    if uvloop:
+        assert isinstance(loop, uvloop.Loop)
+    else:
+        assert isinstance(loop, asyncio.AbstractEventLoop)
+    loop.close()
+
+    custom_loop = asyncio.new_event_loop()
+    runner = MokePyxxlRunner(ExecutorConfig(**GLOBAL_CONFIG), loop_factory=lambda: custom_loop)
+    assert runner.new_event_loop() is custom_loop
+    custom_loop.close()
@@ -0,0 +1,52 @@
+import pytest
+
+from pyxxl import ExecutorConfig
+from pyxxl.enum import executorBlockStrategy
+from pyxxl.executor import Executor, JobHandler
+from pyxxl.memory import MemoryStats
+from pyxxl.schema import RunData
+from pyxxl.tests.conftest import GLOBAL_CONFIG
+from pyxxl.tests.utils import MokeXXL
+
+job_handler = JobHandler()
+
+
+@job_handler.register
+async def pytest_memory_async():
+    data = [bytearray(1024) for _ in range(1024)]
+    return len(data)
+
+
+@pytest.mark.asyncio
+async def test_memory_trace(job_id: int, log_id: int):
+    config = ExecutorConfig(**GLOBAL_CONFIG, memory_trace=True, memory_snapshot_jobs="%s" % job_id)
+    stats_list = []
+    executor = Executor(
+        MokeXXL(config.xxl_admin_baseurl),
+        config,
+        handler=job_handler,
+        memory_callback=lambda name, stats: stats_list.append((name, stats)),
+    )
+    await executor.run_job(
+        RunData(
+            logId=log_id,
+            jobId=job_id,
+            executorHandler="pytest_memory_async",
+            executorBlockStrategy=executorBlockStrategy.SERIAL_EXECUTION.value,
+        )
+    )
+    await executor.graceful_close()
+
+    assert executor.xxl_client.callback_result.get(log_id) == 200
+    name, stats = stats_list[0]
+    assert name == "pytest_memory_async"
+    assert isinstance(stats, MemoryStats)
+    assert stats.peak >= 1024 * 1024
+    logs = await executor.logger_factory.read_task_logs(log_id)
+    assert "Memory jobId=%s logId=%s" % (job_id, log_id) in logs
+    assert "memory allocation diff" in logs
+
+
+def test_snapshot_job_ids():
+    config = ExecutorConfig(**GLOBAL_CONFIG, memory_snapshot_jobs="1, 2,,3")
+    assert config.memory_snapshot_job_ids == [1, 2, 3]
@@ -0,0 +1,84 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+from aiohttp import web
+from pytest_aiohttp.plugin import AiohttpClient
+
+from pyxxl import ExecutorConfig
+from pyxxl.prefork import LOG_ROUTE_SIZE, PreforkSupervisor
+from pyxxl.tests.conftest import GLOBAL_CONFIG
+from pyxxl.tests.utils import MokePyxxlRunner
+from pyxxl.utils import try_import
+
+WORKERS = 2
+
+
+@pytest.mark.asyncio
+async def test_prefork_routing(aiohttp_client: AiohttpClient, tmp_path: Path):
+    runner = MokePyxxlRunner(ExecutorConfig(**GLOBAL_CONFIG))
+
+    @runner.register(name="demoJobHandler")
+    async def test_task() -> None:
+        await asyncio.sleep(1)
+
+    supervisor = PreforkSupervisor(runner, WORKERS, socket_dir=str(tmp_path))
+    # 在当前进程内启动worker,代替Process
+    worker_apps, app_runners = [], []
+    for index, path in enumerate(supervisor.socket_paths):
+        runner._worker_index = index
+        app = runner.create_server_app()
+        app_runner = web.AppRunner(app)
+        await app_runner.setup()
+        await web.UnixSite(app_runner, path).start()
+        worker_apps.append(app)
+        app_runners.append(app_runner)
+
+    cli = await aiohttp_client(supervisor.create_app())
+    for job_id in (900, 901):
+        resp = await cli.post(
+            "/run",
+            json=dict(
+                jobId=job_id, logId=job_id, executorHandler="demoJobHandler", executorBlockStrategy="COVER_EARLY"
+            ),
+        )
+        assert await resp.json() == {"code": 200, "msg": "Running"}
+
+    for index, app in enumerate(worker_apps):
+        assert list(app["pyxxl_state"].executor.tasks.keys()) == [900 + index]
+
+    resp = await cli.post("/idleBeat", json={"jobId": 901})
+    assert (await resp.json())["msg"] == "job 901 is running."
+
+    # logId按jobId所在的worker转发
+    assert supervisor.log_worker_index(900) == 0
+    resp = await cli.post("/log", json=dict(logDateTime=0, logId=901, fromLineNum=1))
+    assert resp.status == 200
+
+    resp = await cli.post("/beat")
+    assert await resp.json() == {"code": 200, "msg": None}
+
+    if try_import("prometheus_client"):
+        resp = await cli.get("/metrics")
+        text = await resp.text()
+        assert 'running_tasks{worker="0"} 1.0' in text
+        assert 'running_tasks{worker="1"} 1.0' in text
+
+    for app_runner in app_runners:
+        await app_runner.cleanup()
+
+
+def test_prefork_worker_index():
+    supervisor = PreforkSupervisor(MokePyxxlRunner(ExecutorConfig(**GLOBAL_CONFIG)), 3)
+    assert [supervisor.worker_index(i) for i in range(6)] == [0, 1, 2, 0, 1, 2]
+    with pytest.raises(ValueError):
+        PreforkSupervisor(supervisor.runner, 0)
+
+    supervisor.remember_log(10, 2)
+    assert supervisor.log_worker_index(10) == 2
+    # 没有记录时按logId取模
+    assert supervisor.log_worker_index(11) == 2
+    for i in range(LOG_ROUTE_SIZE):
+        supervisor.remember_log(100 + i, 0)
+    assert 10 not in supervisor.log_jobs
+    assert len(supervisor.log_jobs) == LOG_ROUTE_SIZE
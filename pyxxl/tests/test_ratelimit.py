@@ -0,0 +1,137 @@
+import asyncio
+import time
+from typing import Iterator, List
+
+import pytest
+
+from pyxxl.ctx import g
+from pyxxl.enum import executorBlockStrategy
+from pyxxl.error import JobDuplicateError, JobRateLimitedError, JobRegisterError
+from pyxxl.executor import Executor, JobHandler
+from pyxxl.ratelimit import TokenBucket
+from pyxxl.schema import RunData
+
+job_handler = JobHandler()
+starts: List[float] = []
+
+
+@job_handler.register(rate=20, burst=1)
+async def pytest_rate_delay():
+    starts.append(time.monotonic())
+    assert g.rate_limiter is not None and g.rate_limiter.rate == 20
+
+
+@job_handler.register(rate=0.1, burst=1, rate_policy="reject")
+async def pytest_rate_reject():
+    assert g.rate_limiter is not None
+
+
+@job_handler.register(rate=0.5, burst=1)
+async def pytest_rate_timeout():
+    pass
+
+
+@job_handler.register(rate=0.1, burst=2, rate_policy="reject")
+async def pytest_rate_reject_duplicate():
+    await asyncio.sleep(0.2)
+
+
+def _run_data(job_id: int, log_id: int, handler: str) -> RunData:
+    return RunData(
+        jobId=job_id,
+        logId=log_id,
+        executorHandler=handler,
+        executorBlockStrategy=executorBlockStrategy.SERIAL_EXECUTION.value,
+    )
+
+
+@pytest.mark.asyncio
+async def test_token_bucket():
+    bucket = TokenBucket(rate=50, burst=2)
+    assert bucket.try_acquire() and bucket.try_acquire()
+    assert not bucket.try_acquire()
+    start = time.monotonic()
+    waits = await asyncio.gather(*[bucket.acquire() for _ in range(3)])
+    # 按顺序预约令牌: 0.02s, 0.04s, 0.06s
+    assert waits == sorted(waits) and 0.05 < waits[-1] <= 0.07
+    assert time.monotonic() - start >= 0.05
+
+    task = asyncio.create_task(bucket.acquire(10))
+    await asyncio.sleep(0.01)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    # 取消后归还令牌
+    assert bucket.tokens > -1
+    assert bucket.acquire_sync() < 0.05
+
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0)
+    with pytest.raises(JobRegisterError):
+        JobHandler().register(rate=1, rate_policy="unknown")
+    with pytest.raises(JobRegisterError):
+        JobHandler().register(rate=1, burst=0)
+
+
+@pytest.mark.asyncio
+async def test_runner_rate_limit(executor: Executor, job_id: int, log_id_iter: Iterator[int]):
+    executor.reset_handler(job_handler)
+    executor.xxl_client.clear_result()
+    starts.clear()
+    log_ids = [next(log_id_iter) for _ in range(4)]
+    for index, log_id in enumerate(log_ids):
+        await executor.run_job(_run_data(job_id + index, log_id, "pytest_rate_delay"))
+
+    reject_log_id = next(log_id_iter)
+    await executor.run_job(_run_data(job_id + 10, reject_log_id, "pytest_rate_reject"))
+    with pytest.raises(JobRateLimitedError):
+        await executor.run_job(_run_data(job_id + 11, next(log_id_iter), "pytest_rate_reject"))
+
+    await executor.graceful_close()
+    assert all(executor.xxl_client.callback_result[i] == 200 for i in log_ids + [reject_log_id])
+    # 不同的jobId共用handler的令牌桶,每秒最多执行20次
+    assert len(starts) == 4 and starts[-1] - starts[0] >= 0.14
+
+
+@pytest.mark.asyncio
+async def test_runner_rate_limit_timeout(executor: Executor, job_id: int, log_id_iter: Iterator[int]):
+    executor.reset_handler(job_handler)
+    executor.xxl_client.clear_result()
+    log_ids = [next(log_id_iter) for _ in range(2)]
+    start = time.monotonic()
+    for index, log_id in enumerate(log_ids):
+        await executor.run_job(
+            RunData(
+                jobId=job_id + index,
+                logId=log_id,
+                executorHandler="pytest_rate_timeout",
+                executorBlockStrategy=executorBlockStrategy.SERIAL_EXECUTION.value,
+                executorTimeout=1,
+            )
+        )
+    await executor.graceful_close()
+    # 第二次需要等待2s才有令牌,超过了1s的超时时间,不等待直接超时
+    assert [executor.xxl_client.callback_result[i] for i in log_ids] == [200, 500]
+    assert time.monotonic() - start < 1
+
+
+@pytest.mark.asyncio
+async def test_runner_rate_reject_release(executor: Executor, job_id: int, log_id_iter: Iterator[int]):
+    executor.reset_handler(job_handler)
+
+    def discard_later(job_id: int) -> RunData:
+        return RunData(
+            jobId=job_id,
+            logId=next(log_id_iter),
+            executorHandler="pytest_rate_reject_duplicate",
+            executorBlockStrategy=executorBlockStrategy.DISCARD_LATER.value,
+        )
+
+    await executor.run_job(discard_later(job_id))
+    with pytest.raises(JobDuplicateError):
+        await executor.run_job(discard_later(job_id))
+    # 被丢弃的调度归还了令牌,其他jobId仍然可以执行
+    await executor.run_job(discard_later(job_id + 1))
+    with pytest.raises(JobRateLimitedError):
+        await executor.run_job(discard_later(job_id + 2))
+    await executor.graceful_close()
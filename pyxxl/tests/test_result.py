@@ -0,0 +1,86 @@
+from typing import Any, Iterator
+
+import pytest
+
+from pyxxl.enum import executorBlockStrategy
+from pyxxl.executor import Executor, JobHandler
+from pyxxl.result import serialize_result, truncate_msg
+from pyxxl.schema import RunData
+
+job_handler = JobHandler()
+
+
+@job_handler.register
+async def pytest_result_large():
+    return {"data": "数据" * 1000}
+
+
+@job_handler.register(serializer=lambda result: "rows=%s" % len(result))
+async def pytest_result_serializer():
+    return list(range(10))
+
+
+@job_handler.register
+async def pytest_result_error():
+    raise ValueError("x" * 1000)
+
+
+@pytest.mark.parametrize(
+    "result,expected",
+    [
+        (None, None),
+        ("ok", "ok"),
+        (b"ok", "ok"),
+        ({"a": "中文"}, '{"a": "中文"}'),
+        ([1, {2}], '[1, "{2}"]'),
+        (1.5, "1.5"),
+        (object, "<class 'object'>"),
+    ],
+)
+def test_serialize_result(result: Any, expected: str):
+    assert serialize_result(result) == expected
+
+
+def test_truncate_msg():
+    msg = "中文" * 100
+    size = len(msg.encode())
+    truncated = truncate_msg(msg, size, 120)
+    assert len(truncated.encode()) <= 120
+    assert truncated.startswith("中文") and str(size) in truncated
+    # max_bytes比后缀还小时结果也不超过max_bytes
+    assert truncate_msg(msg, size, 10) == "...[trunca"
+    assert truncate_msg(msg, size, 0) == ""
+
+
+@pytest.mark.asyncio
+async def test_runner_result(
+    executor: Executor, job_id: int, log_id_iter: Iterator[int], monkeypatch: pytest.MonkeyPatch
+):
+    executor.reset_handler(job_handler)
+    executor.xxl_client.clear_result()
+    monkeypatch.setattr(executor.config, "callback_msg_max_bytes", 200)
+    sizes = []
+    monkeypatch.setattr(executor, "result_size_callback", lambda name, size: sizes.append((name, size)))
+    log_ids = {}
+    for index, name in enumerate(["pytest_result_large", "pytest_result_serializer", "pytest_result_error"]):
+        log_ids[name] = next(log_id_iter)
+        await executor.run_job(
+            RunData(
+                jobId=job_id + index,
+                logId=log_ids[name],
+                executorHandler=name,
+                executorBlockStrategy=executorBlockStrategy.SERIAL_EXECUTION.value,
+            )
+        )
+    await executor.graceful_close()
+
+    msg = executor.xxl_client.callback_msg
+    assert len(msg[log_ids["pytest_result_large"]].encode()) <= 200
+    assert msg[log_ids["pytest_result_large"]].startswith('{"data": "数据')
+    assert msg[log_ids["pytest_result_serializer"]] == "rows=10"
+    assert len(msg[log_ids["pytest_result_error"]].encode()) <= 200
+    assert sorted(sizes) == [
+        ("pytest_result_error", 1000),
+        ("pytest_result_large", len(serialize_result({"data": "数据" * 1000}).encode())),
+        ("pytest_result_serializer", 7),
+    ]
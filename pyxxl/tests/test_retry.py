@@ -0,0 +1,76 @@
+from typing import Iterator, List
+
+import pytest
+
+from pyxxl import RetryPolicy
+from pyxxl.enum import executorBlockStrategy
+from pyxxl.executor import Executor, JobHandler
+from pyxxl.schema import RunData
+
+job_handler = JobHandler()
+attempts: List[int] = []
+
+
+@job_handler.register(retry=RetryPolicy(max_attempts=3, retry_on=(ConnectionError,), backoff=0.01, jitter=0))
+async def pytest_retry_flaky():
+    attempts.append(1)
+    if len(attempts) < 3:
+        raise ConnectionError("flaky")
+    return "ok"
+
+
+@job_handler.register(retry=RetryPolicy(max_attempts=3, retry_on=(ConnectionError,), backoff=0.01))
+async def pytest_retry_not_match():
+    attempts.append(1)
+    raise ValueError("not retry")
+
+
+@job_handler.register(retry=RetryPolicy(max_attempts=3, backoff=5))
+def pytest_retry_deadline():
+    attempts.append(1)
+    raise ConnectionError("deadline")
+
+
+def test_retry_policy():
+    policy = RetryPolicy(max_attempts=3, retry_on=(OSError,), backoff=1, backoff_factor=2, max_backoff=3, jitter=0)
+    assert [policy.delay(i) for i in range(1, 5)] == [1, 2, 3, 3]
+    assert policy.should_retry(1, ConnectionError())
+    assert not policy.should_retry(3, ConnectionError())
+    assert not policy.should_retry(1, ValueError())
+    with pytest.raises(ValueError):
+        RetryPolicy(max_attempts=0)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "handler_name,code,count",
+    [
+        ("pytest_retry_flaky", 200, 3),
+        ("pytest_retry_not_match", 500, 1),
+        # 等待5秒后超过executorTimeout,不再重试
+        ("pytest_retry_deadline", 500, 1),
+    ],
+)
+async def test_runner_retry(
+    executor: Executor, job_id: int, log_id_iter: Iterator[int], handler_name: str, code: int, count: int
+):
+    attempts.clear()
+    executor.xxl_client.clear_result()
+    executor.reset_handler(job_handler)
+    retries: List[int] = []
+    executor.retry_callback = lambda: retries.append(1)
+    log_id = next(log_id_iter)
+    await executor.run_job(
+        RunData(
+            jobId=job_id,
+            logId=log_id,
+            executorHandler=handler_name,
+            executorBlockStrategy=executorBlockStrategy.SERIAL_EXECUTION.value,
+            executorTimeout=2,
+        )
+    )
+    await executor.graceful_close(5)
+    executor.retry_callback = lambda: 1
+    assert executor.xxl_client.callback_result == {log_id: code}
+    assert len(attempts) == count
+    assert len(retries) == count - 1
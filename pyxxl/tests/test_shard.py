@@ -0,0 +1,175 @@
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Iterator, List
+
+import pytest
+
+from pyxxl.capacity import PoolAutoscaler
+from pyxxl.ctx import g
+from pyxxl.enum import executorBlockStrategy
+from pyxxl.executor import Executor, JobHandler
+from pyxxl.schema import RunData
+from pyxxl.shard import CONSISTENT_HASH, MAP_POOL_FRACTION, MODULO, Shard
+from pyxxl.threads import ThreadReaper
+
+job_handler = JobHandler()
+outputs: List[Any] = []
+
+
+@job_handler.register(name="shard_map")
+async def shard_map() -> List[int]:
+    result = await g.shard.map(lambda x: x * 10, g.shard.range(0, 10))
+    outputs.append((g.shard.index, g.shard.total, result))
+    return result
+
+
+@pytest.mark.parametrize("mode", [MODULO, CONSISTENT_HASH])
+def test_shard_items(mode: str):
+    keys = ["user-%s" % i for i in range(1000)]
+    parts = [list(Shard(i, 4).items(keys, key=lambda k: k, mode=mode)) for i in range(4)]
+    assert sorted(sum(parts, [])) == sorted(keys)
+    assert all(150 < len(p) < 350 for p in parts)
+    # 每次的结果一致
+    assert parts[1] == list(Shard(1, 4).items(keys, key=lambda k: k, mode=mode))
+
+
+def test_shard_position_and_range():
+    assert list(Shard(1, 3).items("abcdefg")) == ["b", "e"]
+    assert list(Shard(2, 3).range(5, 15)) == [5, 8, 11, 14]
+    assert list(Shard(0, 3).range(5, 15)) == [6, 9, 12]
+    assert list(Shard(0, 0).range(0, 3)) == [0, 1, 2]
+    with pytest.raises(ValueError):
+        Shard(0, 2).owner("a", mode="unknown")
+
+
+def test_consistent_hash_rebalance():
+    keys = range(10000)
+    moved = sum(Shard(0, 4).owner(k, CONSISTENT_HASH) != Shard(0, 5).owner(k, CONSISTENT_HASH) for k in keys)
+    # 增加一个分片时大约1/5的key需要移动,取模时大约4/5
+    assert moved < 3000
+    assert sum(Shard(0, 4).owner(k) != Shard(0, 5).owner(k) for k in keys) > 7000
+
+
+@pytest.mark.asyncio
+async def test_shard_map_bounded():
+    running: List[int] = []
+    peak: List[int] = []
+    lock = threading.Lock()
+
+    def work(x: int) -> int:
+        with lock:
+            running.append(x)
+            peak.append(len(running))
+        time.sleep(0.01)
+        with lock:
+            running.remove(x)
+        return x * 2
+
+    def items() -> Iterator[int]:
+        yield from range(50)
+
+    with ThreadPoolExecutor(8) as pool:
+        shard = Shard(thread_pool=pool)
+        assert await shard.map(work, items(), concurrency=3, progress_interval=0) == [x * 2 for x in range(50)]
+    assert max(peak) <= 3
+
+
+@pytest.mark.asyncio
+async def test_shard_map_process():
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        shard = Shard(process_pool=lambda: pool)
+        assert await shard.map(abs, [-1, 2, -3], process=True) == [1, 2, 3]
+    with pytest.raises(RuntimeError):
+        await Shard().map(abs, [1], process=True)
+
+
+@pytest.mark.asyncio
+async def test_shard_map_error_and_cancel():
+    def fail(x: int) -> int:
+        if x == 3:
+            raise ValueError(x)
+        return x
+
+    with ThreadPoolExecutor(2) as pool:
+        shard = Shard(thread_pool=pool)
+        with pytest.raises(ValueError):
+            await shard.map(fail, range(100), concurrency=2)
+
+        events: List[threading.Event] = []
+
+        def wait_cancel(x: int) -> None:
+            events.append(g.cancel_event)
+            g.cancel_event.wait(5)
+
+        async def job() -> None:
+            await shard.map(wait_cancel, range(10), concurrency=2)
+
+        task = asyncio.create_task(job())
+        await asyncio.sleep(0.1)
+        start = time.monotonic()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0.1)
+        # 线程中的函数收到cancel_event后退出,没有开始的调用被取消
+        assert len(events) == 2 and all(e.is_set() for e in events)
+        assert time.monotonic() - start < 1
+
+
+@pytest.mark.asyncio
+async def test_shard_map_reaper(tmp_path: Path):
+    running: List[int] = []
+    peak: List[int] = []
+    lock = threading.Lock()
+
+    def work(x: int) -> int:
+        with lock:
+            running.append(x)
+            peak.append(len(running))
+        # 大于20的调用不响应cancel_event,取消后变成僵尸线程
+        time.sleep(0.05 if x < 20 else 0.3)
+        with lock:
+            running.remove(x)
+        return x
+
+    with ThreadPoolExecutor(8) as pool:
+        reaper = ThreadReaper(pool, asyncio.get_running_loop(), grace_period=0)
+        autoscaler = PoolAutoscaler(reaper, min_workers=1, max_workers=8, cgroup_root=str(tmp_path))
+        autoscaler.limit = 4
+        shard = Shard(reaper=reaper, autoscaler=autoscaler)
+        # 默认只占用autoscaler当前上限的一部分
+        assert await shard.map(work, range(20)) == list(range(20))
+        assert max(peak) == 4 * MAP_POOL_FRACTION
+
+        task = asyncio.create_task(shard.map(work, range(20, 30)))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # 取消后还在运行的线程由reaper追踪,slot全部释放
+        assert reaper.count == 2 and autoscaler.running == 0
+        await asyncio.sleep(0.4)
+        assert reaper.count == 0
+
+
+@pytest.mark.asyncio
+async def test_executor_shard(executor: Executor, job_id: int, log_id_iter: Iterator[int]):
+    executor.reset_handler(job_handler)
+    outputs.clear()
+    for index in range(2):
+        await executor.run_job(
+            RunData(
+                jobId=job_id + index,
+                logId=next(log_id_iter),
+                executorHandler="shard_map",
+                executorBlockStrategy=executorBlockStrategy.SERIAL_EXECUTION.value,
+                broadcastIndex=index,
+                broadcastTotal=2,
+            )
+        )
+    await executor.graceful_close()
+    assert sorted(outputs) == [(0, 2, [0, 20, 40, 60, 80]), (1, 2, [10, 30, 50, 70, 90])]
@@ -0,0 +1,117 @@
+import os
+import tracemalloc
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+
+from pyxxl.enum import executorBlockStrategy
+from pyxxl.executor import Executor
+from pyxxl.schema import RunData
+from pyxxl.spill import SpillQueue
+
+from .test_executor import job_handler
+
+
+def _data(log_id: int, job_id: int = 1, **kwargs) -> RunData:
+    return RunData(
+        jobId=job_id,
+        logId=log_id,
+        executorHandler="pytest_executor_async",
+        executorBlockStrategy=executorBlockStrategy.SERIAL_EXECUTION.value,
+        **kwargs,
+    )
+
+
+def test_spill_queue(tmp_path: Path):
+    path = str(tmp_path / "spill" / "1.jsonl")
+    spill = SpillQueue(path)
+    assert spill.empty()
+    with pytest.raises(IndexError):
+        spill.get_nowait()
+
+    spill.put(_data(1, executorParams="a"))
+    spill.put(_data(2))
+    assert spill.get_nowait() == _data(1, executorParams="a")
+    spill.put(_data(3))
+    assert spill.qsize() == 2
+    assert [spill.get_nowait().logId for _ in range(2)] == [2, 3]
+    assert spill.empty()
+    assert not os.path.exists(path)
+
+
+def test_spill_queue_compact(tmp_path: Path):
+    path = str(tmp_path / "1.jsonl")
+    spill = SpillQueue(path, compact_bytes=1024)
+    for i in range(100):
+        spill.put(_data(i))
+    assert spill.get_nowait().logId == 0
+    # 读取前写入缓冲中的调度
+    with open(path, "rb") as f:
+        assert len(f.readlines()) == 100
+    size = os.path.getsize(path)
+
+    for i in range(1, 60):
+        assert spill.get_nowait().logId == i
+    assert os.path.getsize(path) < size / 2
+    for i in range(100, 150):
+        spill.put(_data(i))
+    assert [spill.get_nowait().logId for _ in range(90)] == list(range(60, 150))
+    assert spill.empty()
+    assert not os.path.exists(path)
+
+
+def test_spill_queue_memory(tmp_path: Path):
+    spill = SpillQueue(str(tmp_path / "1.jsonl"))
+    tracemalloc.start()
+    try:
+        for i in range(100_000):
+            spill.put(_data(i))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    # 10万个RunData放在内存中需要几十MB
+    assert peak < 4 * 1024 * 1024
+    assert spill.qsize() == 100_000
+    assert spill.get_nowait().logId == 0
+    spill.clear()
+    assert spill.empty()
+
+
+@pytest.mark.asyncio
+async def test_runner_SERIAL_EXECUTION_spill(
+    executor: Executor, job_id: int, log_id_iter: Iterator[int], tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(executor.config, "task_queue_spill_dir", str(tmp_path))
+    monkeypatch.setattr("pyxxl.tests.test_executor.TASK_SLEEP_SECONDS", 0.1)
+    executor.xxl_client.clear_result()
+    executor.reset_handler(job_handler)
+
+    log_ids = [next(log_id_iter) for _ in range(executor.config.task_queue_length + 4)]
+    for log_id in log_ids:
+        await executor.run_job(_data(log_id, job_id=job_id))
+
+    assert executor.queue[job_id].full()
+    assert executor.spill[job_id].qsize() == 3
+    assert executor.queued == len(log_ids) - 1
+    assert os.path.exists(tmp_path / ("%s.jsonl" % job_id))
+
+    await executor.graceful_close(10)
+    assert all(executor.xxl_client.callback_result.get(log_id) == 200 for log_id in log_ids)
+    assert not os.path.exists(tmp_path / ("%s.jsonl" % job_id))
+
+
+@pytest.mark.asyncio
+async def test_runner_cancel_spill(
+    executor: Executor, job_id: int, log_id_iter: Iterator[int], tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(executor.config, "task_queue_spill_dir", str(tmp_path))
+    executor.reset_handler(job_handler)
+    for _ in range(executor.config.task_queue_length + 3):
+        await executor.run_job(_data(next(log_id_iter), job_id=job_id))
+    assert executor.spill[job_id].qsize() == 2
+
+    await executor.cancel_job(job_id, include_queue=True)
+    assert job_id not in executor.spill
+    assert executor.queued == 0
+    assert not os.path.exists(tmp_path / ("%s.jsonl" % job_id))
@@ -0,0 +1,103 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from pyxxl.error import JobKilledError
+from pyxxl.executor import HandlerInfo
+from pyxxl.threads import ThreadReaper
+
+
+@pytest.mark.asyncio
+async def test_reaper_kill_zombie():
+    r = []
+
+    def _handler():
+        try:
+            while True:  # 不响应cancel_event
+                time.sleep(0.05)
+        except JobKilledError:
+            r.append("killed")
+            raise
+
+    pool = ThreadPoolExecutor(max_workers=2)
+    reaper = ThreadReaper(
+        pool, asyncio.get_running_loop(), grace_period=0.5, kill_callback=lambda: r.append("callback")
+    )
+    handler = HandlerInfo(handler=_handler)
+    with pytest.raises(asyncio.TimeoutError):
+        await handler.start(1, reaper=reaper)
+
+    assert reaper.count == 1
+    assert pool._max_workers == 3
+    await asyncio.sleep(1)
+    assert sorted(r) == ["callback", "killed"]
+    assert reaper.count == 0
+    assert reaper.killed_total == 1
+    assert pool._max_workers == 2
+    pool.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_reaper_reclaim_without_kill():
+    def _handler():
+        time.sleep(1.5)
+
+    pool = ThreadPoolExecutor(max_workers=1)
+    reaper = ThreadReaper(pool, asyncio.get_running_loop(), grace_period=0)
+    handler = HandlerInfo(handler=_handler)
+    with pytest.raises(asyncio.TimeoutError):
+        await handler.start(1, reaper=reaper)
+    assert reaper.count == 1
+    assert pool._max_workers == 2
+
+    # 线程池仍然可以执行新的任务
+    assert await handler.start(3, reaper=reaper) is None
+    assert reaper.count == 0
+    assert pool._max_workers == 1
+    assert reaper.killed_total == 0
+    pool.shutdown()
+
+
+class _KillOnFinishLock:
+    """func返回后,线程第一次加锁时模拟reaper注入的JobKilledError"""
+
+    def __init__(self, returned: threading.Event) -> None:
+        self.lock = threading.Lock()
+        self.returned = returned
+        self.raised = False
+
+    def __enter__(self) -> None:
+        if self.returned.is_set() and not self.raised and threading.current_thread() is not threading.main_thread():
+            self.raised = True
+            raise JobKilledError("injected")
+        self.lock.acquire()
+
+    def __exit__(self, *args) -> None:
+        self.lock.release()
+
+
+@pytest.mark.asyncio
+async def test_reaper_kill_after_return():
+    event = threading.Event()
+    pool = ThreadPoolExecutor(max_workers=1)
+    reaper = ThreadReaper(pool, asyncio.get_running_loop(), grace_period=0)
+    call = reaper.watch(event.wait)
+    lock = call._lock = _KillOnFinishLock(event)  # type: ignore[assignment]
+    future = asyncio.get_running_loop().run_in_executor(pool, call)
+    while call.ident is None:
+        await asyncio.sleep(0.01)
+
+    reaper.abandon(call)
+    assert reaper.count == 1
+    assert pool._max_workers == 2
+    event.set()
+    assert await future is True
+    await asyncio.sleep(0.05)
+    assert lock.raised
+    assert call.finished
+    assert reaper.count == 0
+    assert pool._max_workers == 1
+    pool.shutdown()
@@ -0,0 +1,75 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from pyxxl import ExecutorConfig
+from pyxxl.enum import executorBlockStrategy
+from pyxxl.executor import Executor, JobHandler
+from pyxxl.schema import RunData
+from pyxxl.tests.conftest import GLOBAL_CONFIG
+from pyxxl.tests.utils import MokeXXL
+from pyxxl.trace import ACCEPTED, TraceRecorder
+
+job_handler = JobHandler()
+
+
+@job_handler.register
+def pytest_trace_sync():
+    time.sleep(0.1)
+
+
+def test_ring_buffer():
+    recorder = TraceRecorder(3)
+    for i in range(5):
+        recorder.record(ACCEPTED, job_id=1, log_id=i)
+    assert [e.log_id for e in recorder.events()] == [2, 3, 4]
+
+    with pytest.raises(ValueError):
+        TraceRecorder(0)
+
+
+def test_ring_buffer_threads():
+    recorder = TraceRecorder(8 * 1000)
+    # free-threaded构建下使用的加锁路径
+    recorder._lock = threading.Lock()
+
+    def _record(n: int) -> None:
+        for i in range(1000):
+            recorder.record(ACCEPTED, job_id=n, log_id=i)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(_record, range(8)))
+    assert len(recorder.events()) == 8 * 1000
+
+
+@pytest.mark.asyncio
+async def test_executor_trace(job_id: int, log_id_iter, tmp_path: Path):
+    config = ExecutorConfig(**GLOBAL_CONFIG, trace_buffer_size=100)
+    executor = Executor(MokeXXL(config.xxl_admin_baseurl), config, handler=job_handler)
+    log_ids = [next(log_id_iter) for _ in range(2)]
+    for log_id in log_ids:
+        await executor.run_job(
+            RunData(
+                logId=log_id,
+                jobId=job_id,
+                executorHandler="pytest_trace_sync",
+                executorBlockStrategy=executorBlockStrategy.SERIAL_EXECUTION.value,
+            )
+        )
+    await executor.graceful_close()
+
+    assert executor.tracer
+    trace = executor.tracer.to_chrome_trace()
+    events = [(e["name"], e["ph"]) for e in trace["traceEvents"] if e.get("id") == log_ids[1]]
+    assert events == [("queued", "b"), ("queued", "e"), ("run", "b"), ("run", "e")]
+    thread_names = [e["args"]["name"] for e in trace["traceEvents"] if e["ph"] == "M"]
+    assert any(name.startswith("pyxxl_pool") for name in thread_names)
+    assert ("pytest_trace_sync", "B") in [(e["name"], e["ph"]) for e in trace["traceEvents"]]
+
+    dump_path = tmp_path / "trace.json"
+    executor.tracer.dump(str(dump_path))
+    assert json.loads(dump_path.read_text()) == trace
@@ -1,7 +1,8 @@
+import sys
 import uuid
 from pathlib import Path
 
-from pyxxl.utils import setup_logging, try_import
+from pyxxl.utils import gil_enabled, setup_logging, try_import
 
 
 def test_import():
@@ -9,6 +10,10 @@ def test_import():
     assert try_import("aiohttp")
 
 
+def test_gil_enabled():
+    assert gil_enabled() is (sys._is_gil_enabled() if hasattr(sys, "_is_gil_enabled") else True)
+
+
 def test_logging():
     log_path = "logs/test.log"
     Path(log_path).unlink(missing_ok=True)
@@ -1,5 +1,5 @@
 import os
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 from pyxxl.main import PyxxlRunner
 from pyxxl.utils import try_import
@@ -8,15 +8,27 @@ from pyxxl.xxl_client import XXL, JsonType, Response
 
 class MokeXXL(XXL):
     callback_result: Dict[int, Any] = {}
+    callback_msg: Dict[int, Optional[str]] = {}
+    callback_batch_result: List[Any] = []
 
     async def callback(self, log_id: int, timestamp: int, code: int = 200, msg: Optional[str] = None) -> None:
         self.callback_result[log_id] = code
+        self.callback_msg[log_id] = msg
+
+    async def callback_batch(
+        self, log_ids: List[int], timestamp: int, code: int = 200, msg: Optional[str] = None
+    ) -> None:
+        self.callback_batch_result.append((log_ids, code, msg))
+        for log_id in log_ids:
+            self.callback_result[log_id] = code
 
     async def _post(self, path: str, payload: JsonType, retry_times: Optional[int] = None) -> Response:
         return Response(code=200)
 
     def clear_result(self) -> None:
         self.callback_result = {}
+        self.callback_msg = {}
+        self.callback_batch_result = []
 
 
 class MokePyxxlRunner(PyxxlRunner):
@@ -0,0 +1,144 @@
+import asyncio
+import contextvars
+import ctypes
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional
+
+from pyxxl.error import JobKilledError
+from pyxxl.schema import RunData
+
+if TYPE_CHECKING:
+    from pyxxl.capacity import PoolAutoscaler
+
+
+class WatchedCall:
+    """线程池中执行的同步任务,记录执行的线程,以便超时后追踪该线程"""
+
+    def __init__(self, reaper: "ThreadReaper", func: Callable[[], Any], data: Optional[RunData] = None) -> None:
+        self.reaper = reaper
+        self.func = func
+        self.data = data
+        self.ident: Optional[int] = None
+        self.started_at: Optional[float] = None
+        self.abandoned_at: Optional[float] = None
+        self.finished = False
+        self._lock = threading.Lock()
+
+    def __call__(self) -> Any:
+        with self._lock:
+            if self.abandoned_at is not None:
+                raise JobKilledError("job abandoned before running.")
+            self.ident = threading.get_ident()
+            self.started_at = time.monotonic()
+        try:
+            return self.func()
+        finally:
+            self._finish()
+
+    def _finish(self) -> None:
+        while True:
+            try:
+                with self._lock:
+                    self.finished = True
+                    abandoned = self.abandoned_at is not None
+                if abandoned:
+                    self.reaper.loop.call_soon_threadsafe(self.reaper._reclaim, self)
+                return
+            except JobKilledError:
+                # func已经返回,但是拿到锁之前被reaper注入了异常,仍然需要完成记录,否则线程池会一直处于扩容状态
+                continue
+
+    def __str__(self) -> str:
+        return "<WatchedCall thread={} data={}>".format(self.ident, self.data)
+
+
+class ThreadReaper:
+    """
+    追踪超时或取消后仍然在运行的同步任务线程(僵尸线程)
+
+    * 每出现一个僵尸线程,线程池的max_workers加1,保证新任务可用的线程数不变,线程退出后再减回去
+    * 超过grace_period仍未响应cancel_event的线程,会被注入JobKilledError异常
+
+    !!! warning
+
+        注入的异常只有在线程执行python字节码时才会触发,阻塞在C代码(如socket读写)中的线程需要等调用返回
+
+    zombies只在loop线程中修改(线程结束时通过call_soon_threadsafe回到loop)
+    """
+
+    def __init__(
+        self,
+        pool: ThreadPoolExecutor,
+        loop: asyncio.AbstractEventLoop,
+        *,
+        grace_period: float = 60,
+        logger: Optional[logging.Logger] = None,
+        kill_callback: Optional[Callable[[], Any]] = None,
+    ) -> None:
+        self.pool = pool
+        self.loop = loop
+        self.grace_period = grace_period
+        self.logger = logger or logging.getLogger("pyxxl.executor")
+        self.zombies: Dict[int, WatchedCall] = {}
+        self.killed_total = 0
+        self.kill_callback = kill_callback or (lambda: 1)
+
+    @property
+    def count(self) -> int:
+        return len(self.zombies)
+
+    def watch(self, func: Callable[[], Any], data: Optional[RunData] = None) -> WatchedCall:
+        return WatchedCall(self, func, data)
+
+    async def submit(self, call: WatchedCall, autoscaler: Optional["PoolAutoscaler"] = None) -> Any:
+        """把call提交到线程池,有autoscaler时需要先拿到它的slot"""
+        ctx = contextvars.copy_context()
+        if autoscaler is None:
+            return await asyncio.get_running_loop().run_in_executor(self.pool, ctx.run, call)
+        async with autoscaler.slot(call):
+            return await asyncio.get_running_loop().run_in_executor(self.pool, ctx.run, call)
+
+    def abandon(self, call: WatchedCall) -> None:
+        """任务已经超时或者取消,不再等待线程结果"""
+        with call._lock:
+            if call.finished or call.abandoned_at is not None:
+                return
+            call.abandoned_at = time.monotonic()
+            ident = call.ident
+        if ident is None:
+            return
+
+        self.zombies[ident] = call
+        max_workers = self._resize(1)
+        self.logger.warning("Thread %s became zombie, grow thread pool to %s. %s", ident, max_workers, call)
+        if self.grace_period > 0:
+            self.loop.call_later(self.grace_period, self._kill, call)
+
+    def _reclaim(self, call: WatchedCall) -> None:
+        if call.ident is None or self.zombies.pop(call.ident, None) is None:
+            return
+        max_workers = self._resize(-1)
+        self.logger.info("Zombie thread %s exited, shrink thread pool to %s.", call.ident, max_workers)
+
+    def _resize(self, delta: int) -> int:
+        # submit在_shutdown_lock中读取_max_workers创建线程,没有GIL时需要同一把锁保证读写不交错
+        with self.pool._shutdown_lock:
+            self.pool._max_workers += delta
+            return self.pool._max_workers
+
+    def _kill(self, call: WatchedCall) -> None:
+        with call._lock:
+            if call.finished or call.ident is None:
+                return
+            ret = ctypes.pythonapi.PyThreadState_SetAsyncExc(
+                ctypes.c_ulong(call.ident), ctypes.py_object(JobKilledError)
+            )
+        if ret == 1:
+            self.killed_total += 1
+            self.kill_callback()
+            self.logger.warning("Inject JobKilledError into zombie thread %s. %s", call.ident, call)
+        else:  # pragma: no cover
+            self.logger.error("Inject JobKilledError into zombie thread %s failed, ret=%s.", call.ident, ret)
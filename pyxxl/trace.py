@@ -0,0 +1,106 @@
+import itertools
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Set
+
+from pyxxl.ctx import g
+from pyxxl.utils import gil_enabled
+
+ACCEPTED = "accepted"
+QUEUED = "queued"
+STARTED = "started"
+FINISHED = "finished"
+THREAD_START = "thread_start"
+THREAD_END = "thread_end"
+POST_START = "post_start"
+POST_END = "post_end"
+
+
+class TraceEvent(NamedTuple):
+    ts: int
+    """微秒"""
+    event: str
+    job_id: int
+    log_id: int
+    tid: int
+    thread_name: str
+    detail: str
+
+
+class TraceRecorder:
+    """
+    固定大小的环形缓冲区,记录执行器的关键事件,可以导出为Chrome trace(Perfetto)格式
+
+    写入时只做一次元组赋值,缓冲区写满后覆盖最早的记录.
+    有GIL时itertools.count的next是原子的,不加锁;free-threaded构建下count不保证线程安全,取序号时加锁
+    """
+
+    def __init__(self, capacity: int) -> None:
+        if capacity <= 0:
+            raise ValueError("capacity must be greater than 0.")
+        self.capacity = capacity
+        self._buffer: List[Optional[TraceEvent]] = [None] * capacity
+        self._counter = itertools.count()
+        self._lock = None if gil_enabled() else threading.Lock()
+
+    def record(self, event: str, job_id: int = 0, log_id: int = 0, detail: str = "") -> None:
+        thread = threading.current_thread()
+        if self._lock is None:
+            index = next(self._counter)
+        else:
+            with self._lock:
+                index = next(self._counter)
+        self._buffer[index % self.capacity] = TraceEvent(
+            time.perf_counter_ns() // 1000, event, job_id, log_id, thread.ident or 0, thread.name, detail
+        )
+
+    def record_ctx(self, event: str, detail: str = "") -> None:
+        """从上下文中获取当前任务的jobId和logId"""
+        data = g.try_get_run_data()
+        self.record(event, data.jobId if data else 0, data.logId if data else 0, detail)
+
+    def events(self) -> List[TraceEvent]:
+        return sorted((i for i in list(self._buffer) if i is not None), key=lambda x: x.ts)
+
+    def to_chrome_trace(self) -> Dict[str, Any]:
+        pid = os.getpid()
+        trace_events: List[Dict[str, Any]] = []
+        threads: Dict[int, str] = {}
+        queued: Set[int] = set()
+        for e in self.events():
+            threads[e.tid] = e.thread_name
+            base = dict(pid=pid, tid=e.tid, ts=e.ts, cat="pyxxl")
+            if e.event == QUEUED:
+                queued.add(e.log_id)
+            elif e.event == STARTED and e.log_id in queued:
+                trace_events.append(dict(base, name=QUEUED, ph="e", id=e.log_id))
+            trace_events.append(dict(base, **_chrome_event(e)))
+
+        for tid, name in threads.items():
+            trace_events.append(dict(pid=pid, tid=tid, ph="M", name="thread_name", args=dict(name=name)))
+        return {"traceEvents": trace_events, "displayTimeUnit": "ms"}
+
+    def dump(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(self.to_chrome_trace(), f)
+
+
+def _chrome_event(e: TraceEvent) -> Dict[str, Any]:
+    args: Dict[str, Any] = dict(jobId=e.job_id, logId=e.log_id)
+    if e.detail:
+        args["detail"] = e.detail
+    if e.event == ACCEPTED:
+        return dict(name=ACCEPTED, ph="i", s="t", args=args)
+    if e.event == QUEUED:
+        return dict(name=QUEUED, ph="b", id=e.log_id, args=args)
+    if e.event == STARTED:
+        return dict(name="run", ph="b", id=e.log_id, args=args)
+    if e.event == FINISHED:
+        return dict(name="run", ph="e", id=e.log_id)
+    if e.event in (THREAD_START, THREAD_END):
+        return dict(name=e.detail, ph="B" if e.event == THREAD_START else "E", args=args)
+    if e.event in (POST_START, POST_END):
+        return dict(name=e.detail, ph="b" if e.event == POST_START else "e", id="post-%s" % e.log_id, args=args)
+    return dict(name=e.event, ph="i", s="t", args=args)
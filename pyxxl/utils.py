@@ -1,7 +1,11 @@
+import asyncio
 import importlib
 import logging
+import os
 import platform
+import resource
 import socket
+import sys
 from logging.handlers import RotatingFileHandler
 from typing import Any, List, Optional
 
@@ -53,6 +57,30 @@ def setup_logging(
     return logger
 
 
+def get_rss() -> int:
+    """获取当前进程的RSS(字节),非linux系统取的是历史峰值"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):  # pragma: no cover
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if platform.system() == "Darwin" else maxrss * 1024
+
+
+def gil_enabled() -> bool:
+    """是否启用了GIL,free-threaded构建(如3.13t)且没有被重新启用GIL时返回False"""
+    is_gil_enabled = getattr(sys, "_is_gil_enabled", None)
+    return bool(is_gil_enabled()) if is_gil_enabled else True
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """优先获取正在运行的loop,避免新版本python中get_event_loop的DeprecationWarning"""
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.get_event_loop()
+
+
 def try_import(module: str) -> Optional[Any]:
     try:
         return importlib.import_module(module)
@@ -7,6 +7,8 @@ from yarl import URL
 
 from pyxxl.error import XXLClientError
 from pyxxl.log import xxl_client_logger
+from pyxxl.trace import POST_END, POST_START, TraceRecorder
+from pyxxl.utils import get_event_loop
 
 JsonType = Union[None, int, str, bool, List[Any], Dict[Any, Any]]
 
@@ -34,7 +36,7 @@ class XXL:
         logger: Optional[logging.Logger] = None,
         **kwargs: Any,
     ) -> None:
-        self.loop = loop or asyncio.get_event_loop()
+        self.loop = loop or get_event_loop()
         kwargs["loop"] = self.loop
 
         _admin_url: URL = URL(admin_url)
@@ -58,6 +60,7 @@ class XXL:
         self.headers = {"XXL-JOB-ACCESS-TOKEN": token, "XXL-RPC-ACCESS-TOKEN": token} if token else {}
         self.logger = logger or xxl_client_logger
         self.http_timeout = http_timeout
+        self.tracer: Optional[TraceRecorder] = None
 
     async def registry(self, key: str, value: str) -> bool:
         payload = dict(registryGroup="EXECUTOR", registryKey=key, registryValue=value)
@@ -74,6 +77,12 @@ class XXL:
         self.logger.info("RegistryRemove successful. %s" % payload)
 
     async def callback(self, log_id: int, timestamp: int, code: int = 200, msg: Optional[str] = None) -> None:
+        await self.callback_batch([log_id], timestamp, code=code, msg=msg)
+
+    async def callback_batch(
+        self, log_ids: List[int], timestamp: int, code: int = 200, msg: Optional[str] = None
+    ) -> None:
+        """多个logId使用相同的结果一次性回调"""
         # executeResult兼容xxl-job2.2版本
         payload = [
             {
@@ -83,11 +92,21 @@ class XXL:
                 "handleMsg": msg,
                 "executeResult": {"code": code, "msg": msg},
             }
+            for log_id in log_ids
         ]
         await self._post("callback", payload)
         self.logger.debug("Callback successful. %s" % payload)
 
     async def _post(self, path: str, payload: JsonType, retry_times: Optional[int] = None) -> Response:
+        if self.tracer is None:
+            return await self._do_post(path, payload, retry_times)
+        self.tracer.record_ctx(POST_START, path)
+        try:
+            return await self._do_post(path, payload, retry_times)
+        finally:
+            self.tracer.record_ctx(POST_END, path)
+
+    async def _do_post(self, path: str, payload: JsonType, retry_times: Optional[int] = None) -> Response:
         self.logger.debug("post to xxl-job path={} payload={}".format(path, payload))
         times = 0
         retry_times = retry_times or self.retry_times